@@ -5,450 +5,350 @@ Full evaluation with manual judgment for all tasks
 
 import os
 import json
-import time
-import requests
+import argparse
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Any
-import re
+from typing import Callable, Dict, Iterable, List, Any, Optional
+
+import budget as run_budget
+import metrics_exporter
+import results_warehouse
+from progress import ProgressTracker
+from data_stream import count_items, iter_items
+from result_records import CategoryTally, ResultRecord, approx, token_report, token_table
+from results_store import ColumnarResultWriter, StreamingJSONWriter, record_sink, store_path_for
+from backends import HFEndpointBackend, InferenceBackend, create_backend
+from retry_policy import RetryPolicy
+from judging import judge_batch
+from sql_judge import SQLJudge
+from runner import run_items
+from warmup import ColdStartDetector, warm_up
 
 # Configuration - Token from environment variable
 HF_TOKEN = os.environ.get('HF_TOKEN', '')
-if not HF_TOKEN:
-    print("Error: Please set HF_TOKEN environment variable")
-    print("Usage: export HF_TOKEN='your_token_here' && python3 agentbench_evaluation.py")
-    exit(1)
 
 ENDPOINT_URL = "https://mzkzbztaqbgxlted.us-east-1.aws.endpoints.huggingface.cloud"
 MODEL_ID = "Qwen/Qwen2.5-3B-Instruct"
 RESULTS_DIR = "./Results"
 DATA_DIR = "./AgentBench/data"
+TASKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agentbench_tasks")
+WAREHOUSE_PATH = os.path.join(RESULTS_DIR, "results.db")
+RETRY_POLICY = RetryPolicy()
+SQL_JUDGE = SQLJudge(timeout=2.0)
 
-print(f"\n{'='*80}")
-print("AGENTBENCH EVALUATION - Qwen2.5-3B-Instruct")
-print(f"{'='*80}\n")
+GENERATION_PARAMS = {
+    "max_new_tokens": 512,
+    "temperature": 0.7,
+    "top_p": 0.95
+}
 
+# Replaced in main(); tags results produced while the endpoint is still cold
+COLD_START: Optional[ColdStartDetector] = None
+# Replaced in main() according to --backend
+BACKEND: InferenceBackend = HFEndpointBackend(ENDPOINT_URL, HF_TOKEN, pace=1)
+# Replaced in main() when a run budget is set (--max-requests etc.); shared by every task
+BUDGET: Optional[run_budget.BudgetTracker] = None
 
-# ==================== Helper Functions ====================
-
-def generate_response(prompt: str, max_retries: int = 3) -> Dict[str, Any]:
-    """Generate response using HuggingFace endpoint"""
-    headers = {
-        "Accept": "application/json",
-        "Authorization": f"Bearer {HF_TOKEN}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "inputs": prompt,
-        "parameters": {
-            "max_new_tokens": 512,
-            "temperature": 0.7,
-            "top_p": 0.95
-        }
-    }
-
-    for attempt in range(max_retries):
-        try:
-            response = requests.post(ENDPOINT_URL, headers=headers, json=payload, timeout=120)
-            response.raise_for_status()
-            result = response.json()
-
-            if isinstance(result, list) and len(result) > 0:
-                generated_text = result[0].get('generated_text', '')
-            elif isinstance(result, dict):
-                generated_text = result.get('generated_text', result.get('text', ''))
-            else:
-                generated_text = str(result)
-
-            return {"success": True, "response": generated_text, "error": None}
-        except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(5)
-            else:
-                return {"success": False, "response": "", "error": str(e)}
-
-    return {"success": False, "response": "", "error": "Max retries exceeded"}
 
+# ==================== Helper Functions ====================
 
 def judge_answer(model_response: str, expected_answer: Any, question: str, task_type: str) -> bool:
-    """Manually judge if answer is correct based on task type"""
-    response_lower = model_response.lower()
-
-    if task_type == "sql":
-        if isinstance(expected_answer, list) and len(expected_answer) > 0:
-            expected_str = str(expected_answer[0]).lower()
-            has_select = "select" in response_lower
-            has_expected = expected_str in response_lower or any(word in response_lower for word in expected_str.split())
-            return has_select and has_expected
-        return "select" in response_lower
-
-    elif task_type == "kg":
-        if isinstance(expected_answer, list) and len(expected_answer) > 0:
-            entity = expected_answer[0].get('entity_name', '').lower()
-            return entity in response_lower if entity else False
-        return False
-
-    elif task_type == "math":
-        numbers = re.findall(r'\b\d+\.?\d*\b', response_lower)
-        if numbers and expected_answer:
-            try:
-                model_num = float(numbers[-1])
-                expected_num = float(expected_answer)
-                return abs(model_num - expected_num) < 0.01
-            except:
-                pass
-        return False
-
-    elif task_type == "mcq":
-        match = re.search(r'\b([a-d])\b', response_lower)
-        if match and expected_answer:
-            return match.group(1).upper() == str(expected_answer).upper()
+    """Judge one answer based on task type (see judging.judge_batch)"""
+    if task_type not in ("kg", "math", "mcq", "os"):
         return False
-
-    elif task_type == "os":
-        question_lower = question.lower()
-        if "hidden files" in question_lower:
-            return "ls -a" in response_lower or "find" in response_lower
-        elif "interval" in question_lower or "seconds" in question_lower:
-            return any(cmd in response_lower for cmd in ["watch", "tail", "stat", "grep"])
-        elif "calc" in question_lower or "alias" in question_lower:
-            return "alias" in response_lower or "bc" in response_lower or "function" in response_lower
-        return len(response_lower) > 50
-
-    return False
-
-
-# ==================== Task 1: Math Reasoning ====================
-
-def test_math_reasoning():
-    """Test basic math reasoning"""
-    print("\n" + "="*80)
-    print("TASK 1: MATH REASONING")
-    print("="*80)
-
-    problems = [
-        {"question": "What is 15 + 27?", "answer": 42},
-        {"question": "If a book costs $12 and you buy 3 books, how much do you spend?", "answer": 36},
-        {"question": "What is 100 - 37?", "answer": 63},
-        {"question": "A rectangle has length 8 and width 5. What is its area?", "answer": 40},
-        {"question": "What is 144 divided by 12?", "answer": 12},
-        {"question": "If you have 50 apples and give away 18, how many remain?", "answer": 32},
-        {"question": "What is 7 times 9?", "answer": 63},
-        {"question": "A train travels 180 km in 3 hours. What is its speed in km/h?", "answer": 60},
-        {"question": "What is 25% of 80?", "answer": 20},
-        {"question": "If 5 pens cost $15, how much does one pen cost?", "answer": 3}
-    ]
-
-    results = []
-    correct = 0
-
-    print(f"\nTesting {len(problems)} math problems...")
-
-    for idx, item in enumerate(problems, 1):
-        question = item['question']
-        expected = item['answer']
-
-        print(f"[{idx}/{len(problems)}] {question}")
-
-        prompt = f"Solve this math problem and provide just the numerical answer.\n\nQuestion: {question}\n\nAnswer:"
-
-        result = generate_response(prompt)
-
-        if result['success']:
-            is_correct = judge_answer(result['response'], expected, question, "math")
-            if is_correct:
-                correct += 1
-                print(f"  ✓ CORRECT")
-            else:
-                print(f"  ✗ INCORRECT (Expected: {expected})")
-        else:
-            is_correct = False
-            print(f"  ✗ ERROR: {result['error'][:50]}")
-
-        results.append({
-            "id": idx,
-            "question": question,
-            "expected_answer": expected,
-            "model_response": result['response'],
-            "judged_correct": is_correct,
-            "success": result['success']
-        })
-
-        time.sleep(1)
-
-    success_rate = (correct / len(problems) * 100) if problems else 0
-    print(f"\n{'='*80}")
-    print(f"MATH REASONING: {correct}/{len(problems)} correct ({success_rate:.1f}%)")
-    print(f"{'='*80}")
-
-    return {"task": "math_reasoning", "total": len(problems), "correct": correct,
-            "success_rate": success_rate, "results": results}
+    return judge_batch(task_type, [model_response], [expected_answer], [question])[0]
+
+
+def judge_item(item: Dict[str, Any], result: Dict[str, Any]) -> ResultRecord:
+    """Judge one AgentBench item and build its result record
+
+    SQL items are judged by executing the generated query (see sql_judge).
+    """
+    extra = {**item.get('extra', {}), "expected_answer": item['expected']}
+    if not result['success']:
+        is_correct = False
+    elif item['task_type'] == "sql":
+        verdict = SQL_JUDGE.judge(result['response'], item['table'], item['expected'], item['query_type'])
+        is_correct = verdict['correct']
+        extra.update(executed_sql=verdict['sql'], sql_error=verdict['error'])
+    else:
+        is_correct = judge_answer(result['response'], item['expected'], item['question'], item['task_type'])
+
+    return ResultRecord(item['id'], item['question'], result['response'], is_correct, result['success'], extra)
+
+
+def evaluate_items(task_name: str, items: Iterable[Dict[str, Any]], sink=None,
+                   progress: Optional[ProgressTracker] = None, total: Optional[int] = None) -> Dict[str, Any]:
+    """Run items through the endpoint with deferred retries and summarize the task
+
+    Items may be a generator; records go to `sink` as they are judged and the
+    summary holds counts only.
+    """
+    tally = run_items(items, lambda prompts: BACKEND.generate_batch(prompts, GENERATION_PARAMS),
+                      judge_item, RETRY_POLICY, batch_size=BACKEND.batch_size, pace=BACKEND.pace,
+                      sink=sink, progress=progress, category=task_name, total=total,
+                      cold_start=COLD_START, budget=BUDGET)
+    return tally.summary()
+
+
+# ==================== Task Specs ====================
+
+def math_item(idx: int, problem: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": idx,
+        "question": problem['question'],
+        "expected": problem['answer'],
+        "task_type": "math",
+        "prompt": f"Solve this math problem and provide just the numerical answer.\n\nQuestion: {problem['question']}\n\nAnswer:",
+        "label": problem['question'],
+        "hint": f"Expected: {problem['answer']}",
+    }
 
 
-# ==================== Task 2: Common Sense QA ====================
+def common_sense_item(idx: int, problem: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": idx,
+        "question": problem['question'],
+        "expected": problem['answer'],
+        "task_type": "mcq",
+        "prompt": f"Answer this common sense question by selecting the correct option.\n\nQuestion: {problem['question']}\n\nOptions:\n{chr(10).join(problem['options'])}\n\nProvide your answer as just the letter (A, B, C, or D).\n\nAnswer:",
+        "label": problem['question'],
+        "hint": f"Expected: {problem['answer']}",
+        "extra": {"options": problem['options']},
+    }
 
-def test_common_sense_qa():
-    """Test common sense reasoning"""
-    print("\n" + "="*80)
-    print("TASK 2: COMMON SENSE QA")
-    print("="*80)
 
-    problems = [
-        {"question": "What happens when you drop a glass on a hard floor?",
-         "options": ["A) It bounces back up", "B) It likely breaks", "C) It melts", "D) Nothing happens"],
-         "answer": "B"},
-        {"question": "Where do fish live?",
-         "options": ["A) In trees", "B) In water", "C) In caves", "D) In the sky"],
-         "answer": "B"},
-        {"question": "What do plants need to grow?",
-         "options": ["A) Darkness", "B) Sunlight and water", "C) Only soil", "D) Ice"],
-         "answer": "B"},
-        {"question": "What happens if you don't sleep for a long time?",
-         "options": ["A) You feel energized", "B) You feel tired", "C) You grow taller", "D) Nothing"],
-         "answer": "B"},
-        {"question": "What is the color of the sky on a clear day?",
-         "options": ["A) Green", "B) Blue", "C) Red", "D) Yellow"],
-         "answer": "B"},
-        {"question": "What do you use to cut paper?",
-         "options": ["A) Scissors", "B) Spoon", "C) Pillow", "D) Water"],
-         "answer": "A"},
-        {"question": "What season comes after summer?",
-         "options": ["A) Spring", "B) Fall/Autumn", "C) Winter", "D) Summer again"],
-         "answer": "B"},
-        {"question": "What do you need to write with a pen?",
-         "options": ["A) Paper", "B) Water", "C) Sand", "D) Nothing"],
-         "answer": "A"},
-        {"question": "Where do birds typically build nests?",
-         "options": ["A) Underground", "B) In trees", "C) In water", "D) On roads"],
-         "answer": "B"},
-        {"question": "What makes a car move?",
-         "options": ["A) Wind", "B) Engine", "C) Gravity", "D) Magic"],
-         "answer": "B"}
-    ]
-
-    results = []
-    correct = 0
-
-    print(f"\nTesting {len(problems)} common sense questions...")
-
-    for idx, item in enumerate(problems, 1):
-        question = item['question']
-        options = item['options']
-        expected = item['answer']
-
-        print(f"[{idx}/{len(problems)}] {question}")
-
-        prompt = f"Answer this common sense question by selecting the correct option.\n\nQuestion: {question}\n\nOptions:\n{chr(10).join(options)}\n\nProvide your answer as just the letter (A, B, C, or D).\n\nAnswer:"
-
-        result = generate_response(prompt)
-
-        if result['success']:
-            is_correct = judge_answer(result['response'], expected, question, "mcq")
-            if is_correct:
-                correct += 1
-                print(f"  ✓ CORRECT")
-            else:
-                print(f"  ✗ INCORRECT (Expected: {expected})")
-        else:
-            is_correct = False
-            print(f"  ✗ ERROR")
-
-        results.append({
-            "id": idx,
-            "question": question,
-            "options": options,
-            "expected_answer": expected,
-            "model_response": result['response'],
-            "judged_correct": is_correct,
-            "success": result['success']
-        })
-
-        time.sleep(1)
-
-    success_rate = (correct / len(problems) * 100) if problems else 0
-    print(f"\n{'='*80}")
-    print(f"COMMON SENSE QA: {correct}/{len(problems)} correct ({success_rate:.1f}%)")
-    print(f"{'='*80}")
+def sql_item(idx: int, problem: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": idx,
+        "question": problem['description'],
+        "expected": problem['label'],
+        "task_type": "sql",
+        "table": problem['table'],
+        "query_type": (problem.get('type') or ["SELECT"])[0],
+        "prompt": f"Generate a SQL query for this question.\n\nDatabase Schema: {problem.get('add_description', '')}\n\nQuestion: {problem['description']}\n\nSQL Query:",
+        "label": f"{problem['description'][:60]}...",
+    }
 
-    return {"task": "common_sense_qa", "total": len(problems), "correct": correct,
-            "success_rate": success_rate, "results": results}
 
+def knowledge_graph_item(idx: int, problem: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": idx,
+        "question": problem['question'],
+        "expected": problem['answer'],
+        "task_type": "kg",
+        "prompt": f"Answer this question concisely.\n\nQuestion: {problem['question']}\n\nAnswer:",
+        "label": f"{problem['question'][:60]}...",
+    }
 
-# ==================== Task 3: SQL Generation ====================
 
-def test_sql_generation():
-    """Test SQL query generation from natural language"""
+@dataclass
+class TaskSpec:
+    """One AgentBench task: the dataset file its items stream from and how each becomes a prompt"""
+    name: str
+    label: str
+    title: str
+    path: str
+    build_item: Callable[[int, Dict[str, Any]], Dict[str, Any]]
+    description: str = ""
+
+
+# Evaluated in this order; datasets are JSONL or a top-level JSON array
+AGENTBENCH_TASKS = [
+    TaskSpec("math_reasoning", "Math Reasoning", "MATH REASONING",
+             os.path.join(TASKS_DIR, "math_reasoning.jsonl"),
+             math_item, "Basic arithmetic and word problems"),
+    TaskSpec("common_sense_qa", "Common Sense QA", "COMMON SENSE QA",
+             os.path.join(TASKS_DIR, "common_sense_qa.jsonl"),
+             common_sense_item, "Multiple choice common sense reasoning"),
+    TaskSpec("sql_generation", "SQL Generation", "SQL GENERATION (DATABASE BENCH)",
+             os.path.join(DATA_DIR, "dbbench", "dev.jsonl"),
+             sql_item, "Natural language to SQL translation"),
+    TaskSpec("knowledge_graph", "Knowledge Graph", "KNOWLEDGE GRAPH REASONING",
+             os.path.join(DATA_DIR, "knowledgegraph", "dev.json"),
+             knowledge_graph_item, "Multi-hop reasoning over knowledge graphs"),
+]
+
+
+def run_task_spec(spec: TaskSpec, limit: Optional[int] = None, sink=None,
+                  progress: Optional[ProgressTracker] = None, total: Optional[int] = None) -> Dict[str, Any]:
+    """Stream a task's items (the full split unless `limit` is given) through the runner"""
     print("\n" + "="*80)
-    print("TASK 3: SQL GENERATION (DATABASE BENCH)")
+    print(f"TASK: {spec.title}")
     print("="*80)
 
-    dev_file = os.path.join(DATA_DIR, "dbbench", "dev.jsonl")
-
-    problems = []
-    with open(dev_file, 'r') as f:
-        for idx, line in enumerate(f):
-            if idx >= 10:
-                break
-            problems.append(json.loads(line))
+    if not os.path.exists(spec.path):
+        print(f"Warning: Data file not found: {spec.path}")
+        return CategoryTally(spec.name).summary()
 
-    results = []
-    correct = 0
+    if total is None:
+        total = count_items(spec.path, limit)
+    items = (spec.build_item(idx, problem) for idx, problem in enumerate(iter_items(spec.path, limit), 1))
 
-    print(f"\nTesting {len(problems)} SQL generation tasks...")
+    print(f"\nTesting {total} items...")
 
-    for idx, item in enumerate(problems, 1):
-        question = item['description']
-        expected = item['label']
-        schema = item.get('add_description', '')
+    summary = evaluate_items(spec.name, items, sink, progress, total)
 
-        print(f"[{idx}/{len(problems)}] {question[:60]}...")
-
-        prompt = f"Generate a SQL query for this question.\n\nDatabase Schema: {schema}\n\nQuestion: {question}\n\nSQL Query:"
-
-        result = generate_response(prompt)
-
-        if result['success']:
-            is_correct = judge_answer(result['response'], expected, question, "sql")
-            if is_correct:
-                correct += 1
-                print(f"  ✓ CORRECT")
-            else:
-                print(f"  ✗ INCORRECT")
-        else:
-            is_correct = False
-            print(f"  ✗ ERROR")
-
-        results.append({
-            "id": idx,
-            "question": question,
-            "expected_answer": expected,
-            "model_response": result['response'],
-            "judged_correct": is_correct,
-            "success": result['success']
-        })
-
-        time.sleep(1)
-
-    success_rate = (correct / len(problems) * 100) if problems else 0
     print(f"\n{'='*80}")
-    print(f"SQL GENERATION: {correct}/{len(problems)} correct ({success_rate:.1f}%)")
+    print(f"{spec.title}: {summary['correct']}/{summary['total']} correct ({summary['success_rate']:.1f}%), "
+          f"{summary['errors']} failed requests")
+    print(f"  {token_report(summary)}")
+    if summary['cold_starts']:
+        print(f"  {summary['cold_starts']} results tagged as produced during a cold start (excluded from mean latency)")
     print(f"{'='*80}")
 
-    return {"task": "sql_generation", "total": len(problems), "correct": correct,
-            "success_rate": success_rate, "results": results}
-
-
-# ==================== Task 4: Knowledge Graph ====================
-
-def test_knowledge_graph():
-    """Test multi-hop reasoning over knowledge graphs"""
-    print("\n" + "="*80)
-    print("TASK 4: KNOWLEDGE GRAPH REASONING")
-    print("="*80)
-
-    dev_file = os.path.join(DATA_DIR, "knowledgegraph", "dev.json")
-
-    with open(dev_file, 'r') as f:
-        all_problems = json.load(f)
-
-    problems = all_problems[:10]
-
-    results = []
-    correct = 0
-
-    print(f"\nTesting {len(problems)} knowledge graph tasks...")
-
-    for idx, item in enumerate(problems, 1):
-        question = item['question']
-        expected = item['answer']
+    return summary
 
-        print(f"[{idx}/{len(problems)}] {question[:60]}...")
 
-        prompt = f"Answer this question concisely.\n\nQuestion: {question}\n\nAnswer:"
-
-        result = generate_response(prompt)
-
-        if result['success']:
-            is_correct = judge_answer(result['response'], expected, question, "kg")
-            if is_correct:
-                correct += 1
-                print(f"  ✓ CORRECT")
-            else:
-                print(f"  ✗ INCORRECT")
-        else:
-            is_correct = False
-            print(f"  ✗ ERROR")
-
-        results.append({
-            "id": idx,
-            "question": question,
-            "expected_answer": expected,
-            "model_response": result['response'],
-            "judged_correct": is_correct,
-            "success": result['success']
-        })
+# ==================== Main Execution ====================
 
-        time.sleep(1)
+def parse_limits(values: List[str]) -> Dict[Optional[str], int]:
+    """Parse --limit values: "N" for every task or "TASK=N" for one task"""
+    limits: Dict[Optional[str], int] = {}
+    for value in values:
+        name, _, count = value.rpartition("=")
+        limits[name or None] = int(count)
+    return limits
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="AgentBench evaluation")
+    parser.add_argument("--columnar", action="store_true",
+                        help="also write a compressed columnar store (<result>.cols/) next to each result file")
+    parser.add_argument("--no-warehouse", action="store_true",
+                        help=f"do not write results through to the SQLite warehouse ({WAREHOUSE_PATH})")
+    parser.add_argument("--backend", default="hf",
+                        help="inference backend: hf (default), hf:<url>, openai:<base_url> "
+                             "or callable:<module>:<function>")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="concurrent requests per batch for HTTP backends (default: 1)")
+    warmup = parser.add_argument_group("warm-up")
+    warmup.add_argument("--no-warmup", action="store_true",
+                        help="skip the readiness probe and warm-up generations before the timed run")
+    warmup.add_argument("--warmup-generations", type=int, default=2,
+                        help="warm-up generations sent once the endpoint is ready (default: 2)")
+    warmup.add_argument("--warmup-timeout", type=float, default=600,
+                        help="seconds to wait for a scaled-to-zero endpoint (default: 600)")
+    warmup.add_argument("--latency-target", type=float, default=2.0,
+                        help="probe latency (seconds) at which the endpoint counts as ready (default: 2.0)")
+    parser.add_argument("--tasks", default=",".join(spec.name for spec in AGENTBENCH_TASKS),
+                        help="comma-separated tasks to run (default: all)")
+    parser.add_argument("--limit", action="append", default=[], metavar="[TASK=]N",
+                        help="evaluate only the first N items of every task, or of one task; "
+                             "repeatable (default: the full split)")
+    run_budget.add_arguments(parser)
+    metrics_exporter.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Run all evaluations and generate results"""
+    global BACKEND, COLD_START, BUDGET
+    args = parse_args(argv)
+    limits = parse_limits(args.limit)
+    selected = set(args.tasks.split(","))
+    specs = [spec for spec in AGENTBENCH_TASKS if spec.name in selected]
 
-    success_rate = (correct / len(problems) * 100) if problems else 0
     print(f"\n{'='*80}")
-    print(f"KNOWLEDGE GRAPH: {correct}/{len(problems)} correct ({success_rate:.1f}%)")
-    print(f"{'='*80}")
-
-    return {"task": "knowledge_graph", "total": len(problems), "correct": correct,
-            "success_rate": success_rate, "results": results}
+    print("AGENTBENCH EVALUATION - Qwen2.5-3B-Instruct")
+    print(f"{'='*80}\n")
 
+    if args.backend.startswith("hf") and not HF_TOKEN:
+        print("Error: Please set HF_TOKEN environment variable")
+        print("Usage: export HF_TOKEN='your_token_here' && python3 agentbench_evaluation.py")
+        exit(1)
+    BACKEND = create_backend(args.backend, ENDPOINT_URL, HF_TOKEN, MODEL_ID,
+                             concurrency=args.concurrency, pace=1)
 
-# ==================== Main Execution ====================
-
-def main():
-    """Run all evaluations and generate results"""
     print("\n" + "="*80)
     print("STARTING FULL EVALUATION")
     print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Backend: {BACKEND.describe()}")
     print("="*80)
 
+    exporters = metrics_exporter.start_exporters(args.metrics_port, args.metrics_file, args.metrics_interval)
+    # Started before warm-up: the wall-clock budget covers the whole run
+    BUDGET = run_budget.from_args(args)
+    COLD_START = ColdStartDetector()
+    if not args.no_warmup:
+        print("\nWarming up endpoint...")
+        warm = warm_up(BACKEND, GENERATION_PARAMS, args.latency_target, args.warmup_timeout,
+                       generations=args.warmup_generations)
+        COLD_START = ColdStartDetector(warm['baseline_latency'], cold=not warm['ready'])
+
     # Create results directory
     os.makedirs(RESULTS_DIR, exist_ok=True)
-
-    # Run all tests
-    print("\n[1/4] Testing Math Reasoning...")
-    math_results = test_math_reasoning()
-
-    print("\n[2/4] Testing Common Sense QA...")
-    csqa_results = test_common_sense_qa()
-
-    print("\n[3/4] Testing SQL Generation...")
-    sql_results = test_sql_generation()
-
-    print("\n[4/4] Testing Knowledge Graph...")
-    kg_results = test_knowledge_graph()
-
-    # Save individual JSON files
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
-    tasks = [
-        ("math_reasoning", math_results),
-        ("common_sense_qa", csqa_results),
-        ("sql_generation", sql_results),
-        ("knowledge_graph", kg_results)
-    ]
-
-    for task_name, task_data in tasks:
-        filename = os.path.join(RESULTS_DIR, f"{task_name}_{timestamp}.json")
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump({
-                "model": MODEL_ID,
-                "endpoint": ENDPOINT_URL,
-                "test_date": datetime.now().isoformat(),
-                **task_data
-            }, f, indent=2, ensure_ascii=False)
+    progress = ProgressTracker()
+    warehouse = None if args.no_warehouse else results_warehouse.connect(WAREHOUSE_PATH)
+
+    totals = {}
+    for spec in specs:
+        limit = limits.get(spec.name, limits.get(None))
+        totals[spec.name] = count_items(spec.path, limit) if os.path.exists(spec.path) else 0
+        progress.expect(spec.name, totals[spec.name])
+        if BUDGET:
+            BUDGET.expect(totals[spec.name])
+
+    results = {}
+    not_run = []
+    for i, spec in enumerate(specs, 1):
+        if BUDGET and BUDGET.check():
+            not_run.append(spec.label)
+            continue
+        print(f"\n[{i}/{len(specs)}] Testing {spec.label}...")
+
+        # Records stream straight to the result file, the columnar store and the warehouse
+        filename = os.path.join(RESULTS_DIR, f"{spec.name}_{timestamp}.json")
+        test_date = datetime.now().isoformat()
+        json_writer = StreamingJSONWriter(filename, {
+            "model": MODEL_ID, "endpoint": BACKEND.describe(), "test_date": test_date})
+        writer = None
+        if args.columnar:
+            writer = ColumnarResultWriter(store_path_for(filename), {
+                "model": MODEL_ID, "endpoint": BACKEND.describe(), "task": spec.name, "timestamp": timestamp})
+        category_writer = None
+        if warehouse:
+            category_writer = results_warehouse.CategoryWriter(
+                warehouse, "agentbench", MODEL_ID, BACKEND.describe(), timestamp, spec.name, test_date, filename)
+
+        result = run_task_spec(spec, limits.get(spec.name, limits.get(None)),
+                               sink=record_sink(*(w.append for w in (json_writer, writer, category_writer) if w)),
+                               progress=progress, total=totals[spec.name])
+        results[spec.name] = result
+
+        json_writer.close(**result)
+        if writer:
+            writer.close(total=result['total'], correct=result['correct'],
+                         errors=result['errors'], success_rate=result['success_rate'])
+        if category_writer:
+            category_writer.close(result)
         print(f"\n✓ Saved: {filename}")
+    SQL_JUDGE.close()
+    specs = [spec for spec in specs if spec.name in results]
+    budget_report = BUDGET.report() if BUDGET else None
+    status = ""
+    if budget_report and budget_report['stop_reason']:
+        cut_short = [spec.label for spec in specs if results[spec.name]['incomplete']]
+        status = (f"\n**Status**: INCOMPLETE - {budget_report['stop_reason']}; "
+                  f"cut short: {', '.join(cut_short) or 'none'}; not run: {', '.join(not_run) or 'none'}")
+    budget_note = f"\n- Run budget: {run_budget.budget_line(budget_report)}" if budget_report else ""
 
     # Generate summary MD
-    total_tests = sum(t[1]['total'] for t in tasks)
-    total_correct = sum(t[1]['correct'] for t in tasks)
-    avg_rate = sum(t[1]['success_rate'] for t in tasks) / len(tasks)
+    total_tests = sum(r['total'] for r in results.values())
+    total_correct = sum(r['correct'] for r in results.values())
+    total_errors = sum(r['errors'] for r in results.values())
+    avg_rate = sum(r['success_rate'] for r in results.values()) / len(results) if results else 0
+
+    task_rows = "\n".join(
+        f"| {spec.label} | {results[spec.name]['total']} | {results[spec.name]['correct']} | "
+        f"{results[spec.name]['errors']} | **{results[spec.name]['success_rate']:.1f}%** |" for spec in specs)
+    task_analysis = "\n\n".join(
+        f"{i}. **{spec.label} ({results[spec.name]['success_rate']:.1f}%)**\n"
+        f"   - {results[spec.name]['correct']}/{results[spec.name]['total']} answered correctly\n"
+        f"   - Task: {spec.description}" for i, spec in enumerate(specs, 1))
+    result_files = "\n".join(f"- `{spec.name}_{timestamp}.json`" for spec in specs)
 
     summary_file = os.path.join(RESULTS_DIR, f"EVALUATION_SUMMARY_{timestamp}.md")
     with open(summary_file, 'w', encoding='utf-8') as f:
@@ -456,18 +356,15 @@ def main():
 
 **Model**: {MODEL_ID}
 **Test Date**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-**Evaluation Method**: Manual judgment for each response
+**Evaluation Method**: Manual judgment for each response{status}
 
 ---
 
 ## Task Success Rates
 
-| Task | Total | Correct | Success Rate |
-|------|-------|---------|--------------|
-| Math Reasoning | {math_results['total']} | {math_results['correct']} | **{math_results['success_rate']:.1f}%** |
-| Common Sense QA | {csqa_results['total']} | {csqa_results['correct']} | **{csqa_results['success_rate']:.1f}%** |
-| SQL Generation | {sql_results['total']} | {sql_results['correct']} | **{sql_results['success_rate']:.1f}%** |
-| Knowledge Graph | {kg_results['total']} | {kg_results['correct']} | **{kg_results['success_rate']:.1f}%** |
+| Task | Total | Correct | Failed Requests | Success Rate |
+|------|-------|---------|-----------------|--------------|
+{task_rows}
 
 ---
 
@@ -476,34 +373,25 @@ def main():
 **Overall Performance:**
 - Total questions tested: {total_tests}
 - Total correct: {total_correct}
-- Average success rate: {avg_rate:.1f}%
+- Failed requests (not judged): {total_errors}
+- Tokens: {approx(results.values())}{sum(r.get('prompt_tokens', 0) for r in results.values()):,} prompt / {approx(results.values())}{sum(r.get('completion_tokens', 0) for r in results.values()):,} completion
+- Average success rate: {avg_rate:.1f}%{budget_note}
 
 **Task-by-Task Analysis:**
 
-1. **Math Reasoning ({math_results['success_rate']:.1f}%)**
-   - {math_results['correct']}/{math_results['total']} problems solved correctly
-   - Task: Basic arithmetic and word problems
+{task_analysis}
 
-2. **Common Sense QA ({csqa_results['success_rate']:.1f}%)**
-   - {csqa_results['correct']}/{csqa_results['total']} questions answered correctly
-   - Task: Multiple choice common sense reasoning
+---
 
-3. **SQL Generation ({sql_results['success_rate']:.1f}%)**
-   - {sql_results['correct']}/{sql_results['total']} queries generated correctly
-   - Task: Natural language to SQL translation
+## Token Usage
 
-4. **Knowledge Graph ({kg_results['success_rate']:.1f}%)**
-   - {kg_results['correct']}/{kg_results['total']} entities identified correctly
-   - Task: Multi-hop reasoning over knowledge graphs
+{token_table({spec.label: results[spec.name] for spec in specs})}
 
 ---
 
 ## Result Files
 
-- `math_reasoning_{timestamp}.json`
-- `common_sense_qa_{timestamp}.json`
-- `sql_generation_{timestamp}.json`
-- `knowledge_graph_{timestamp}.json`
+{result_files}
 
 *Generated: {datetime.now().isoformat()}*
 """)
@@ -514,12 +402,17 @@ def main():
     print("\n" + "="*80)
     print("EVALUATION COMPLETE")
     print("="*80)
-    print(f"Math Reasoning:    {math_results['correct']}/{math_results['total']} ({math_results['success_rate']:.1f}%)")
-    print(f"Common Sense QA:   {csqa_results['correct']}/{csqa_results['total']} ({csqa_results['success_rate']:.1f}%)")
-    print(f"SQL Generation:    {sql_results['correct']}/{sql_results['total']} ({sql_results['success_rate']:.1f}%)")
-    print(f"Knowledge Graph:   {kg_results['correct']}/{kg_results['total']} ({kg_results['success_rate']:.1f}%)")
+    for spec in specs:
+        r = results[spec.name]
+        print(f"{spec.label + ':':<19}{r['correct']}/{r['total']} ({r['success_rate']:.1f}%)")
     print("="*80)
+    print(f"Failed requests: {total_errors}")
+    if budget_report:
+        print(f"Budget: {run_budget.budget_line(budget_report)}")
+        if not_run:
+            print(f"INCOMPLETE - not run: {', '.join(not_run)}")
     print(f"\nAll results saved to: {RESULTS_DIR}/")
+    exporters.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,310 @@
+"""
+Inference Backends
+One interface (single, batch and async generation) over the HuggingFace
+Inference Endpoint, OpenAI-compatible servers (vLLM, llama.cpp server, ...)
+and in-process Python callables
+
+Every method makes a single attempt per prompt and returns result dicts of
+the form {"success", "response", "error", "latency", ...}; retries are the
+caller's job (see retry_policy / runner). Where the server reports them,
+successful results also carry "prompt_tokens", "completion_tokens",
+"finish_reason" and "timing" (server-side milliseconds).
+"""
+
+import asyncio
+import importlib
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from retry_policy import FATAL, failure_result
+
+# TGI response headers with server-side timings in milliseconds
+TGI_TIMING_HEADERS = {"x-queue-time": "queue_ms", "x-inference-time": "inference_ms",
+                      "x-time-per-token": "time_per_token_ms"}
+
+
+def _int_or_none(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def tgi_usage(details: Optional[Dict[str, Any]], headers: Any) -> Dict[str, Any]:
+    """Token counts, finish reason and timings from a TGI response's `details` and x-* headers"""
+    details = details or {}
+    usage = {
+        "prompt_tokens": _int_or_none(headers.get("x-prompt-tokens")),
+        "completion_tokens": _int_or_none(details.get("generated_tokens", headers.get("x-generated-tokens"))),
+        "finish_reason": details.get("finish_reason"),
+    }
+    timing = {}
+    for header, key in TGI_TIMING_HEADERS.items():
+        try:
+            timing[key] = float(headers[header])
+        except (KeyError, TypeError, ValueError):
+            pass
+    if timing:
+        usage["timing"] = timing
+    return usage
+
+
+class InferenceBackend(ABC):
+    """Base class; subclasses implement generate() and may override generate_batch()"""
+
+    name = "backend"
+
+    def __init__(self, max_concurrency: int = 1, batch_size: Optional[int] = None, pace: float = 0.0):
+        self.max_concurrency = max_concurrency
+        # How many prompts the runner hands over per generate_batch() call
+        self.batch_size = batch_size or max_concurrency
+        # Pause (seconds) the runner leaves between batches to stay polite to shared endpoints
+        self.pace = pace
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    @abstractmethod
+    def generate(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """One attempt at one prompt"""
+
+    def generate_batch(self, prompts: List[str], params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Generate for several prompts; by default up to max_concurrency requests at a time"""
+        if self.max_concurrency <= 1 or len(prompts) <= 1:
+            return [self.generate(prompt, params) for prompt in prompts]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        return list(self._pool.map(lambda prompt: self.generate(prompt, params), prompts))
+
+    def generate_many(self, prompts: List[str], params_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Generate with per-prompt parameters (e.g. per-item grammars), up to max_concurrency at a time"""
+        if self.max_concurrency <= 1 or len(prompts) <= 1:
+            return [self.generate(prompt, params) for prompt, params in zip(prompts, params_list)]
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        return list(self._pool.map(self.generate, prompts, params_list))
+
+    def _generate_grouped(self, prompts: List[str], params_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """generate_many() for batching backends: one generate_batch() per distinct parameters object"""
+        groups: Dict[int, List[int]] = {}
+        for idx, params in enumerate(params_list):
+            groups.setdefault(id(params), []).append(idx)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(prompts)
+        for indices in groups.values():
+            batch = self.generate_batch([prompts[i] for i in indices], params_list[indices[0]])
+            for idx, result in zip(indices, batch):
+                results[idx] = result
+        return results
+
+    def probe(self, timeout: float = 10) -> Dict[str, Any]:
+        """Cheap readiness check: {"ok", "status_code", "latency", "error"}; by default a 1-token generation"""
+        result = self.generate("ping", {"max_new_tokens": 1})
+        return {"ok": result['success'], "status_code": result.get('status_code'),
+                "latency": result.get('latency'), "error": result.get('error')}
+
+    def _probe_url(self, session: requests.Session, url: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """GET a health route; None when the server has no such route (fall back to probe())"""
+        start = time.perf_counter()
+        try:
+            response = session.get(url, timeout=timeout)
+        except requests.RequestException as e:
+            return {"ok": False, "status_code": None, "latency": round(time.perf_counter() - start, 3),
+                    "error": str(e)}
+        if response.status_code in (404, 405):
+            return None
+        return {"ok": response.ok, "status_code": response.status_code,
+                "latency": round(time.perf_counter() - start, 3),
+                "error": None if response.ok else f"HTTP {response.status_code}"}
+
+    async def agenerate(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        return await asyncio.to_thread(self.generate, prompt, params)
+
+    async def agenerate_batch(self, prompts: List[str], params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.generate_batch, prompts, params)
+
+    def describe(self) -> str:
+        return self.name
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+class HFEndpointBackend(InferenceBackend):
+    """HuggingFace Inference Endpoint (TGI) - one HTTP request per prompt"""
+
+    name = "hf"
+
+    def __init__(self, url: str, token: str, timeout: float = 120, details: bool = True, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.timeout = timeout
+        # Ask TGI for generation details (token count, finish reason) alongside the text
+        self.details = details
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        })
+
+    def generate(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            parameters = {**params, "details": True} if self.details else params
+            response = self.session.post(self.url, json={"inputs": prompt, "parameters": parameters},
+                                         timeout=self.timeout)
+            response.raise_for_status()
+            result = response.json()
+
+            details = None
+            if isinstance(result, list) and len(result) > 0:
+                generated_text = result[0].get('generated_text', '')
+                details = result[0].get('details')
+            elif isinstance(result, dict):
+                generated_text = result.get('generated_text', result.get('text', ''))
+                details = result.get('details')
+            else:
+                generated_text = str(result)
+
+            return {"success": True, "response": generated_text, "error": None,
+                    "latency": round(time.perf_counter() - start, 3), **tgi_usage(details, response.headers)}
+        except Exception as e:
+            return failure_result(e)
+
+    def probe(self, timeout: float = 10) -> Dict[str, Any]:
+        """TGI's /health route answers 200 once the model is loaded (503 while scaling from zero)"""
+        return self._probe_url(self.session, self.url.rstrip('/') + "/health", timeout) or super().probe(timeout)
+
+    def describe(self) -> str:
+        return self.url
+
+
+class OpenAICompatibleBackend(InferenceBackend):
+    """OpenAI-compatible /v1/completions server; a batch goes out as one multi-prompt request"""
+
+    name = "openai"
+
+    def __init__(self, base_url: str, model: str, api_key: Optional[str] = None,
+                 timeout: float = 300, **kwargs):
+        kwargs.setdefault("batch_size", 16)
+        super().__init__(**kwargs)
+        self.base_url = base_url.rstrip('/')
+        if not self.base_url.endswith("/v1"):
+            self.base_url += "/v1"
+        self.model = model
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["Content-Type"] = "application/json"
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def _payload(self, prompts: List[str], params: Dict[str, Any]) -> Dict[str, Any]:
+        payload = {"model": self.model, "prompt": prompts}
+        if "max_new_tokens" in params:
+            payload["max_tokens"] = params["max_new_tokens"]
+        for key in ("temperature", "top_p", "stop", "seed"):
+            if key in params:
+                payload[key] = params[key]
+        if params.get("grammar", {}).get("type") == "json":
+            # vLLM's guided decoding takes the JSON schema directly
+            payload["guided_json"] = params["grammar"]["value"]
+        return payload
+
+    def generate(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self.generate_batch([prompt], params)[0]
+
+    def generate_many(self, prompts: List[str], params_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self._generate_grouped(prompts, params_list)
+
+    def generate_batch(self, prompts: List[str], params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        start = time.perf_counter()
+        try:
+            response = self.session.post(f"{self.base_url}/completions", json=self._payload(prompts, params),
+                                         timeout=self.timeout)
+            response.raise_for_status()
+            body = response.json()
+            choices = sorted(body['choices'], key=lambda c: c.get('index', 0))
+        except Exception as e:
+            failure = failure_result(e)
+            if failure['error_kind'] == FATAL and len(prompts) > 1:
+                # One bad prompt (e.g. over the context length) rejects the whole batch; isolate it
+                return [self.generate_batch([prompt], params)[0] for prompt in prompts]
+            return [dict(failure) for _ in prompts]
+
+        if len(choices) != len(prompts):
+            error = f"Server returned {len(choices)} choices for {len(prompts)} prompts"
+            return [{"success": False, "response": "", "error": error, "error_kind": FATAL} for _ in prompts]
+
+        latency = round(time.perf_counter() - start, 3)
+        # `usage` covers the whole request, so it is only per-prompt for a batch of one
+        usage = (body.get('usage') or {}) if len(prompts) == 1 else {}
+        return [{"success": True, "response": choice.get('text', ''), "error": None,
+                 "latency": latency, "batch_size": len(prompts),
+                 "prompt_tokens": usage.get('prompt_tokens'), "completion_tokens": usage.get('completion_tokens'),
+                 "finish_reason": choice.get('finish_reason')} for choice in choices]
+
+    def probe(self, timeout: float = 10) -> Dict[str, Any]:
+        return self._probe_url(self.session, f"{self.base_url}/models", timeout) or super().probe(timeout)
+
+    def describe(self) -> str:
+        return f"{self.base_url} ({self.model})"
+
+
+class CallableBackend(InferenceBackend):
+    """In-process backend: `fn(prompts, params) -> list of generated texts`, called once per batch"""
+
+    name = "callable"
+
+    def __init__(self, fn: Callable[[List[str], Dict[str, Any]], List[str]], **kwargs):
+        kwargs.setdefault("batch_size", 32)
+        super().__init__(**kwargs)
+        self.fn = fn
+
+    def generate(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self.generate_batch([prompt], params)[0]
+
+    def generate_many(self, prompts: List[str], params_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self._generate_grouped(prompts, params_list)
+
+    def generate_batch(self, prompts: List[str], params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        start = time.perf_counter()
+        try:
+            texts = list(self.fn(prompts, params))
+        except Exception as e:
+            return [{"success": False, "response": "", "error": str(e), "error_kind": FATAL} for _ in prompts]
+
+        if len(texts) != len(prompts):
+            error = f"Callable returned {len(texts)} texts for {len(prompts)} prompts"
+            return [{"success": False, "response": "", "error": error, "error_kind": FATAL} for _ in prompts]
+
+        latency = round(time.perf_counter() - start, 3)
+        return [{"success": True, "response": text, "error": None, "latency": latency,
+                 "batch_size": len(prompts)} for text in texts]
+
+    def describe(self) -> str:
+        return f"{self.fn.__module__}.{getattr(self.fn, '__name__', 'callable')}"
+
+
+def create_backend(spec: str, endpoint_url: str, token: str, model: str,
+                   concurrency: int = 1, pace: float = 0.0) -> InferenceBackend:
+    """Build a backend from a command-line spec
+
+    hf                          the configured HuggingFace endpoint
+    hf:<url>                    another TGI-compatible endpoint
+    openai:<base_url>           OpenAI-compatible server, e.g. openai:http://localhost:8000
+    callable:<module>:<func>    in-process batch function func(prompts, params) -> texts
+    """
+    kind, _, target = spec.partition(":")
+    if kind == "hf":
+        return HFEndpointBackend(target or endpoint_url, token, max_concurrency=concurrency, pace=pace)
+    if kind == "openai":
+        return OpenAICompatibleBackend(target or "http://localhost:8000", model, max_concurrency=concurrency)
+    if kind == "callable":
+        module_name, _, function_name = target.rpartition(":")
+        fn = getattr(importlib.import_module(module_name), function_name)
+        return CallableBackend(fn)
+    raise ValueError(f"Unknown backend spec: {spec!r}")
@@ -5,23 +5,56 @@ Evaluates Qwen agent/function calling capabilities using BFCL test data
 
 import os
 import json
+import argparse
 import time
-import requests
 import re
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
+
+import budget as run_budget
+import metrics_exporter
+import results_warehouse
+from progress import ProgressTracker
+from fingerprint import fingerprint, previous_records
+from result_records import CategoryTally, ResultRecord, approx, intern_ground_truth, token_report, token_table
+from results_store import ColumnarResultWriter, StreamingJSONWriter, record_sink, store_path_for
+from backends import HFEndpointBackend, InferenceBackend, create_backend
+from retry_policy import FATAL, RetryPolicy
+from runner import run_items
+from warmup import ColdStartDetector, warm_up
+from sampling import SequentialStopper, stratified_order
+from scheduling import SCHEDULES, group_by_schema, prefix_sharing, schema_hash, sharing_report
+from prompt_guard import CONTEXT_WINDOW, input_budget, preflight, preflight_report
+from tokenization import ESTIMATE_MARGIN
+from grammar import GRAMMAR_MODES, cache_stats as grammar_cache_stats, constrained_params, parse_constrained_call
 
 # Configuration - Token from environment variable
 HF_TOKEN = os.environ.get('HF_TOKEN', '')
-if not HF_TOKEN:
-    print("Error: Please set HF_TOKEN environment variable")
-    print("Usage: export HF_TOKEN='your_token_here' && python3 berkeley_evaluation.py")
-    exit(1)
 
 # Your HuggingFace Inference Endpoint
 ENDPOINT_URL = "https://mzkzbztaqbgxlted.us-east-1.aws.endpoints.huggingface.cloud"
 MODEL_ID = "Qwen/Qwen2.5-3B-Instruct"
 RESULTS_DIR = "/Users/mac/Documents/GitHub/Agent-benchmark-test/Results/Berkeley"
+WAREHOUSE_PATH = os.path.join(os.path.dirname(RESULTS_DIR), "results.db")
+RETRY_POLICY = RetryPolicy()
+
+GENERATION_PARAMS = {
+    "max_new_tokens": 256,
+    "temperature": 0.1,
+    "top_p": 0.95,
+    "return_full_text": False
+}
+
+# Replaced in main(); tags results produced while the endpoint is still cold
+COLD_START: Optional[ColdStartDetector] = None
+# Replaced in main() according to --backend
+BACKEND: InferenceBackend = HFEndpointBackend(ENDPOINT_URL, HF_TOKEN, pace=0.3)
+# Pre-flight prompt length guard, set from --max-input-tokens / --compact-schemas / --preflight-workers
+MAX_INPUT_TOKENS = input_budget(GENERATION_PARAMS)
+COMPACT_SCHEMAS = False
+PREFLIGHT_WORKERS: Optional[int] = None
+# Replaced in main() when a run budget is set (--max-requests etc.); shared by every category
+BUDGET: Optional[run_budget.BudgetTracker] = None
 
 # BFCL data path
 BFCL_DATA_PATH = os.path.join(
@@ -29,51 +62,23 @@ BFCL_DATA_PATH = os.path.join(
     "Berkeley/venv/lib/python3.12/site-packages/bfcl_eval/data"
 )
 
-print(f"\n{'='*80}")
-print("BERKELEY FUNCTION CALLING LEADERBOARD EVALUATION")
-print(f"Model: {MODEL_ID}")
-print(f"{'='*80}\n")
-
 
 # ==================== Helper Functions ====================
 
-def generate_response(prompt: str, max_retries: int = 3) -> Dict[str, Any]:
-    """Generate response using HuggingFace Inference Endpoint"""
-    headers = {
-        "Accept": "application/json",
-        "Authorization": f"Bearer {HF_TOKEN}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "inputs": prompt,
-        "parameters": {
-            "max_new_tokens": 256,
-            "temperature": 0.1,
-            "top_p": 0.95,
-            "return_full_text": False
-        }
-    }
+def generate_response(prompt: str, category: str, max_retries: int = 3) -> Dict[str, Any]:
+    """Generate response using the configured inference backend (HuggingFace endpoint by default)
 
+    Only the legacy per-category tests use this; they bypass the runner, so
+    the metrics hooks are fed here (and item outcomes by the tests).
+    """
     for attempt in range(max_retries):
-        try:
-            response = requests.post(ENDPOINT_URL, headers=headers, json=payload, timeout=120)
-            response.raise_for_status()
-            result = response.json()
-
-            if isinstance(result, list) and len(result) > 0:
-                generated_text = result[0].get('generated_text', '')
-            elif isinstance(result, dict):
-                generated_text = result.get('generated_text', result.get('text', ''))
-            else:
-                generated_text = str(result)
-
-            return {"success": True, "response": generated_text, "error": None}
-        except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(3)
-            else:
-                return {"success": False, "response": "", "error": str(e)}
+        metrics_exporter.request_started(category)
+        result = BACKEND.generate(prompt, GENERATION_PARAMS)
+        metrics_exporter.request_finished(category, result)
+        if result['success'] or result.get('error_kind') == FATAL or attempt == max_retries - 1:
+            return result
+        metrics_exporter.retry_scheduled(category, result, 0)
+        time.sleep(RETRY_POLICY.backoff(attempt + 1, result.get('retry_after')))
 
     return {"success": False, "response": "", "error": "Max retries exceeded"}
 
@@ -94,6 +99,15 @@ def load_bfcl_data(test_name: str, limit: int = None) -> List[Dict]:
     return data
 
 
+def count_bfcl_items(test_name: str) -> int:
+    """Count the items in a BFCL category without parsing them"""
+    data_file = os.path.join(BFCL_DATA_PATH, f"BFCL_v4_{test_name}.json")
+    if not os.path.exists(data_file):
+        return 0
+    with open(data_file, 'rb') as f:
+        return sum(1 for line in f if line.strip())
+
+
 def load_bfcl_answers(test_name: str) -> Dict[str, Any]:
     """Load BFCL ground truth answers"""
     answer_file = os.path.join(BFCL_DATA_PATH, "possible_answer", f"BFCL_v4_{test_name}.json")
@@ -104,17 +118,25 @@ def load_bfcl_answers(test_name: str) -> Dict[str, Any]:
     with open(answer_file, 'r') as f:
         for line in f:
             item = json.loads(line)
-            answers[item['id']] = item['ground_truth']
+            answers[item['id']] = intern_ground_truth(item['ground_truth'])
     return answers
 
 
-def format_function_schema(functions: List[Dict]) -> str:
-    """Format function definitions for the prompt"""
+def format_function_schema(functions: List[Dict], compact: bool = False) -> str:
+    """Format function definitions for the prompt
+
+    `compact` renders the parameters as minified JSON, for prompts that
+    would otherwise not fit the model's input budget.
+    """
     formatted = []
     for func in functions:
+        parameters = func.get('parameters', {})
         func_str = f"Function: {func['name']}\n"
         func_str += f"Description: {func.get('description', 'No description')}\n"
-        func_str += f"Parameters: {json.dumps(func.get('parameters', {}), indent=2)}"
+        if compact:
+            func_str += f"Parameters: {json.dumps(parameters, separators=(',', ':'))}"
+        else:
+            func_str += f"Parameters: {json.dumps(parameters, indent=2)}"
         formatted.append(func_str)
     return "\n\n".join(formatted)
 
@@ -224,7 +246,7 @@ function_name(arg1=value1, arg2=value2)
 
 Response:"""
 
-        result = generate_response(prompt)
+        result = generate_response(prompt, test_name)
 
         if result['success']:
             parsed_call = parse_function_call(result['response'])
@@ -242,6 +264,7 @@ Response:"""
             parsed_call = None
             print(f"  ✗ ERROR: {result['error'][:50]}")
 
+        metrics_exporter.item_done(test_name, result['success'], is_correct)
         results.append({
             "id": test_id,
             "question": question,
@@ -304,7 +327,7 @@ function_name(arg1=value1, arg2=value2)
 
 Response:"""
 
-        result = generate_response(prompt)
+        result = generate_response(prompt, "parallel")
 
         if result['success']:
             parsed_call = parse_function_call(result['response'])
@@ -320,6 +343,7 @@ Response:"""
             parsed_call = None
             print(f"  ✗ ERROR")
 
+        metrics_exporter.item_done("parallel", result['success'], is_correct)
         results.append({
             "id": test_id,
             "question": question,
@@ -377,7 +401,7 @@ If not applicable: NO_FUNCTION_NEEDED
 
 Response:"""
 
-        result = generate_response(prompt)
+        result = generate_response(prompt, "irrelevance")
 
         if result['success']:
             response_lower = result['response'].lower()
@@ -397,6 +421,7 @@ Response:"""
             is_correct = False
             print(f"  ✗ ERROR")
 
+        metrics_exporter.item_done("irrelevance", result['success'], is_correct)
         results.append({
             "id": test_id,
             "question": question,
@@ -418,36 +443,51 @@ Response:"""
 
 # ==================== Generic Test Function ====================
 
-def test_generic(test_name: str, limit: int = None, is_irrelevance: bool = False):
-    """Generic test function for any BFCL category - tests ALL data if limit is None"""
-    print(f"\n{'='*80}")
-    print(f"TASK: {test_name.upper().replace('_', ' ')}")
-    print(f"{'='*80}")
+# Call formats the prompts ask for: plain text, or the JSON a grammar-constrained endpoint emits
+TEXT_CALL_FORMAT = ("function_name(arg1=value1, arg2=value2)", "function_name(args)")
+JSON_CALL_FORMAT = ('{"name": "function_name", "arguments": {"arg1": value1, "arg2": value2}}',
+                    '{"name": "function_name", "arguments": {...}}')
 
-    data = load_bfcl_data(test_name, limit)
-    answers = load_bfcl_answers(test_name)
 
-    if not data:
-        print(f"No test data found for {test_name}")
-        return {"task": test_name, "total": 0, "correct": 0, "success_rate": 0, "results": []}
+def build_prompt(question: str, functions: List[Dict], is_irrelevance: bool = False,
+                 prefix_first: bool = False, json_calls: bool = False, compact: bool = False) -> str:
+    """Render the BFCL prompt for one item
 
-    results = []
-    correct = 0
+    With `prefix_first` every instruction and the function schema come before
+    the user query, so items sharing a schema share everything but the tail.
+    With `json_calls` the model is asked for the JSON call form that
+    grammar-constrained decoding produces. `compact` minifies the schema.
+    """
+    func_schema = format_function_schema(functions, compact)
+    call_format, short_call = JSON_CALL_FORMAT if json_calls else TEXT_CALL_FORMAT
 
-    print(f"\nTesting {len(data)} tasks...")
+    if prefix_first and is_irrelevance:
+        return f"""You are a helpful assistant.
+If none of the functions can answer the query, say "NO_FUNCTION_NEEDED".
+If applicable: {short_call}
+If not applicable: NO_FUNCTION_NEEDED
 
-    for idx, item in enumerate(data, 1):
-        test_id = item['id']
-        question = item['question'][0][0]['content']
-        functions = item['function']
-        ground_truth = answers.get(test_id, [])
+Available Functions:
+{func_schema}
 
-        print(f"[{idx}/{len(data)}] {question[:55]}...")
+User Query: {question}
 
-        func_schema = format_function_schema(functions)
+Response:"""
+
+    if prefix_first:
+        return f"""You are a helpful assistant that can call functions.
+Respond with ONLY the function call in this format:
+{call_format}
+
+Available Functions:
+{func_schema}
 
-        if is_irrelevance:
-            prompt = f"""You are a helpful assistant.
+User Query: {question}
+
+Response:"""
+
+    if is_irrelevance:
+        return f"""You are a helpful assistant.
 If none of the functions can answer the query, say "NO_FUNCTION_NEEDED".
 
 Available Functions:
@@ -455,12 +495,12 @@ Available Functions:
 
 User Query: {question}
 
-If applicable: function_name(args)
+If applicable: {short_call}
 If not applicable: NO_FUNCTION_NEEDED
 
 Response:"""
-        else:
-            prompt = f"""You are a helpful assistant that can call functions.
+
+    return f"""You are a helpful assistant that can call functions.
 
 Available Functions:
 {func_schema}
@@ -468,50 +508,208 @@ Available Functions:
 User Query: {question}
 
 Respond with ONLY the function call in this format:
-function_name(arg1=value1, arg2=value2)
+{call_format}
 
 Response:"""
 
-        result = generate_response(prompt)
 
-        if result['success']:
-            if is_irrelevance:
-                response_lower = result['response'].lower()
-                is_correct = (
-                    "no_function" in response_lower or
-                    "none" in response_lower or
-                    "cannot" in response_lower or
-                    "not applicable" in response_lower
-                )
-            else:
-                parsed_call = parse_function_call(result['response'])
-                is_correct = evaluate_function_call(parsed_call, ground_truth)
+def judge_irrelevance(response: str) -> bool:
+    """Check that the model declined to call a function"""
+    response_lower = response.lower()
+    return (
+        "no_function" in response_lower or
+        "none" in response_lower or
+        "cannot" in response_lower or
+        "not applicable" in response_lower
+    )
+
+
+def build_bfcl_item(item: Dict[str, Any], ground_truth: List[Dict], is_irrelevance: bool = False,
+                    prefix_first: bool = False, model_id: Optional[str] = MODEL_ID,
+                    constrained: bool = False, string_args: bool = False, compact: bool = False) -> Dict[str, Any]:
+    """Runner item (prompt, judging data, fingerprint) for one BFCL test entry
+
+    The fingerprint covers the backend serving the run (BACKEND.describe()),
+    so --incremental never carries one backend's responses over to another.
+    Without a `model_id` the item carries no fingerprint, so its records are
+    never carried forward by --incremental. A `constrained` item asks for a
+    JSON call and carries generation `params` with its schema's grammar
+    (`string_args` for categories whose arguments are source literals).
+    """
+    question = item['question'][0][0]['content']
+    prompt = build_prompt(question, item['function'], is_irrelevance, prefix_first,
+                          json_calls=constrained, compact=compact)
+    item_schema = schema_hash(item['function'])
+    params = GENERATION_PARAMS
+    if constrained:
+        params = constrained_params(GENERATION_PARAMS, item['function'], item_schema, is_irrelevance, string_args)
+    built = {
+        "id": item['id'],
+        "question": question,
+        "ground_truth": ground_truth,
+        "prompt": prompt,
+        "label": f"{question[:55]}...",
+        "stratum": (len(item['function']), len(ground_truth)),
+        "schema_hash": item_schema,
+        "fingerprint": fingerprint(prompt=prompt, functions=item['function'], ground_truth=ground_truth,
+                                   model=model_id, backend=BACKEND.describe(), parameters=params)
+                       if model_id else None,
+    }
+    if constrained:
+        built["params"] = params
+    return built
 
-            if is_correct:
-                correct += 1
-                print(f"  ✓ CORRECT")
-            else:
-                print(f"  ✗ INCORRECT")
-        else:
-            is_correct = False
-            print(f"  ✗ ERROR: {result['error'][:40] if result['error'] else 'Unknown'}")
 
-        results.append({
-            "id": test_id,
-            "question": question,
-            "model_response": result['response'],
-            "ground_truth": ground_truth,
-            "judged_correct": is_correct,
-            "success": result['success']
-        })
+def make_bfcl_judge(is_irrelevance: bool = False, constrained: bool = False) -> Callable[[Dict, Dict], ResultRecord]:
+    """Judge for one BFCL category: irrelevance detection or function-call matching
 
-        time.sleep(0.3)
+    Constrained responses are plain JSON and parse without the regex
+    heuristics (which remain the fallback if the endpoint ignored the grammar).
+    """
+    def judge(item: Dict, result: Dict) -> ResultRecord:
+        if not result['success']:
+            is_correct = False
+        elif is_irrelevance:
+            is_correct = judge_irrelevance(result['response'])
+        else:
+            parsed_call = parse_constrained_call(result['response']) if constrained else None
+            if parsed_call is None:
+                parsed_call = parse_function_call(result['response'])
+            is_correct = evaluate_function_call(parsed_call, item['ground_truth'])
+
+        # ground_truth is the answer file's list itself, shared rather than copied per record
+        return ResultRecord(item['id'], item['question'], result['response'], is_correct, result['success'],
+                            {"ground_truth": item['ground_truth'], "fingerprint": item['fingerprint']})
+    return judge
+
+
+def test_generic(test_name: str, limit: int = None, is_irrelevance: bool = False, sink=None,
+                 progress: Optional[ProgressTracker] = None,
+                 sampler: Optional[SequentialStopper] = None, seed: Optional[int] = None,
+                 previous: Optional[Dict[str, Dict]] = None, schedule: str = "file", grammar: bool = False):
+    """Generic test function for any BFCL category - tests ALL data if limit is None
+
+    Records are not kept in memory: `sink` receives each one as soon as it is
+    judged and the returned summary holds counts only. `progress`
+    receives the runner's counters for the live status view. With a `sampler`,
+    items are drawn in stratified random order and the category stops as soon
+    as the sampler's confidence interval is conclusive. `previous` maps test
+    ids to records of an earlier run: items whose fingerprint is unchanged
+    reuse that run's response (re-judged) instead of calling the endpoint.
+    With `schedule="prefix"` prompts put the stable part (instructions and
+    schema) first and pending items are grouped by schema, so requests that
+    share a prefix go out back-to-back. With `grammar` each request carries
+    a grammar compiled from the item's functions (see grammar.py). Before
+    anything is sent, prompts over MAX_INPUT_TOKENS are re-rendered with a
+    compact schema (COMPACT_SCHEMAS) or recorded as failed without a request.
+    """
+    print(f"\n{'='*80}")
+    print(f"TASK: {test_name.upper().replace('_', ' ')}{' (GRAMMAR-CONSTRAINED)' if grammar else ''}")
+    print(f"{'='*80}")
 
-    success_rate = (correct / len(data) * 100) if data else 0
-    print(f"\n{test_name.upper()}: {correct}/{len(data)} correct ({success_rate:.1f}%)")
+    data = load_bfcl_data(test_name, limit)
+    answers = load_bfcl_answers(test_name)
 
-    return {"task": test_name, "total": len(data), "correct": correct,
-            "success_rate": success_rate, "results": results}
+    if not data:
+        print(f"No test data found for {test_name}")
+        return {"task": test_name, "total": 0, "correct": 0, "errors": 0, "success_rate": 0}
+
+    prefix_first = schedule == "prefix"
+    items = []
+    file_order_prompts = []
+    string_args = test_name in STRING_ARGUMENT_CATEGORIES
+    for item in data:
+        items.append(build_bfcl_item(item, answers.get(item['id'], []), is_irrelevance, prefix_first,
+                                     constrained=grammar, string_args=string_args))
+        if prefix_first:
+            file_order_prompts.append(build_prompt(items[-1]['question'], item['function'], is_irrelevance,
+                                                   json_calls=grammar))
+    population = len(items)
+    judge = make_bfcl_judge(is_irrelevance, constrained=grammar)
+
+    tally = CategoryTally(test_name)
+    if previous is not None:
+        pending = []
+        for item in items:
+            prior = previous.get(item['id'])
+            if prior and prior['fingerprint'] == item['fingerprint']:
+                record = judge(item, {"success": True, "response": prior['model_response']})
+                record.attempts = 0
+                record.latency = prior.get('latency')
+                record.extra["carried_forward"] = True
+                tally.add(record)
+                if sink:
+                    sink(record)
+                if sampler:
+                    sampler.update(record)
+            else:
+                pending.append(item)
+        print(f"\nIncremental: {tally.total} unchanged items carried forward, {len(pending)} to query")
+        items = pending
+        if progress:
+            progress.expect(test_name, len(pending))
+
+    if sampler:
+        items = [] if sampler.reason else stratified_order(items, key=lambda i: i['stratum'], seed=seed)
+        if prefix_first:
+            print("Note: sequential sampling keeps its stratified order; only the prompt layout is prefix-first")
+    elif prefix_first:
+        pending_ids = {item['id'] for item in items}
+        items = group_by_schema(items)
+        shared_ratio = prefix_sharing([item['prompt'] for item in items])['shared_ratio']
+        print(sharing_report([p for p, item in zip(file_order_prompts, data) if item['id'] in pending_ids],
+                             [item['prompt'] for item in items], len({item['schema_hash'] for item in items})))
+
+    rerender = None
+    if COMPACT_SCHEMAS:
+        raw_items = {item['id']: item for item in data}
+        rerender = lambda item: build_bfcl_item(raw_items[item['id']], item['ground_truth'], is_irrelevance,
+                                                prefix_first, constrained=grammar, string_args=string_args,
+                                                compact=True)
+    guard = preflight(items, MAX_INPUT_TOKENS, rerender, PREFLIGHT_WORKERS)
+    print(preflight_report(guard))
+
+    print(f"\nTesting {len(items)} tasks{' (sequential sampling)' if sampler else ''}...")
+
+    carried = tally.total
+    if grammar:
+        # Identical prompts share a schema and so a grammar; the lookup keeps the runner prompt-only
+        params_by_prompt = {item['prompt']: item['params'] for item in items}
+        generate = lambda prompts: BACKEND.generate_many(prompts, [params_by_prompt[p] for p in prompts])
+        print(f"Grammars: {len({id(p) for p in params_by_prompt.values()})} distinct for {len(items)} items "
+              f"(cache: {grammar_cache_stats['misses']} compiled, {grammar_cache_stats['hits']} reused so far)")
+    else:
+        generate = lambda prompts: BACKEND.generate_batch(prompts, GENERATION_PARAMS)
+    run_items(items, generate,
+              judge, RETRY_POLICY, batch_size=BACKEND.batch_size, pace=BACKEND.pace,
+              sink=sink, progress=progress, category=test_name,
+              stop=sampler.update if sampler else None, tally=tally, cold_start=COLD_START, budget=BUDGET)
+    summary = tally.summary()
+    if previous is not None:
+        summary["carried_forward"] = carried
+    if prefix_first and not sampler:
+        summary["prefix_shared_ratio"] = shared_ratio
+    if guard['over_length']:
+        summary["over_length"] = len(guard['over_length'])
+        summary["compacted"] = len(guard['compacted'])
+        summary["not_sent"] = guard['blocked']
+
+    print(f"\n{test_name.upper()}: {summary['correct']}/{summary['total']} correct "
+          f"({summary['success_rate']:.1f}%), {summary['errors']} failed requests")
+    if summary['skipped']:
+        print(f"  {summary['skipped']} items skipped by budget sampling")
+    if summary['incomplete']:
+        print(f"  INCOMPLETE: {summary['incomplete']}")
+    print(f"  {token_report(summary)}")
+    if summary['cold_starts']:
+        print(f"  {summary['cold_starts']} results tagged as produced during a cold start (excluded from mean latency)")
+
+    if sampler:
+        summary.update(sampler.summary(), population=population)
+        print(f"  {sampler.confidence:.0%} CI on judged items: [{summary['ci_low']:.1f}%, {summary['ci_high']:.1f}%] "
+              f"after {summary['total']}/{population} items (stop: {summary['stop_reason']})")
+
+    return summary
 
 
 # ==================== Main ====================
@@ -534,67 +732,234 @@ ALL_TEST_CATEGORIES = [
     ("live_irrelevance", True),
     ("live_relevance", False),
 ]
+# Categories whose arguments are source-code literals, constrained to strings under --grammar
+STRING_ARGUMENT_CATEGORIES = ("simple_java", "simple_javascript")
+
+
+def grammar_comparison(plain: Dict[str, Dict], constrained: Dict[str, Dict]) -> str:
+    """Markdown table of accuracy, latency and completion length, unconstrained vs grammar-constrained"""
+    def cell(r: Dict[str, Any], key: str, fmt: str) -> str:
+        return format(r[key], fmt) if r.get(key) is not None else "n/a"
+
+    def per_item(r: Dict[str, Any]) -> str:
+        return f"{r.get('completion_tokens', 0) / r['total']:.1f}" if r['total'] else "n/a"
+
+    lines = ["| Category | Accuracy (off → on) | Mean Latency s (off → on) | Completion Tokens/Item (off → on) |",
+             "|----------|---------------------|---------------------------|-----------------------------------|"]
+    for name, g in constrained.items():
+        r = plain.get(name)
+        if r is None:
+            continue
+        lines.append(f"| {name} | {r['success_rate']:.1f}% → {g['success_rate']:.1f}% "
+                     f"({g['success_rate'] - r['success_rate']:+.1f}) | "
+                     f"{cell(r, 'mean_latency', '.2f')} → {cell(g, 'mean_latency', '.2f')} | "
+                     f"{per_item(r)} → {per_item(g)} |")
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Berkeley Function Calling Leaderboard evaluation")
+    parser.add_argument("--columnar", action="store_true",
+                        help="also write a compressed columnar store (<result>.cols/) next to each result file")
+    parser.add_argument("--no-warehouse", action="store_true",
+                        help=f"do not write results through to the SQLite warehouse ({WAREHOUSE_PATH})")
+    parser.add_argument("--backend", default="hf",
+                        help="inference backend: hf (default), hf:<url>, openai:<base_url> "
+                             "or callable:<module>:<function>")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="concurrent requests per batch for HTTP backends (default: 1)")
+    warmup = parser.add_argument_group("warm-up")
+    warmup.add_argument("--no-warmup", action="store_true",
+                        help="skip the readiness probe and warm-up generations before the timed run")
+    warmup.add_argument("--warmup-generations", type=int, default=2,
+                        help="warm-up generations sent once the endpoint is ready (default: 2)")
+    warmup.add_argument("--warmup-timeout", type=float, default=600,
+                        help="seconds to wait for a scaled-to-zero endpoint (default: 600)")
+    warmup.add_argument("--latency-target", type=float, default=2.0,
+                        help="probe latency (seconds) at which the endpoint counts as ready (default: 2.0)")
+    sampling = parser.add_argument_group("sequential sampling")
+    sampling.add_argument("--sample", action="store_true",
+                          help="draw items in stratified random order and stop each category early "
+                               "once its accuracy confidence interval is conclusive")
+    sampling.add_argument("--ci-width", type=float, default=0.10,
+                          help="stop once the interval is narrower than this (default: 0.10, i.e. ±5 points; "
+                               "a 95%% interval gets there after ~380 judged items at 50%% accuracy, ~250 at 80%%)")
+    sampling.add_argument("--baseline", metavar="TIMESTAMP",
+                          help="compare against a previous run from the warehouse ('latest' or a run timestamp)")
+    sampling.add_argument("--tolerance", type=float, default=0.02,
+                          help="stop once the interval is entirely within or outside baseline ± tolerance")
+    sampling.add_argument("--min-items", type=int, default=30,
+                          help="judged items required before any stopping rule applies")
+    sampling.add_argument("--seed", type=int, help="random seed for the sampling order")
+    parser.add_argument("--schedule", choices=SCHEDULES, default="file",
+                        help="request order: file (default) or prefix - instructions and schema first in "
+                             "each prompt, items grouped by schema for server-side prefix caching")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only query items whose prompt, schema, ground truth, model or generation "
+                             "parameters changed since the previous run; carry the rest forward")
+    parser.add_argument("--grammar", choices=GRAMMAR_MODES, default="off",
+                        help="grammar-constrained decoding from each item's function schemas: off (default), "
+                             "on, or both - run every category unconstrained and constrained and compare")
+    preflight_group = parser.add_argument_group("pre-flight length guard")
+    preflight_group.add_argument("--max-input-tokens", type=int, default=MAX_INPUT_TOKENS,
+                                 help=f"prompt token budget; longer prompts are never sent (default: {CONTEXT_WINDOW} "
+                                      f"context window minus max_new_tokens = {MAX_INPUT_TOKENS}; "
+                                      f"{ESTIMATE_MARGIN:.0%} less while token counts are estimated)")
+    preflight_group.add_argument("--compact-schemas", action="store_true",
+                                 help="re-render over-budget prompts with a minified function schema before giving up")
+    preflight_group.add_argument("--preflight-workers", type=int,
+                                 help="processes for counting prompt tokens (default: CPU count)")
+    run_budget.add_arguments(parser)
+    metrics_exporter.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    global BACKEND, COLD_START, BUDGET, MAX_INPUT_TOKENS, COMPACT_SCHEMAS, PREFLIGHT_WORKERS
+    args = parse_args(argv)
+    MAX_INPUT_TOKENS, COMPACT_SCHEMAS, PREFLIGHT_WORKERS = (args.max_input_tokens, args.compact_schemas,
+                                                            args.preflight_workers)
+
+    print(f"\n{'='*80}")
+    print("BERKELEY FUNCTION CALLING LEADERBOARD EVALUATION")
+    print(f"Model: {MODEL_ID}")
+    print(f"{'='*80}\n")
+
+    if args.backend.startswith("hf") and not HF_TOKEN:
+        print("Error: Please set HF_TOKEN environment variable")
+        print("Usage: export HF_TOKEN='your_token_here' && python3 berkeley_evaluation.py")
+        exit(1)
+    BACKEND = create_backend(args.backend, ENDPOINT_URL, HF_TOKEN, MODEL_ID,
+                             concurrency=args.concurrency, pace=0.3)
 
-def main():
     print("\n" + "="*80)
     print("BERKELEY FUNCTION CALLING LEADERBOARD - FULL EVALUATION")
     print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Backend: {BACKEND.describe()}")
     print(f"Total Categories: {len(ALL_TEST_CATEGORIES)}")
     print("="*80)
 
+    exporters = metrics_exporter.start_exporters(args.metrics_port, args.metrics_file, args.metrics_interval)
+    # Started before warm-up: the wall-clock budget covers the whole run
+    BUDGET = run_budget.from_args(args)
+    COLD_START = ColdStartDetector()
+    if not args.no_warmup:
+        print("\nWarming up endpoint...")
+        warm = warm_up(BACKEND, GENERATION_PARAMS, args.latency_target, args.warmup_timeout,
+                       generations=args.warmup_generations)
+        COLD_START = ColdStartDetector(warm['baseline_latency'], cold=not warm['ready'])
+
     os.makedirs(RESULTS_DIR, exist_ok=True)
 
     all_results = {}
+    grammar_results = {}
+    # (constrained?, suffix) passes per category
+    passes = {"off": [(False, "")], "on": [(True, "_grammar")],
+              "both": [(False, ""), (True, "_grammar")]}[args.grammar]
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    warehouse = None if args.no_warehouse else results_warehouse.connect(WAREHOUSE_PATH)
+
+    progress = ProgressTracker()
+    for test_name, _ in ALL_TEST_CATEGORIES:
+        progress.expect(test_name, count_bfcl_items(test_name) * len(passes))
+        if BUDGET:
+            BUDGET.expect(count_bfcl_items(test_name) * len(passes))
+    not_run = []
 
     for i, (test_name, is_irrelevance) in enumerate(ALL_TEST_CATEGORIES, 1):
-        print(f"\n[{i}/{len(ALL_TEST_CATEGORIES)}] Testing {test_name}...")
-        result = test_generic(test_name, limit=None, is_irrelevance=is_irrelevance)  # Test ALL data
-        all_results[test_name] = result
-
-        # Save individual result
-        filename = os.path.join(RESULTS_DIR, f"bfcl_{test_name}_{timestamp}.json")
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump({
-                "model": MODEL_ID,
-                "endpoint": ENDPOINT_URL,
-                "test_date": datetime.now().isoformat(),
-                **result
-            }, f, indent=2, ensure_ascii=False)
+        for constrained, suffix in passes:
+            task = f"{test_name}{suffix}"
+            if BUDGET and BUDGET.check():
+                not_run.append(task)
+                continue
+            print(f"\n[{i}/{len(ALL_TEST_CATEGORIES)}] Testing {test_name}{' (grammar)' if constrained else ''}...")
+            filename = os.path.join(RESULTS_DIR, f"bfcl_{task}_{timestamp}.json")
+
+            # Records stream straight to the result file, the columnar store and the warehouse
+            test_date = datetime.now().isoformat()
+            json_writer = StreamingJSONWriter(filename, {
+                "model": MODEL_ID, "endpoint": BACKEND.describe(), "test_date": test_date})
+            writer = None
+            if args.columnar:
+                writer = ColumnarResultWriter(store_path_for(filename), {
+                    "model": MODEL_ID, "endpoint": BACKEND.describe(), "task": task, "timestamp": timestamp})
+            category_writer = None
+            if warehouse:
+                category_writer = results_warehouse.CategoryWriter(
+                    warehouse, "bfcl", MODEL_ID, BACKEND.describe(), timestamp, task, test_date, filename)
+            sink = record_sink(*(w.append for w in (json_writer, writer, category_writer) if w))
+
+            sampler = None
+            if args.sample:
+                baseline = None
+                if args.baseline and warehouse:
+                    baseline = results_warehouse.category_accuracy(
+                        warehouse, task, MODEL_ID, None if args.baseline == "latest" else args.baseline)
+                    if baseline is None:
+                        print(f"Warning: no baseline run found for {task}; using the width rule only")
+                sampler = SequentialStopper(args.ci_width, baseline, args.tolerance, args.min_items)
+
+            previous = None
+            if args.incremental:
+                previous_file, previous = previous_records(RESULTS_DIR, f"bfcl_{task}", timestamp)
+                print(f"Incremental base: {previous_file or 'none (querying every item)'}")
+
+            result = test_generic(test_name, limit=None, is_irrelevance=is_irrelevance,  # Test ALL data
+                                  sink=sink, progress=progress,
+                                  sampler=sampler, seed=args.seed, previous=previous, schedule=args.schedule,
+                                  grammar=constrained)
+            if constrained and args.grammar == "both":
+                grammar_results[test_name] = result
+            else:
+                all_results[test_name] = result
+
+            json_writer.close(**result)
+            if writer:
+                writer.close(total=result['total'], correct=result['correct'],
+                             errors=result['errors'], success_rate=result['success_rate'])
+            if category_writer:
+                category_writer.close(result)
 
     # Calculate totals
     total_tests = sum(r['total'] for r in all_results.values())
     total_correct = sum(r['correct'] for r in all_results.values())
+    total_errors = sum(r['errors'] for r in all_results.values())
     valid_rates = [r['success_rate'] for r in all_results.values() if r['total'] > 0]
     avg_rate = sum(valid_rates) / len(valid_rates) if valid_rates else 0
 
     # Generate summary
+    budget_report = BUDGET.report() if BUDGET else None
+    incomplete = {name: r['incomplete'] for name, r in {**all_results, **grammar_results}.items() if r.get('incomplete')}
+    status = ""
+    if budget_report and budget_report['stop_reason']:
+        status = (f"\n**Status**: INCOMPLETE - {budget_report['stop_reason']}; "
+                  f"cut short: {', '.join(incomplete) or 'none'}; not run: {', '.join(not_run) or 'none'}")
     summary_file = os.path.join(RESULTS_DIR, f"BFCL_FULL_SUMMARY_{timestamp}.md")
     with open(summary_file, 'w', encoding='utf-8') as f:
         f.write(f"""# BFCL Full Evaluation Results
 
 **Model**: {MODEL_ID}
 **Date**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-**Categories Tested**: {len(ALL_TEST_CATEGORIES)}
+**Categories Tested**: {len(ALL_TEST_CATEGORIES)}{status}
 
 ## Results by Category
 
-| Category | Task | Correct | Total | Rate |
-|----------|------|---------|-------|------|
+| Category | Task | Correct | Errors | Total | Rate |
+|----------|------|---------|--------|-------|------|
 """)
         # Non-live
-        f.write("| **Non-Live** | | | | |\n")
+        f.write("| **Non-Live** | | | | | |\n")
         for name in ["simple_python", "simple_java", "simple_javascript", "multiple", "parallel", "parallel_multiple", "irrelevance"]:
             if name in all_results:
                 r = all_results[name]
-                f.write(f"| | {name} | {r['correct']} | {r['total']} | {r['success_rate']:.1f}% |\n")
+                f.write(f"| | {name} | {r['correct']} | {r['errors']} | {r['total']} | {r['success_rate']:.1f}% |\n")
 
         # Live
-        f.write("| **Live** | | | | |\n")
+        f.write("| **Live** | | | | | |\n")
         for name in ["live_simple", "live_multiple", "live_parallel", "live_parallel_multiple", "live_irrelevance", "live_relevance"]:
             if name in all_results:
                 r = all_results[name]
-                f.write(f"| | {name} | {r['correct']} | {r['total']} | {r['success_rate']:.1f}% |\n")
+                f.write(f"| | {name} | {r['correct']} | {r['errors']} | {r['total']} | {r['success_rate']:.1f}% |\n")
 
         f.write(f"""
 ## Summary
@@ -603,6 +968,9 @@ def main():
 |--------|-------|
 | Total Questions | {total_tests} |
 | Total Correct | {total_correct} |
+| Failed Requests (not judged) | {total_errors} |
+| Over Input Budget ({MAX_INPUT_TOKENS:,} tokens) | {sum(r.get('over_length', 0) for r in all_results.values())} ({sum(r.get('compacted', 0) for r in all_results.values())} compacted, {sum(len(r.get('not_sent', [])) for r in all_results.values())} not sent) |
+| Prompt / Completion Tokens | {approx(all_results.values())}{sum(r.get('prompt_tokens', 0) for r in all_results.values()):,} / {approx(all_results.values())}{sum(r.get('completion_tokens', 0) for r in all_results.values()):,} |
 | Overall Accuracy | {(total_correct/total_tests*100) if total_tests > 0 else 0:.1f}% |
 | Average Category Rate | {avg_rate:.1f}% |
 
@@ -614,15 +982,29 @@ def main():
         for name in non_live:
             if name in all_results:
                 r = all_results[name]
-                f.write(f"- **{name}**: {r['correct']}/{r['total']} ({r['success_rate']:.1f}%)\n")
+                ci = f" — sampled {r['total']}/{r['population']}, CI [{r['ci_low']:.1f}%, {r['ci_high']:.1f}%]" if r.get('sampled') else ""
+                f.write(f"- **{name}**: {r['correct']}/{r['total']} ({r['success_rate']:.1f}%){ci}\n")
 
         f.write("\n### Live Tests (Real-world)\n")
         live = ["live_simple", "live_multiple", "live_parallel", "live_parallel_multiple", "live_irrelevance", "live_relevance"]
         for name in live:
             if name in all_results:
                 r = all_results[name]
-                f.write(f"- **{name}**: {r['correct']}/{r['total']} ({r['success_rate']:.1f}%)\n")
-
+                ci = f" — sampled {r['total']}/{r['population']}, CI [{r['ci_low']:.1f}%, {r['ci_high']:.1f}%]" if r.get('sampled') else ""
+                f.write(f"- **{name}**: {r['correct']}/{r['total']} ({r['success_rate']:.1f}%){ci}\n")
+
+        f.write(f"\n## Token Usage\n\n{token_table(all_results)}\n")
+        if budget_report:
+            f.write(f"\n## Run Budget\n\n{run_budget.budget_line(budget_report)}\n")
+        not_sent = {name: r['not_sent'] for name, r in {**all_results, **grammar_results}.items() if r.get('not_sent')}
+        if not_sent:
+            f.write(f"\n## Not Sent (over the input budget)\n\n")
+            for name, ids in not_sent.items():
+                f.write(f"- **{name}**: {', '.join(ids)}\n")
+        if grammar_results:
+            f.write(f"\n## Grammar-Constrained Decoding\n\n{grammar_comparison(all_results, grammar_results)}\n")
+        elif args.grammar == "on":
+            f.write("\n*All categories ran with grammar-constrained decoding.*\n")
         f.write(f"\n*Generated: {datetime.now().isoformat()}*\n")
 
     print(f"\n✓ Summary saved: {summary_file}")
@@ -635,18 +1017,33 @@ def main():
     for name in ["simple_python", "simple_java", "simple_javascript", "multiple", "parallel", "parallel_multiple", "irrelevance"]:
         if name in all_results:
             r = all_results[name]
-            print(f"  {name:25s}: {r['correct']:2d}/{r['total']:2d} ({r['success_rate']:5.1f}%)")
+            print(f"  {name:25s}: {r['correct']:2d}/{r['total']:2d} ({r['success_rate']:5.1f}%), {r['errors']} failed")
 
     print("\nLive Tests:")
     for name in ["live_simple", "live_multiple", "live_parallel", "live_parallel_multiple", "live_irrelevance", "live_relevance"]:
         if name in all_results:
             r = all_results[name]
-            print(f"  {name:25s}: {r['correct']:2d}/{r['total']:2d} ({r['success_rate']:5.1f}%)")
+            print(f"  {name:25s}: {r['correct']:2d}/{r['total']:2d} ({r['success_rate']:5.1f}%), {r['errors']} failed")
 
     print("="*80)
     print(f"Total: {total_correct}/{total_tests} ({(total_correct/total_tests*100) if total_tests > 0 else 0:.1f}%)")
+    print(f"Failed requests: {total_errors}")
     print(f"Average Category Rate: {avg_rate:.1f}%")
+    if grammar_results:
+        print("\nGrammar-constrained vs unconstrained:")
+        for name, g in grammar_results.items():
+            r = all_results[name]
+            print(f"  {name:25s}: {r['success_rate']:5.1f}% -> {g['success_rate']:5.1f}% "
+                  f"({g['success_rate'] - r['success_rate']:+.1f}), mean latency "
+                  f"{r['mean_latency'] or 0:.2f}s -> {g['mean_latency'] or 0:.2f}s")
+    if budget_report:
+        print(f"Budget: {run_budget.budget_line(budget_report)}")
+        if not_run:
+            print(f"INCOMPLETE - not run: {', '.join(not_run)}")
+    if args.grammar != "off":
+        print(f"Grammars compiled: {grammar_cache_stats['misses']}, reused: {grammar_cache_stats['hits']}")
     print(f"\nResults saved to: {RESULTS_DIR}/")
+    exporters.stop()
 
 
 if __name__ == "__main__":
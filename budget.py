@@ -0,0 +1,190 @@
+"""
+Run Budgets
+Request, generated-token, wall-clock and error-rate limits for a whole
+evaluation run, tracked across every runner thread
+
+A budget counts as spent once less than `reserve` of it is left (leaving
+room for requests already in flight and for writing results), or once the
+error rate is over its limit. The runner then stops sending and the run is
+saved marked incomplete. With action "sample" the runner first scales down
+instead: from the cost per item so far it projects what the remaining items
+need, and admits only the fraction of them the budgets can still pay for
+(evenly spread, so every category keeps a sample).
+"""
+
+import argparse
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from result_records import ResultRecord
+
+BUDGET_ACTIONS = ("stop", "sample")
+# error_kind of items the runner records as failed because the budget ran out
+BUDGET_EXHAUSTED = "budget"
+
+
+@dataclass
+class Budget:
+    max_requests: Optional[int] = None
+    max_tokens: Optional[int] = None           # generated (completion) tokens
+    max_seconds: Optional[float] = None
+    max_error_rate: Optional[float] = None     # percent of final results
+    action: str = "stop"
+    reserve: float = 0.05
+    # Results needed before the error rate or the per-item cost is trusted
+    min_results: int = 20
+
+    @property
+    def enabled(self) -> bool:
+        return any(limit is not None for limit in
+                   (self.max_requests, self.max_tokens, self.max_seconds, self.max_error_rate))
+
+
+class BudgetTracker:
+    """Thread-safe usage counters checked against a Budget"""
+
+    def __init__(self, budget: Budget, expected_items: int = 0):
+        self.budget = budget
+        self.expected_items = expected_items
+        self.requests = 0
+        self.tokens = 0
+        self.results = 0
+        self.errors = 0
+        self.skipped = 0
+        self.started_at = time.monotonic()
+        self.stop_reason: Optional[str] = None
+        self._credit = 0.0
+        self._lock = threading.Lock()
+
+    # ---------- events ----------
+
+    def expect(self, items: int):
+        """Add items the run still intends to evaluate (for the sampling projection)"""
+        with self._lock:
+            self.expected_items += items
+
+    def reserve(self, count: int = 1) -> int:
+        """Claim up to `count` requests before sending them; fewer (or 0) once the request limit is near
+
+        Claimed requests count as sent, so concurrent runners can never
+        overrun max_requests between them; release() returns unused ones.
+        """
+        with self._lock:
+            if self.budget.max_requests is not None:
+                count = max(0, min(count, self.budget.max_requests - self.requests))
+            self.requests += count
+            return count
+
+    def release(self, count: int):
+        if count:
+            with self._lock:
+                self.requests -= count
+
+    def observe(self, record: ResultRecord):
+        with self._lock:
+            self.results += 1
+            if not record.success:
+                self.errors += 1
+            self.tokens += record.completion_tokens or 0
+
+    def admit(self) -> bool:
+        """Whether the next item should be evaluated; False skips it (action "sample" only)"""
+        with self._lock:
+            self._credit += self._sample_rate()
+            if self._credit >= 1:
+                self._credit -= 1
+                return True
+            self.skipped += 1
+            return False
+
+    # ---------- checks ----------
+
+    def _usage(self) -> List[Tuple[str, float, Optional[float]]]:
+        return [("request", self.requests, self.budget.max_requests),
+                ("token", self.tokens, self.budget.max_tokens),
+                ("wall-clock", time.monotonic() - self.started_at, self.budget.max_seconds)]
+
+    def check(self) -> Optional[str]:
+        """Why the run must stop now, or None; once set the reason sticks"""
+        with self._lock:
+            if self.stop_reason:
+                return self.stop_reason
+            for name, used, limit in self._usage():
+                if limit is not None and used >= limit * (1 - self.budget.reserve):
+                    self.stop_reason = f"{name} budget nearly spent ({used:,.0f} of {limit:,.0f})"
+                    return self.stop_reason
+            if (self.budget.max_error_rate is not None and self.results >= self.budget.min_results
+                    and self.errors / self.results * 100 > self.budget.max_error_rate):
+                self.stop_reason = (f"error rate {self.errors / self.results * 100:.1f}% over the "
+                                    f"{self.budget.max_error_rate:g}% budget")
+            return self.stop_reason
+
+    def _sample_rate(self) -> float:
+        if self.budget.action != "sample" or self.results < self.budget.min_results:
+            return 1.0
+        remaining = self.expected_items - self.results - self.skipped
+        if remaining <= 0:
+            return 1.0
+        rate = 1.0
+        for _, used, limit in self._usage():
+            if limit is None or not used:
+                continue
+            left = limit * (1 - self.budget.reserve) - used
+            needed = used / self.results * remaining
+            rate = min(rate, max(left, 0) / needed)
+        return rate
+
+    def sample_rate(self) -> float:
+        """Share of the remaining items the budgets can still pay for at the cost per item so far"""
+        with self._lock:
+            return self._sample_rate()
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "completion_tokens": self.tokens,
+                "seconds": round(time.monotonic() - self.started_at, 1),
+                "error_rate": round(self.errors / self.results * 100, 1) if self.results else 0.0,
+                "skipped_items": self.skipped,
+                "stop_reason": self.stop_reason,
+                "limits": {"max_requests": self.budget.max_requests, "max_tokens": self.budget.max_tokens,
+                           "max_seconds": self.budget.max_seconds, "max_error_rate": self.budget.max_error_rate,
+                           "action": self.budget.action},
+            }
+
+
+def budget_line(report: Dict[str, Any]) -> str:
+    """One-line usage summary for the console and result summaries"""
+    line = (f"{report['requests']:,} requests, {report['completion_tokens']:,} generated tokens, "
+            f"{report['seconds']:.0f}s, {report['error_rate']:.1f}% errors")
+    if report['skipped_items']:
+        line += f"; {report['skipped_items']} items skipped by budget sampling"
+    if report['stop_reason']:
+        line += f"; stopped: {report['stop_reason']}"
+    return line
+
+
+# ==================== CLI ====================
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """The run budget options shared by the evaluation scripts"""
+    group = parser.add_argument_group("run budget")
+    group.add_argument("--max-requests", type=int, help="never send more than this many endpoint requests (batches are trimmed to fit)")
+    group.add_argument("--max-tokens", type=int, help="stop after about this many generated tokens")
+    group.add_argument("--max-minutes", type=float, help="stop after about this much wall-clock time")
+    group.add_argument("--max-error-rate", type=float, metavar="PERCENT",
+                       help="stop once more than this share of results are failed requests")
+    group.add_argument("--on-budget", choices=BUDGET_ACTIONS, default="stop",
+                       help="stop (default): save what ran, marked incomplete; sample: scale down to a "
+                            "sampled subset of the remaining items to fit the budget, stopping only at the limit")
+
+
+def from_args(args: argparse.Namespace) -> Optional[BudgetTracker]:
+    """A tracker for the parsed options, or None when no budget was set"""
+    budget = Budget(args.max_requests, args.max_tokens,
+                    args.max_minutes * 60 if args.max_minutes is not None else None,
+                    args.max_error_rate, args.on_budget)
+    return BudgetTracker(budget) if budget.enabled else None
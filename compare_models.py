@@ -0,0 +1,408 @@
+"""
+Multi-model Comparison
+Runs the BFCL and/or AgentBench items against several model endpoints at
+once: datasets are loaded and prompts rendered once per category, every
+model works through the shared items concurrently under its own concurrency
+limit, and the run ends with per-model result files plus a side-by-side
+summary table
+
+Usage:
+    python3 compare_models.py --model Qwen/Qwen2.5-3B-Instruct=hf@4 \\
+        --model meta-llama/Llama-3.2-3B-Instruct=openai:http://localhost:8000@8
+    python3 compare_models.py --model a=hf:https://a.example --model b=hf:https://b.example \\
+        --suite bfcl --categories simple_python,irrelevance --limit 50
+"""
+
+import argparse
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import agentbench_evaluation as agentbench
+import berkeley_evaluation as bfcl
+import budget as run_budget
+import metrics_exporter
+import results_warehouse
+from backends import InferenceBackend, create_backend
+from data_stream import iter_items
+from results_store import StreamingJSONWriter, record_sink
+from runner import run_items
+from warmup import ColdStartDetector, warm_up
+
+RESULTS_DIR = "./Results"
+WAREHOUSE_PATH = os.path.join(RESULTS_DIR, "results.db")
+SUITES = ("bfcl", "agentbench", "both")
+
+
+@dataclass
+class ModelSpec:
+    """One model under comparison: its id, backend spec and request concurrency"""
+    name: str
+    backend: str
+    concurrency: int = 1
+
+
+@dataclass
+class CompareTask:
+    """One category of one suite: how to build its items once and judge any model's response"""
+    suite: str
+    name: str
+    build: Callable[[], List[Dict[str, Any]]]
+    judge: Callable
+    params: Dict[str, Any]
+    file_prefix: str
+
+
+def parse_model(value: str) -> ModelSpec:
+    """Parse NAME=BACKEND[@CONCURRENCY], e.g. Qwen/Qwen2.5-3B-Instruct=hf:https://...@4"""
+    name, sep, backend = value.partition("=")
+    if not sep or not name or not backend:
+        raise argparse.ArgumentTypeError(f"expected NAME=BACKEND[@CONCURRENCY], got {value!r}")
+    concurrency = 1
+    head, at, tail = backend.rpartition("@")
+    if at and tail.isdigit():
+        backend, concurrency = head, int(tail)
+    return ModelSpec(name, backend, concurrency)
+
+
+def model_slug(name: str) -> str:
+    """Directory-safe form of a model id"""
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', name).strip('_') or "model"
+
+
+# ==================== Shared Items ====================
+
+class SharedItems:
+    """Items of each category, built once for all models and dropped when the last model is done
+
+    The first model to reach a category builds its items (the others wait on
+    that category's lock); `release` counts models finishing it.
+    """
+
+    def __init__(self, consumers: int):
+        self.consumers = consumers
+        self.builds = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+    def _entry(self, key: str) -> Dict[str, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {"lock": threading.Lock(), "items": None,
+                                              "remaining": self.consumers}
+            return entry
+
+    def acquire(self, key: str, build: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        entry = self._entry(key)
+        with entry["lock"]:
+            if entry["items"] is None:
+                entry["items"] = build()
+                with self._lock:
+                    self.builds += 1
+            return entry["items"]
+
+    def release(self, key: str):
+        entry = self._entry(key)
+        with self._lock:
+            entry["remaining"] -= 1
+            if entry["remaining"] == 0:
+                entry["items"] = None
+
+
+def bfcl_tasks(categories: Optional[List[str]], limit: Optional[int]) -> List[CompareTask]:
+    tasks = []
+    for test_name, is_irrelevance in bfcl.ALL_TEST_CATEGORIES:
+        if categories and test_name not in categories:
+            continue
+
+        def build(test_name=test_name, is_irrelevance=is_irrelevance) -> List[Dict[str, Any]]:
+            answers = bfcl.load_bfcl_answers(test_name)
+            # Fingerprints name a model, so compare runs leave them out (no --incremental reuse)
+            return [bfcl.build_bfcl_item(item, answers.get(item['id'], []), is_irrelevance, model_id=None)
+                    for item in bfcl.load_bfcl_data(test_name, limit)]
+
+        tasks.append(CompareTask("bfcl", test_name, build, bfcl.make_bfcl_judge(is_irrelevance),
+                                 bfcl.GENERATION_PARAMS, f"bfcl_{test_name}"))
+    return tasks
+
+
+def agentbench_tasks(categories: Optional[List[str]], limit: Optional[int]) -> List[CompareTask]:
+    tasks = []
+    for spec in agentbench.AGENTBENCH_TASKS:
+        if categories and spec.name not in categories:
+            continue
+
+        def build(spec=spec) -> List[Dict[str, Any]]:
+            if not os.path.exists(spec.path):
+                print(f"Warning: Data file not found: {spec.path}")
+                return []
+            return [spec.build_item(idx, problem) for idx, problem in enumerate(iter_items(spec.path, limit), 1)]
+
+        tasks.append(CompareTask("agentbench", spec.name, build, agentbench.judge_item,
+                                 agentbench.GENERATION_PARAMS, spec.name))
+    return tasks
+
+
+# ==================== Per-model Runs ====================
+
+def _quiet(message: str):
+    pass
+
+
+def run_model(model: ModelSpec, backend: InferenceBackend, tasks: List[CompareTask], shared: SharedItems,
+              out_dir: str, timestamp: str, warmup: Optional[Dict[str, Any]] = None,
+              use_warehouse: bool = True, budget: Optional[run_budget.BudgetTracker] = None) -> Dict[str, Any]:
+    """Evaluate one model on every task in turn; returns {"summaries", "seconds", "not_run"}
+
+    `budget` is shared by all models; once it is spent the remaining tasks are skipped.
+    """
+    start = time.monotonic()
+    cold_start = ColdStartDetector()
+    if warmup is not None:
+        warm = warm_up(backend, tasks[0].params if tasks else {}, **warmup)
+        cold_start = ColdStartDetector(warm['baseline_latency'], cold=not warm['ready'])
+
+    model_dir = os.path.join(out_dir, model_slug(model.name))
+    os.makedirs(model_dir, exist_ok=True)
+    # sqlite connections are per thread
+    warehouse = results_warehouse.connect(WAREHOUSE_PATH) if use_warehouse else None
+    summaries = {}
+    not_run = []
+    for task in tasks:
+        if budget and budget.check():
+            shared.release(f"{task.suite}/{task.name}")
+            not_run.append(task.name)
+            continue
+        items = shared.acquire(f"{task.suite}/{task.name}", task.build)
+        if budget:
+            # Items are built lazily, so the sampling projection only learns each category as it starts
+            budget.expect(len(items))
+        try:
+            filename = os.path.join(model_dir, f"{task.file_prefix}_{timestamp}.json")
+            test_date = datetime.now().isoformat()
+            json_writer = StreamingJSONWriter(filename, {
+                "model": model.name, "endpoint": backend.describe(), "test_date": test_date})
+            category_writer = None
+            if warehouse:
+                category_writer = results_warehouse.CategoryWriter(
+                    warehouse, task.suite, model.name, backend.describe(), timestamp, task.name, test_date, filename)
+            sink = record_sink(*(w.append for w in (json_writer, category_writer) if w))
+
+            tally = run_items(items, lambda prompts, params=task.params: backend.generate_batch(prompts, params),
+                              task.judge, bfcl.RETRY_POLICY, batch_size=backend.batch_size, pace=backend.pace,
+                              sink=sink, category=task.name, total=len(items), cold_start=cold_start, echo=_quiet,
+                              budget=budget)
+        finally:
+            shared.release(f"{task.suite}/{task.name}")
+
+        summary = tally.summary()
+        summaries[(task.suite, task.name)] = summary
+        json_writer.close(**summary)
+        if category_writer:
+            category_writer.close(summary)
+        print(f"  [{model.name}] {task.name}: {summary['correct']}/{summary['total']} correct "
+              f"({summary['success_rate']:.1f}%), {summary['errors']} failed requests"
+              + (f" - INCOMPLETE ({summary['incomplete']})" if summary['incomplete'] else ""))
+
+    if warehouse:
+        warehouse.close()
+    return {"summaries": summaries, "seconds": time.monotonic() - start, "not_run": not_run}
+
+
+# ==================== Comparison Table ====================
+
+def _cell(summary: Optional[Dict[str, Any]]) -> str:
+    if not summary or not summary['total']:
+        return "-"
+    return f"{summary['correct']}/{summary['total']} ({summary['success_rate']:.1f}%)"
+
+
+def _latency_cell(summary: Optional[Dict[str, Any]]) -> str:
+    if not summary or summary.get('mean_latency') is None:
+        return "-"
+    return f"{summary['mean_latency']:.2f}s / {summary['errors']}"
+
+
+def comparison_rows(models: List[ModelSpec], tasks: List[CompareTask],
+                    runs: Dict[str, Dict[str, Any]], cell: Optional[Callable] = None) -> List[List[str]]:
+    """Category x model cells, plus an overall accuracy row for the default accuracy cells"""
+    rows = [[task.name] + [(cell or _cell)(runs[m.name]['summaries'].get((task.suite, task.name))) for m in models]
+            for task in tasks]
+    if cell is not None:
+        return rows
+    overall = []
+    for m in models:
+        summaries = runs[m.name]['summaries'].values()
+        total = sum(s['total'] for s in summaries)
+        correct = sum(s['correct'] for s in summaries)
+        overall.append(f"{correct}/{total} ({correct / total * 100:.1f}%)" if total else "-")
+    return rows + [["**Overall**"] + overall]
+
+
+def markdown_table(header: List[str], rows: List[List[str]]) -> str:
+    lines = ["| " + " | ".join(header) + " |", "|" + "|".join("---" for _ in header) + "|"]
+    lines += ["| " + " | ".join(row) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+def write_comparison(path: str, models: List[ModelSpec], tasks: List[CompareTask],
+                     runs: Dict[str, Dict[str, Any]], wall_seconds: float,
+                     budget_report: Optional[Dict[str, Any]] = None):
+    header = ["Category"] + [m.name for m in models]
+    timing = [["Backend"] + [runs[m.name]['backend'] for m in models],
+              ["Concurrency"] + [str(m.concurrency) for m in models],
+              ["Wall-clock"] + [f"{runs[m.name]['seconds']:.1f}s" for m in models]]
+    status = ""
+    if budget_report:
+        status = f"\n**Run budget**: {run_budget.budget_line(budget_report)}"
+        if budget_report['stop_reason']:
+            timing.append(["Not run (INCOMPLETE)"] + [", ".join(runs[m.name].get('not_run', [])) or "-" for m in models])
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"""# Model Comparison
+
+**Date**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+**Models**: {len(models)}
+**Total wall-clock**: {wall_seconds:.1f}s (models run concurrently){status}
+
+## Accuracy
+
+{markdown_table(header, comparison_rows(models, tasks, runs))}
+
+## Mean Latency / Failed Requests
+
+{markdown_table(header, comparison_rows(models, tasks, runs, _latency_cell))}
+
+## Runs
+
+{markdown_table(["", *[m.name for m in models]], timing)}
+
+*Generated: {datetime.now().isoformat()}*
+""")
+
+
+# ==================== Main ====================
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare several models on BFCL and AgentBench")
+    parser.add_argument("--model", action="append", type=parse_model, required=True,
+                        metavar="NAME=BACKEND[@CONCURRENCY]",
+                        help="model id and backend spec (hf, hf:<url>, openai:<base_url> or "
+                             "callable:<module>:<function>), optionally with its request concurrency; repeatable")
+    parser.add_argument("--suite", choices=SUITES, default="both", help="benchmarks to run (default: both)")
+    parser.add_argument("--categories", help="comma-separated BFCL categories / AgentBench tasks (default: all)")
+    parser.add_argument("--limit", type=int, help="evaluate only the first N items of each category")
+    parser.add_argument("--pace", type=float, default=0.3,
+                        help="seconds between batches for the HuggingFace endpoint backend (default: 0.3)")
+    parser.add_argument("--no-warehouse", action="store_true",
+                        help=f"do not write results through to the SQLite warehouse ({WAREHOUSE_PATH})")
+    warmup = parser.add_argument_group("warm-up")
+    warmup.add_argument("--no-warmup", action="store_true",
+                        help="skip the readiness probe and warm-up generations before the timed run")
+    warmup.add_argument("--warmup-generations", type=int, default=2,
+                        help="warm-up generations sent once an endpoint is ready (default: 2)")
+    warmup.add_argument("--warmup-timeout", type=float, default=600,
+                        help="seconds to wait for a scaled-to-zero endpoint (default: 600)")
+    warmup.add_argument("--latency-target", type=float, default=2.0,
+                        help="probe latency (seconds) at which an endpoint counts as ready (default: 2.0)")
+    run_budget.add_arguments(parser)
+    metrics_exporter.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    models: List[ModelSpec] = args.model
+    if len({m.name for m in models}) != len(models):
+        print("Error: model names must be unique")
+        exit(1)
+    if any(m.backend.startswith("hf") for m in models) and not bfcl.HF_TOKEN:
+        print("Error: Please set HF_TOKEN environment variable")
+        print("Usage: export HF_TOKEN='your_token_here' && python3 compare_models.py --model ...")
+        exit(1)
+
+    categories = args.categories.split(",") if args.categories else None
+    tasks: List[CompareTask] = []
+    if args.suite in ("bfcl", "both"):
+        tasks += bfcl_tasks(categories, args.limit)
+    if args.suite in ("agentbench", "both"):
+        tasks += agentbench_tasks(categories, args.limit)
+    if not tasks:
+        print("Error: no categories selected")
+        exit(1)
+
+    backends = {m.name: create_backend(m.backend, bfcl.ENDPOINT_URL, bfcl.HF_TOKEN, m.name,
+                                       concurrency=m.concurrency, pace=args.pace) for m in models}
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    out_dir = os.path.join(RESULTS_DIR, f"Compare_{timestamp}")
+
+    print("\n" + "="*80)
+    print("MODEL COMPARISON")
+    print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    for m in models:
+        print(f"  {m.name}: {backends[m.name].describe()} (concurrency {m.concurrency})")
+    print(f"Categories: {', '.join(task.name for task in tasks)}")
+    print("="*80)
+
+    warmup = None if args.no_warmup else {
+        "latency_target": args.latency_target, "timeout": args.warmup_timeout,
+        "generations": args.warmup_generations}
+    exporters = metrics_exporter.start_exporters(args.metrics_port, args.metrics_file, args.metrics_interval)
+    budget = run_budget.from_args(args)
+    shared = SharedItems(len(models))
+    runs: Dict[str, Dict[str, Any]] = {}
+    failures: Dict[str, BaseException] = {}
+
+    def worker(model: ModelSpec):
+        try:
+            runs[model.name] = run_model(model, backends[model.name], tasks, shared, out_dir, timestamp,
+                                         warmup, not args.no_warehouse, budget)
+        except BaseException as e:
+            failures[model.name] = e
+            runs[model.name] = {"summaries": {}, "seconds": 0.0, "not_run": []}
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(m,), name=model_slug(m.name)) for m in models]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.monotonic() - start
+    agentbench.SQL_JUDGE.close()
+
+    for name, error in failures.items():
+        print(f"Error: {name} stopped early: {error!r}")
+    for m in models:
+        runs[m.name]['backend'] = backends[m.name].describe()
+
+    os.makedirs(out_dir, exist_ok=True)
+    summary_file = os.path.join(out_dir, f"COMPARISON_{timestamp}.md")
+    budget_report = budget.report() if budget else None
+    write_comparison(summary_file, models, tasks, runs, wall_seconds, budget_report)
+
+    header = ["Category"] + [m.name for m in models]
+    rows = [header] + comparison_rows(models, tasks, runs)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    print("\n" + "="*80)
+    print("COMPARISON COMPLETE")
+    print("="*80)
+    for row in rows:
+        print("  ".join(cell.replace("**", "").ljust(width) for cell, width in zip(row, widths)))
+    print("="*80)
+    slowest = max((runs[m.name]['seconds'] for m in models), default=0.0)
+    print(f"Wall-clock: {wall_seconds:.1f}s (slowest model {slowest:.1f}s, "
+          f"sum over models {sum(runs[m.name]['seconds'] for m in models):.1f}s); "
+          f"{shared.builds} category item sets built once for {len(models)} models")
+    if budget_report:
+        print(f"Budget: {run_budget.budget_line(budget_report)}")
+    print(f"\n✓ Summary saved: {summary_file}")
+    print(f"All results saved to: {out_dir}/")
+    exporters.stop()
+
+
+if __name__ == "__main__":
+    main()
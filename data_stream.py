@@ -0,0 +1,139 @@
+"""
+Dataset Streaming
+Iterate benchmark items from JSONL files or from large top-level JSON arrays
+(or an array field of a JSON object) without loading the whole file into memory
+"""
+
+import json
+from itertools import islice
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+CHUNK_SIZE = 1 << 16
+
+_decoder = json.JSONDecoder()
+
+
+def iter_jsonl(path: str, limit: Optional[int] = None) -> Iterator[Any]:
+    """Yield the objects of a JSONL file, skipping blank lines"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = (line for line in f if line.strip())
+        for line in islice(lines, limit):
+            yield json.loads(line)
+
+
+class _ChunkReader:
+    """A text file read in chunks, with JSON values decoded from the buffered text"""
+
+    def __init__(self, f: TextIO, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def more(self) -> bool:
+        """Append the next chunk (dropping what was consumed); False at end of file"""
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip(self, chars: str):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in chars:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.more():
+                return
+
+    def peek(self) -> Optional[str]:
+        if self.pos >= len(self.buffer):
+            self.more()
+        return self.buffer[self.pos] if self.pos < len(self.buffer) else None
+
+    def decode(self) -> Any:
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.more():
+                    raise
+                continue
+            # Only trust a value followed by a separator: a number cut at the chunk
+            # boundary ("12" of "12.5") decodes too but continues in the next chunk
+            if (end < len(self.buffer) and self.buffer[end] in " \t\r\n,:]}") or not self.more():
+                self.pos = end
+                return value
+
+    def read_fields(self, header: Optional[Dict[str, Any]] = None, key: Optional[str] = None) -> bool:
+        """Decode object fields into `header` up to field `key` (True, positioned at its value) or the closing brace"""
+        while True:
+            self.skip(" \t\r\n,")
+            if self.peek() in ("}", None):
+                return False
+            name = self.decode()
+            self.skip(" \t\r\n:")
+            if name == key:
+                return True
+            value = self.decode()
+            if header is not None:
+                header[name] = value
+
+
+def iter_json_array(path: str, limit: Optional[int] = None, chunk_size: int = CHUNK_SIZE,
+                    key: Optional[str] = None, header: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+    """Yield the elements of a file holding one top-level JSON array, decoding incrementally
+
+    The file is read in chunks and each element is decoded with raw_decode as
+    soon as it is complete, so memory stays bounded by the largest element.
+    With `key` the array is that field of a top-level JSON object instead
+    (e.g. the `results` of a result file); the object's other fields are
+    decoded into `header` when one is given (those after the array only once
+    it has been read to the end).
+    """
+    count = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = _ChunkReader(f, chunk_size)
+        if key is not None:
+            reader.skip(" \t\r\n")
+            if reader.peek() != "{":
+                raise ValueError(f"{path} does not hold a JSON object")
+            reader.pos += 1
+            if not reader.read_fields(header, key):
+                raise KeyError(key)
+        reader.skip(" \t\r\n")
+        if reader.peek() == "[":
+            reader.pos += 1
+        while limit is None or count < limit:
+            # Skip whitespace and the separators between elements
+            reader.skip(" \t\r\n,")
+            if reader.peek() in ("]", None):
+                if key is not None and header is not None and reader.peek() == "]":
+                    reader.pos += 1
+                    reader.read_fields(header)
+                return
+            yield reader.decode()
+            count += 1
+
+
+def _is_json_array(path: str) -> bool:
+    if not path.endswith(".json"):
+        return False
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read(CHUNK_SIZE).lstrip().startswith("[")
+
+
+def iter_items(path: str, limit: Optional[int] = None) -> Iterator[Any]:
+    """Stream a dataset file: a top-level JSON array, or JSONL (whatever the extension)"""
+    return iter_json_array(path, limit) if _is_json_array(path) else iter_jsonl(path, limit)
+
+
+def count_items(path: str, limit: Optional[int] = None) -> int:
+    """Number of items iter_items() would yield (a decoding pass for JSON arrays)"""
+    if _is_json_array(path):
+        return sum(1 for _ in iter_json_array(path, limit))
+    with open(path, 'rb') as f:
+        count = sum(1 for line in f if line.strip())
+    return count if limit is None else min(count, limit)
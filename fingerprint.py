@@ -0,0 +1,44 @@
+"""
+Result Fingerprints
+Content hashes of everything that determines an endpoint response, used to
+carry unchanged results forward between runs
+"""
+
+import glob
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+
+def fingerprint(**parts: Any) -> str:
+    """SHA-256 over the canonical JSON encoding of the given parts"""
+    canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def latest_result_file(results_dir: str, prefix: str, exclude_timestamp: Optional[str] = None) -> Optional[str]:
+    """Most recent <prefix>_<timestamp>.json in results_dir, skipping the given timestamp"""
+    candidates = sorted(glob.glob(os.path.join(results_dir, f"{prefix}_????????_??????.json")))
+    if exclude_timestamp:
+        candidates = [c for c in candidates if not c.endswith(f"_{exclude_timestamp}.json")]
+    return candidates[-1] if candidates else None
+
+
+def load_reusable_records(path: str) -> Dict[str, Dict[str, Any]]:
+    """Successful, fingerprinted records of a previous result file, keyed by test id
+
+    Only the fields needed to carry a record forward are kept.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {str(r['id']): {"fingerprint": r['fingerprint'], "model_response": r['model_response'],
+                           "latency": r.get('latency')}
+            for r in data.get('results', []) if r.get('success') and r.get('fingerprint')}
+
+
+def previous_records(results_dir: str, prefix: str,
+                     exclude_timestamp: Optional[str] = None) -> Tuple[Optional[str], Dict[str, Dict[str, Any]]]:
+    """(path, reusable records) of the latest earlier run of a category"""
+    path = latest_result_file(results_dir, prefix, exclude_timestamp)
+    return path, (load_reusable_records(path) if path else {})
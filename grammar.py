@@ -0,0 +1,115 @@
+"""
+Grammar-constrained Function Calls
+Compiles a BFCL item's function definitions into a JSON-schema grammar
+(TGI's `grammar` parameter) that admits exactly one well-formed call to one
+of the functions, or "NO_FUNCTION_NEEDED" for the irrelevance categories,
+and parses the constrained output
+
+Compiled grammars are cached by schema hash, so every item sharing a
+function list shares one grammar (and one parameters dict).
+"""
+
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics_exporter as metrics
+
+NO_FUNCTION = "NO_FUNCTION_NEEDED"
+GRAMMAR_MODES = ("off", "on", "both")
+
+# BFCL's Python-flavoured and Java type names -> JSON-schema types
+TYPE_MAP = {
+    "dict": "object", "object": "object", "HashMap": "object", "Map": "object",
+    "float": "number", "double": "number", "number": "number", "Double": "number", "Float": "number",
+    "integer": "integer", "int": "integer", "long": "integer", "short": "integer", "byte": "integer",
+    "Integer": "integer", "Long": "integer",
+    "string": "string", "String": "string", "char": "string", "Character": "string",
+    "boolean": "boolean", "Boolean": "boolean",
+    "array": "array", "tuple": "array", "list": "array", "Array": "array", "ArrayList": "array",
+    "List": "array", "Set": "array", "HashSet": "array",
+}
+# Schema keywords kept when compiling; descriptions and defaults only cost grammar states
+KEPT_KEYWORDS = ("enum", "minimum", "maximum", "minItems", "maxItems")
+
+_cache: Dict[Tuple[str, bool, bool], Dict[str, Any]] = {}
+_cache_lock = threading.Lock()
+cache_stats = {"hits": 0, "misses": 0}
+
+
+def normalize_schema(node: Any, as_strings: bool = False) -> Dict[str, Any]:
+    """JSON schema for one BFCL parameter node
+
+    With `as_strings` (Java / JavaScript categories, whose arguments are
+    source-code literals) every leaf value is a string, as in BFCL itself.
+    """
+    if not isinstance(node, dict):
+        return {}
+    json_type = TYPE_MAP.get(node.get('type'))
+    schema: Dict[str, Any] = {}
+    if json_type == "object" or 'properties' in node:
+        properties = node.get('properties') or {}
+        if not properties:
+            return {"type": "object"}
+        schema = {
+            "type": "object",
+            "properties": {name: normalize_schema(child, as_strings) for name, child in properties.items()},
+            "additionalProperties": False,
+        }
+        required = [name for name in node.get('required') or [] if name in properties]
+        if required:
+            schema["required"] = required
+        return schema
+    if as_strings:
+        return {"type": "string"}
+    if json_type == "array":
+        schema = {"type": "array"}
+        if node.get('items'):
+            schema["items"] = normalize_schema(node['items'], as_strings)
+    elif json_type:
+        schema = {"type": json_type}
+    for keyword in KEPT_KEYWORDS:
+        if keyword in node:
+            schema[keyword] = node[keyword]
+    return schema
+
+
+def compile_grammar(functions: List[Dict[str, Any]], allow_none: bool = False,
+                    as_strings: bool = False) -> Dict[str, Any]:
+    """TGI grammar admitting {"name": <function>, "arguments": {...}} for any one function"""
+    calls = [{
+        "type": "object",
+        "properties": {"name": {"const": func['name']},
+                       "arguments": normalize_schema(func.get('parameters') or {"type": "dict"}, as_strings)},
+        "required": ["name", "arguments"],
+        "additionalProperties": False,
+    } for func in functions]
+    if allow_none:
+        calls.append({"const": NO_FUNCTION})
+    return {"type": "json", "value": calls[0] if len(calls) == 1 else {"anyOf": calls}}
+
+
+def constrained_params(base: Dict[str, Any], functions: List[Dict[str, Any]], schema_hash: str,
+                       allow_none: bool = False, as_strings: bool = False) -> Dict[str, Any]:
+    """Generation parameters with the item's grammar, shared by every item with the same schema"""
+    key = (schema_hash, allow_none, as_strings)
+    with _cache_lock:
+        params = _cache.get(key)
+        metrics.cache_lookup("grammar", params is not None)
+        if params is not None:
+            cache_stats["hits"] += 1
+            return params
+        cache_stats["misses"] += 1
+        params = _cache[key] = {**base, "grammar": compile_grammar(functions, allow_none, as_strings)}
+        return params
+
+
+def parse_constrained_call(response: str) -> Optional[Dict[str, Any]]:
+    """The call in a grammar-constrained response; None for NO_FUNCTION_NEEDED or non-JSON output"""
+    try:
+        call = json.loads(response)
+    except ValueError:
+        return None
+    if isinstance(call, dict) and isinstance(call.get('name'), str) and isinstance(call.get('arguments'), dict):
+        return call
+    return None
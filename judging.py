@@ -0,0 +1,228 @@
+"""
+AgentBench Judging Engine
+Scores whole batches of responses per task type with precompiled patterns
+and, for knowledge-graph answers, one Aho-Corasick automaton over every
+expected entity name and alias in the batch
+
+Usage:
+    python3 judging.py rescore Results/knowledge_graph_20250101_120000.json
+    python3 judging.py rescore Results/*_2025*.json --write
+"""
+
+import argparse
+import json
+import re
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+# Result-file task name -> judging task type
+TASK_TYPES = {
+    "math_reasoning": "math",
+    "common_sense_qa": "mcq",
+    "knowledge_graph": "kg",
+    "os_interaction": "os",
+}
+
+NUMBER_PATTERN = re.compile(r'-?\b\d+(?:,\d{3})*(?:\.\d+)?\b')
+# Option letters: a leading "B" / "(B)" / "B)", an explicit "answer is B", then any standalone letter
+MCQ_PATTERNS = (
+    re.compile(r'^\W*\(?([A-D])\b(?:[).:]|\s|$)'),
+    re.compile(r'\banswer\s*(?:is|:)?\s*\(?([A-D])\b', re.IGNORECASE),
+    re.compile(r'\b([a-dA-D])\b'),
+)
+# (question pattern, response pattern) for the OS interaction checks; first matching question wins
+OS_RULES = (
+    (re.compile(r'hidden files'), re.compile(r'ls -a|find')),
+    (re.compile(r'interval|seconds'), re.compile(r'watch|tail|stat|grep')),
+    (re.compile(r'calc|alias'), re.compile(r'alias|bc|function')),
+)
+
+
+class EntityMatcher:
+    """Aho-Corasick automaton mapping lowercase entity strings to the items that expect them
+
+    `scan` reports, in one pass over a text, every item whose entity occurs
+    with word boundaries on both sides.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per state: (pattern length, item ids) for every pattern ending there, including via fail links
+        self._out: List[List[Tuple[int, Set[int]]]] = [[]]
+        self._built = False
+
+    def add(self, pattern: str, item_id: int):
+        pattern = pattern.strip().lower()
+        if not pattern:
+            return
+        state = 0
+        for char in pattern:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        for length, ids in self._out[state]:
+            if length == len(pattern):
+                ids.add(item_id)
+                break
+        else:
+            self._out[state].append((len(pattern), {item_id}))
+
+    def build(self):
+        """Compute fail links breadth-first; call once after all add() calls"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._built = True
+
+    def scan(self, text: str) -> Set[int]:
+        """Item ids with an entity occurring in the (already lowercased) text"""
+        if not self._built:
+            self.build()
+        found: Set[int] = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, ids in out[state]:
+                start = end - length + 1
+                if (start == 0 or not text[start - 1].isalnum()) and \
+                        (end + 1 == len(text) or not text[end + 1].isalnum()):
+                    found |= ids
+        return found
+
+
+def entity_names(expected: Any) -> List[str]:
+    """Entity names and aliases of a KG answer list"""
+    names = []
+    for answer in expected if isinstance(expected, list) else []:
+        if isinstance(answer, dict):
+            names.append(answer.get('entity_name') or '')
+            names.extend(answer.get('aliases') or [])
+        else:
+            names.append(str(answer))
+    return [name for name in names if name]
+
+
+def _judge_kg(responses: Sequence[str], expected: Sequence[Any]) -> List[bool]:
+    matcher = EntityMatcher()
+    for idx, answer in enumerate(expected):
+        for name in entity_names(answer):
+            matcher.add(name, idx)
+    return [idx in matcher.scan(response.lower()) for idx, response in enumerate(responses)]
+
+
+def _judge_math(response: str, expected: Any) -> bool:
+    numbers = NUMBER_PATTERN.findall(response)
+    if not numbers or expected in (None, ""):
+        return False
+    try:
+        return abs(float(numbers[-1].replace(',', '')) - float(expected)) < 0.01
+    except ValueError:
+        return False
+
+
+def _judge_mcq(response: str, expected: Any) -> bool:
+    if not expected:
+        return False
+    for pattern in MCQ_PATTERNS:
+        match = pattern.search(response)
+        if match:
+            return match.group(1).upper() == str(expected).upper()
+    return False
+
+
+def _judge_os(response: str, question: str) -> bool:
+    response_lower = response.lower()
+    question_lower = question.lower()
+    for question_pattern, response_pattern in OS_RULES:
+        if question_pattern.search(question_lower):
+            return bool(response_pattern.search(response_lower))
+    return len(response_lower) > 50
+
+
+def judge_batch(task_type: str, responses: Sequence[str], expected: Sequence[Any],
+                questions: Optional[Sequence[str]] = None) -> List[bool]:
+    """Judge many responses of one task type at once; returns one verdict per response
+
+    SQL answers are judged by execution instead (see sql_judge).
+    """
+    if task_type == "kg":
+        return _judge_kg(responses, expected)
+    if task_type == "math":
+        return [_judge_math(r, e) for r, e in zip(responses, expected)]
+    if task_type == "mcq":
+        return [_judge_mcq(r, e) for r, e in zip(responses, expected)]
+    if task_type == "os":
+        return [_judge_os(r, q) for r, q in zip(responses, questions or [""] * len(responses))]
+    raise ValueError(f"No batch judge for task type {task_type!r}")
+
+
+# ==================== Offline Rescoring ====================
+
+def rescore_file(path: str, write: bool = False) -> Optional[Dict[str, Any]]:
+    """Re-judge the successful records of one result file; optionally rewrite its verdicts and counters"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    task_type = TASK_TYPES.get(data.get('task'))
+    if task_type is None:
+        return None
+
+    records = [r for r in data.get('results', []) if r.get('success', True)]
+    start = time.perf_counter()
+    verdicts = judge_batch(task_type, [r.get('model_response') or '' for r in records],
+                           [r.get('expected_answer') for r in records], [r.get('question') or '' for r in records])
+    elapsed = time.perf_counter() - start
+
+    changed = sum(1 for r, v in zip(records, verdicts) if bool(r.get('judged_correct')) != v)
+    before = data.get('correct', sum(1 for r in records if r.get('judged_correct')))
+    after = sum(verdicts)
+    if write and changed:
+        for record, verdict in zip(records, verdicts):
+            record['judged_correct'] = verdict
+        total = data.get('total', len(data['results']))
+        data.update(correct=after, incorrect=total - after - data.get('errors', 0),
+                    success_rate=(after / total * 100) if total else 0)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+    return {"path": path, "task": data['task'], "judged": len(records), "before": before, "after": after,
+            "changed": changed, "seconds": elapsed}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="AgentBench batch judging")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rescore = subparsers.add_parser("rescore", help="re-judge saved AgentBench result files")
+    rescore.add_argument("files", nargs="+", help="result JSON files")
+    rescore.add_argument("--write", action="store_true", help="store the new verdicts and counters in the files")
+    args = parser.parse_args(argv)
+
+    for path in args.files:
+        report = rescore_file(path, args.write)
+        if report is None:
+            print(f"{path}: skipped (not a batch-judged AgentBench task)")
+            continue
+        rate = report['judged'] / report['seconds'] if report['seconds'] else float('inf')
+        print(f"{report['task']:<18} {report['before']:>5} -> {report['after']:<5} correct  "
+              f"{report['changed']} changed  ({report['judged']} judged, {rate:,.0f} responses/s)"
+              f"{'  [written]' if args.write and report['changed'] else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Endpoint Load Test
+Replays the rendered BFCL/AgentBench prompts against an endpoint at stepped
+concurrency levels (closed loop) or at fixed arrival rates (open loop) and
+reports requests/sec, tokens/sec, error rate and latency percentiles per
+step, as a saturation curve with the knee marked
+
+The knee is the step with the highest power (throughput / mean latency):
+past it, extra load buys less throughput than it costs in latency.
+
+Usage:
+    python3 loadtest.py --concurrency 1,2,4,8,16 --duration 60
+    python3 loadtest.py --rate 0.5,1,2,4 --duration 120 --backend hf:https://...
+    python3 loadtest.py --standin --concurrency 1,2,4,8,16,32 --duration 10
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
+
+import berkeley_evaluation as bfcl
+from backends import InferenceBackend, create_backend
+from compare_models import SUITES, agentbench_tasks, bfcl_tasks
+from tokenization import count_tokens, counts_estimated
+from warmup import warm_up
+
+RESULTS_DIR = "./Results/LoadTest"
+PERCENTILES = (50, 90, 95, 99)
+
+
+def load_prompt_mix(suite: str, categories: Optional[List[str]], limit: Optional[int],
+                    seed: int = 0) -> List[Tuple[str, Dict[str, Any]]]:
+    """(prompt, generation params) of every selected item, shuffled into one mix"""
+    tasks = []
+    if suite in ("bfcl", "both"):
+        tasks += bfcl_tasks(categories, limit)
+    if suite in ("agentbench", "both"):
+        tasks += agentbench_tasks(categories, limit)
+    mix = [(item['prompt'], task.params) for task in tasks for item in task.build()]
+    random.Random(seed).shuffle(mix)
+    return mix
+
+
+class PromptFeed:
+    """Thread-safe cycle over the prompt mix"""
+
+    def __init__(self, mix: List[Tuple[str, Dict[str, Any]]]):
+        self.mix = mix
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def take(self) -> Tuple[str, Dict[str, Any]]:
+        with self._lock:
+            entry = self.mix[self._next % len(self.mix)]
+            self._next += 1
+            return entry
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of unsorted values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def _record(samples: List[Dict[str, Any]], lock: threading.Lock, prompt: str, result: Dict[str, Any],
+            latency: float):
+    tokens = result.get('completion_tokens')
+    counted = not result.get('prompt_tokens')
+    if tokens is None and result['success']:
+        counted = True
+        tokens = count_tokens(result['response'])
+    sample = {"success": result['success'], "latency": latency, "completion_tokens": tokens or 0,
+              "prompt_tokens": result.get('prompt_tokens') or count_tokens(prompt),
+              "tokens_estimated": counted and counts_estimated(),
+              "error_kind": result.get('error_kind')}
+    with lock:
+        samples.append(sample)
+
+
+# ==================== Load Generation ====================
+
+def run_closed_loop(backend: InferenceBackend, feed: PromptFeed, concurrency: int, duration: float,
+                    max_requests: Optional[int] = None) -> Tuple[List[Dict[str, Any]], float]:
+    """`concurrency` workers each send requests back-to-back for `duration` seconds"""
+    samples: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    sent = [0]
+
+    def worker():
+        while time.perf_counter() < deadline:
+            with lock:
+                if max_requests and sent[0] >= max_requests:
+                    return
+                sent[0] += 1
+            prompt, params = feed.take()
+            start = time.perf_counter()
+            result = backend.generate(prompt, params)
+            _record(samples, lock, prompt, result, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def run_open_loop(backend: InferenceBackend, feed: PromptFeed, rate: float, duration: float,
+                  max_inflight: int = 256, seed: int = 0) -> Tuple[List[Dict[str, Any]], float]:
+    """Poisson arrivals at `rate` requests/sec for `duration` seconds
+
+    Latency is measured from each request's scheduled arrival, so time spent
+    waiting for a free client slot counts against the endpoint instead of
+    silently lowering the offered load.
+    """
+    samples: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+    rng = random.Random(seed)
+
+    def send(prompt: str, params: Dict[str, Any], scheduled: float):
+        result = backend.generate(prompt, params)
+        _record(samples, lock, prompt, result, time.perf_counter() - scheduled)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+        arrival = start
+        while True:
+            arrival += rng.expovariate(rate)
+            if arrival - start > duration:
+                break
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            prompt, params = feed.take()
+            pool.submit(send, prompt, params, arrival)
+    return samples, time.perf_counter() - start
+
+
+def step_metrics(samples: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    ok = [s for s in samples if s['success']]
+    latencies = [s['latency'] for s in ok]
+    metrics = {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "error_rate": round((len(samples) - len(ok)) / len(samples) * 100, 2) if samples else 0.0,
+        "seconds": round(elapsed, 2),
+        "requests_per_second": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "tokens_per_second": round(sum(s['completion_tokens'] for s in ok) / elapsed, 1) if elapsed else 0.0,
+        "prompt_tokens_per_second": round(sum(s['prompt_tokens'] for s in ok) / elapsed, 1) if elapsed else 0.0,
+        # Token rates include tokenizer-free estimates (marked "~" in reports)
+        "tokens_estimated": any(s['tokens_estimated'] for s in ok),
+        "mean_latency": round(statistics.fmean(latencies), 3) if latencies else None,
+    }
+    for pct in PERCENTILES:
+        value = percentile(latencies, pct)
+        metrics[f"p{pct}"] = round(value, 3) if value is not None else None
+    return metrics
+
+
+def find_knee(steps: List[Dict[str, Any]]) -> Optional[int]:
+    """Index of the step with the highest power (successful requests/sec per second of mean latency)"""
+    best, best_power = None, 0.0
+    for idx, step in enumerate(steps):
+        if not step['mean_latency'] or step['error_rate'] > 5:
+            continue
+        power = step['requests_per_second'] / step['mean_latency']
+        if power > best_power:
+            best, best_power = idx, power
+    return best
+
+
+# ==================== Report ====================
+
+def curve_lines(steps: List[Dict[str, Any]], knee: Optional[int], load_label: str, width: int = 40) -> List[str]:
+    """Console saturation curve: one bar of requests/sec per step"""
+    peak = max((s['requests_per_second'] for s in steps), default=0) or 1
+    lines = []
+    for idx, step in enumerate(steps):
+        bar = "█" * max(1, round(step['requests_per_second'] / peak * width)) if step['requests_per_second'] else ""
+        p95 = f"{step['p95']:.2f}s" if step['p95'] is not None else "-"
+        marker = "  ◀ knee" if idx == knee else ""
+        lines.append(f"  {load_label} {step['load']:>6g} │{bar:<{width}} {step['requests_per_second']:7.2f} req/s  "
+                     f"p95 {p95:>7}  err {step['error_rate']:4.1f}%{marker}")
+    return lines
+
+
+def markdown_report(meta: Dict[str, Any], steps: List[Dict[str, Any]], knee: Optional[int]) -> str:
+    load_label = "Concurrency" if meta['mode'] == "closed" else "Offered req/s"
+    rows = "\n".join(
+        f"| {s['load']:g}{' **(knee)**' if i == knee else ''} | {s['requests']} | {s['requests_per_second']:.2f} | "
+        f"{'~' if s['tokens_estimated'] else ''}{s['tokens_per_second']:.1f} | {s['error_rate']:.1f}% | "
+        + " | ".join(f"{s[f'p{p}']:.2f}s" if s[f'p{p}'] is not None else "-" for p in PERCENTILES) + " |"
+        for i, s in enumerate(steps))
+    estimated = ("\n~ tokens/s estimated without the model's tokenizer (not exact)\n"
+                 if any(s['tokens_estimated'] for s in steps) else "")
+    knee_text = (f"{load_label.lower()} {steps[knee]['load']:g}: {steps[knee]['requests_per_second']:.2f} req/s "
+                 f"at p95 {steps[knee]['p95']:.2f}s" if knee is not None else "not found (every step failed or erred)")
+    return f"""# Endpoint Load Test
+
+**Endpoint**: {meta['endpoint']}
+**Date**: {meta['date']}
+**Mode**: {"closed loop (stepped concurrency)" if meta['mode'] == "closed" else "open loop (Poisson arrivals)"}
+**Prompt mix**: {meta['prompts']} rendered prompts ({meta['suite']})
+**Step duration**: {meta['duration']}s
+
+**Knee**: {knee_text}
+
+## Saturation Curve
+
+| {load_label} | Requests | Req/s | Tokens/s | Errors | {" | ".join(f"p{p}" for p in PERCENTILES)} |
+|{"---|" * (5 + len(PERCENTILES))}
+{rows}
+{estimated}
+*Generated: {datetime.now().isoformat()}*
+"""
+
+
+# ==================== Main ====================
+
+def parse_levels(value: str) -> List[float]:
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load-test an inference endpoint with the evaluation prompts")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=parse_levels, default=None, metavar="N1,N2,...",
+                      help="closed loop: concurrent clients per step (default: 1,2,4,8,16)")
+    mode.add_argument("--rate", type=parse_levels, metavar="R1,R2,...",
+                      help="open loop: Poisson arrival rates in requests/sec per step")
+    parser.add_argument("--duration", type=float, default=60, help="seconds per step (default: 60)")
+    parser.add_argument("--max-requests", type=int, help="closed loop: stop a step after this many requests")
+    parser.add_argument("--max-inflight", type=int, default=256,
+                        help="open loop: client-side cap on requests in flight (default: 256)")
+    parser.add_argument("--backend", default="hf",
+                        help="inference backend: hf (default), hf:<url>, openai:<base_url> "
+                             "or callable:<module>:<function>")
+    parser.add_argument("--standin", action="store_true",
+                        help="start the local stand-in server and test against it (harness-only measurement)")
+    parser.add_argument("--standin-slots", type=int, default=4, help="stand-in generation slots (default: 4)")
+    parser.add_argument("--standin-decode-ms", type=float, default=20.0,
+                        help="stand-in milliseconds per generated token (default: 20; 0 for harness overhead only)")
+    parser.add_argument("--suite", choices=SUITES, default="both", help="prompt mix source (default: both)")
+    parser.add_argument("--categories", help="comma-separated BFCL categories / AgentBench tasks (default: all)")
+    parser.add_argument("--limit", type=int, help="use only the first N items of each category")
+    parser.add_argument("--max-new-tokens", type=int, help="override max_new_tokens for every request")
+    parser.add_argument("--seed", type=int, default=0, help="prompt order and arrival process seed")
+    parser.add_argument("--no-warmup", action="store_true", help="skip the readiness probe and warm-up generations")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    open_loop = args.rate is not None
+    levels = args.rate if open_loop else (args.concurrency or [1, 2, 4, 8, 16])
+
+    server = None
+    backend_spec = args.backend
+    if args.standin:
+        from standin_server import start_server
+        server, url = start_server(slots=args.standin_slots, decode_ms=args.standin_decode_ms)
+        backend_spec = f"hf:{url}"
+    elif backend_spec.startswith("hf") and not bfcl.HF_TOKEN:
+        print("Error: Please set HF_TOKEN environment variable")
+        print("Usage: export HF_TOKEN='your_token_here' && python3 loadtest.py")
+        exit(1)
+
+    backend = create_backend(backend_spec, bfcl.ENDPOINT_URL, bfcl.HF_TOKEN, bfcl.MODEL_ID)
+    session = getattr(backend, "session", None)
+    if session is not None:
+        # One pooled connection per concurrent client instead of requests' default 10
+        pool_size = int(max(levels)) if not open_loop else args.max_inflight
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(10, pool_size))
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+    categories = args.categories.split(",") if args.categories else None
+    mix = load_prompt_mix(args.suite, categories, args.limit, args.seed)
+    if not mix:
+        print("Error: no prompts loaded")
+        exit(1)
+    if args.max_new_tokens:
+        mix = [(prompt, {**params, "max_new_tokens": args.max_new_tokens}) for prompt, params in mix]
+    feed = PromptFeed(mix)
+
+    print("\n" + "="*80)
+    print("ENDPOINT LOAD TEST")
+    print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Backend: {backend.describe()}{' (stand-in server)' if server else ''}")
+    print(f"Prompt mix: {len(mix)} prompts; {'arrival rates' if open_loop else 'concurrency levels'}: "
+          f"{', '.join(f'{level:g}' for level in levels)}; {args.duration:g}s per step")
+    print("="*80)
+
+    if not args.no_warmup:
+        print("\nWarming up endpoint...")
+        warm_up(backend, mix[0][1])
+
+    steps = []
+    for level in levels:
+        if open_loop:
+            samples, elapsed = run_open_loop(backend, feed, level, args.duration, args.max_inflight, args.seed)
+        else:
+            samples, elapsed = run_closed_loop(backend, feed, int(level), args.duration, args.max_requests)
+        step = {"load": level, **step_metrics(samples, elapsed)}
+        steps.append(step)
+        p95 = f"{step['p95']:.2f}s" if step['p95'] is not None else "-"
+        print(f"  {'rate' if open_loop else 'concurrency'} {level:g}: {step['requests_per_second']:.2f} req/s, "
+              f"{'~' if step['tokens_estimated'] else ''}{step['tokens_per_second']:.1f} tokens/s, p50 {step['p50'] or 0:.2f}s, p95 {p95}, "
+              f"{step['error_rate']:.1f}% errors")
+
+    knee = find_knee(steps)
+    if server:
+        server.shutdown()
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    meta = {"endpoint": backend.describe() + (" (stand-in)" if server else ""),
+            "date": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "mode": "open" if open_loop else "closed",
+            "prompts": len(mix), "suite": args.suite, "duration": args.duration}
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    json_file = os.path.join(RESULTS_DIR, f"loadtest_{timestamp}.json")
+    with open(json_file, 'w', encoding='utf-8') as f:
+        json.dump({**meta, "steps": steps, "knee": steps[knee]['load'] if knee is not None else None},
+                  f, indent=2, ensure_ascii=False)
+    report_file = os.path.join(RESULTS_DIR, f"LOADTEST_{timestamp}.md")
+    with open(report_file, 'w', encoding='utf-8') as f:
+        f.write(markdown_report(meta, steps, knee))
+
+    print("\n" + "="*80)
+    print("SATURATION CURVE")
+    print("="*80)
+    for line in curve_lines(steps, knee, "rate" if open_loop else "conc"):
+        print(line)
+    print("="*80)
+    print(f"\n✓ Results saved: {json_file}")
+    print(f"✓ Report saved: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Prometheus Metrics Exporter
+Counters, gauges and a latency histogram fed by the runners, exposed in the
+Prometheus text exposition format on a local HTTP endpoint (GET /metrics)
+and/or written periodically to a file for node_exporter's textfile collector
+
+Metrics are always collected (each event is one locked integer update);
+nothing is served or written unless start_exporters() is called.
+
+Usage:
+    python3 berkeley_evaluation.py --metrics-port 9464
+    python3 berkeley_evaluation.py --metrics-file /var/lib/node_exporter/textfile/bench.prom
+"""
+
+import argparse
+import bisect
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Request latency buckets in seconds, from a warm small model to a cold start
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """The metric's exposition lines, one per series"""
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (non-cumulative, last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+# ==================== Benchmark Metrics ====================
+
+REGISTRY = Registry()
+REQUESTS = REGISTRY.register(Counter(
+    "bench_requests_total", "Inference requests sent (retries included)", ("category",)))
+SUCCESSES = REGISTRY.register(Counter(
+    "bench_request_successes_total", "Inference requests that returned a response", ("category",)))
+RETRIES = REGISTRY.register(Counter(
+    "bench_retries_total", "Requests deferred for another attempt after a retryable error", ("category",)))
+THROTTLES = REGISTRY.register(Counter(
+    "bench_throttles_total", "Retries caused by throttling (429/503)", ("category",)))
+ITEMS = REGISTRY.register(Counter(
+    "bench_items_total", "Items with a final result, by outcome (correct, incorrect, error)",
+    ("category", "outcome")))
+LATENCY = REGISTRY.register(Histogram(
+    "bench_request_latency_seconds", "Inference request latency", ("category",)))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "bench_in_flight_requests", "Inference requests currently awaiting a response"))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "bench_retry_queue_depth", "Items waiting in the deferred retry queue", ("category",)))
+LAST_ITEM = REGISTRY.register(Gauge(
+    "bench_last_item_timestamp_seconds", "Unix time of the latest final item result (for stall alerts)"))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "bench_cache_lookups_total", "Cache lookups", ("cache",)))
+CACHE_HITS = REGISTRY.register(Counter(
+    "bench_cache_hits_total", "Cache lookups answered from the cache", ("cache",)))
+CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    "bench_cache_hit_ratio", "Share of cache lookups answered from the cache", ("cache",)))
+
+
+def request_started(category: str, count: int = 1):
+    REQUESTS.inc(count, category=category)
+    IN_FLIGHT.inc(count)
+
+
+def request_finished(category: str, result: Dict[str, Any]):
+    IN_FLIGHT.dec()
+    if result.get('success'):
+        SUCCESSES.inc(category=category)
+    # Responses replayed from a cache carry their original latency
+    if result.get('latency') is not None and not result.get('cached'):
+        LATENCY.observe(result['latency'], category=category)
+
+
+def retry_scheduled(category: str, result: Dict[str, Any], queue_depth: int):
+    RETRIES.inc(category=category)
+    if result.get('throttled'):
+        THROTTLES.inc(category=category)
+    QUEUE_DEPTH.set(queue_depth, category=category)
+
+
+def item_done(category: str, success: bool, judged_correct: bool):
+    outcome = "error" if not success else "correct" if judged_correct else "incorrect"
+    ITEMS.inc(category=category, outcome=outcome)
+    LAST_ITEM.set(round(time.time(), 3))
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.inc(cache=cache)
+    if hit:
+        CACHE_HITS.inc(cache=cache)
+    CACHE_HIT_RATIO.set(round(CACHE_HITS.value(cache=cache) / CACHE_LOOKUPS.value(cache=cache), 4), cache=cache)
+
+
+# ==================== Exporters ====================
+
+def serve(port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve GET /metrics from a background thread"""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0].rstrip('/') not in ("", "/metrics"):
+                self.send_error(404)
+                return
+            payload = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+class TextfileExporter:
+    """Rewrites `path` every `interval` seconds (atomically, via a temp file and rename)"""
+
+    def __init__(self, path: str, interval: float = 15.0, registry: Registry = REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="metrics-textfile", daemon=True)
+
+    def write(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.registry.render())
+        os.replace(tmp, self.path)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def start(self) -> "TextfileExporter":
+        self.write()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the loop and write the final values"""
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+
+class Exporters:
+    """The exporters started for one run; stop() writes the final textfile and shuts the server down"""
+
+    def __init__(self, server: Optional[ThreadingHTTPServer] = None, textfile: Optional[TextfileExporter] = None):
+        self.server = server
+        self.textfile = textfile
+
+    def stop(self):
+        if self.textfile:
+            self.textfile.stop()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """The --metrics-* options shared by the evaluation scripts"""
+    group = parser.add_argument_group("metrics")
+    group.add_argument("--metrics-port", type=int,
+                       help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics while running")
+    group.add_argument("--metrics-file",
+                       help="periodically write Prometheus metrics to this file (node_exporter textfile collector)")
+    group.add_argument("--metrics-interval", type=float, default=15.0,
+                       help="seconds between --metrics-file writes (default: 15)")
+
+
+def start_exporters(port: Optional[int] = None, path: Optional[str] = None, interval: float = 15.0,
+                    host: str = "127.0.0.1") -> Exporters:
+    """Start whichever exporters were asked for (neither is a no-op)"""
+    server = serve(port, host) if port else None
+    if server:
+        print(f"Metrics: http://{host}:{server.server_address[1]}/metrics")
+    textfile = TextfileExporter(path, interval).start() if path else None
+    if textfile:
+        print(f"Metrics: writing {path} every {interval:.0f}s")
+    return Exporters(server, textfile)
@@ -0,0 +1,340 @@
+"""
+Generation-parameter Sweep
+Evaluates a grid of generation settings (temperature, top_p,
+max_new_tokens, ...) over the same BFCL/AgentBench items, all grid points
+at once, and reports an accuracy / latency / token-cost matrix per category
+
+Responses are cached on disk by (model, endpoint, prompt, parameters):
+settings that were already evaluated are answered from the cache, and
+identical requests in flight from several grid points are sent only once.
+With temperature > 0 a cached response is one sample, reused as is.
+
+Usage:
+    python3 param_sweep.py --grid temperature=0.1,0.4,0.7 --grid max_new_tokens=256,512
+    python3 param_sweep.py --backend openai:http://localhost:8000 --concurrency 8 \\
+        --grid temperature=0,0.7 --grid top_p=0.9,0.95 --suite bfcl --limit 100
+"""
+
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import agentbench_evaluation as agentbench
+import berkeley_evaluation as bfcl
+import metrics_exporter as metrics
+from backends import InferenceBackend, create_backend
+from compare_models import SUITES, CompareTask, SharedItems, agentbench_tasks, bfcl_tasks
+from fingerprint import fingerprint
+from runner import run_items
+from tokenization import tokenizer_source
+
+RESULTS_DIR = "./Results/Sweep"
+CACHE_PATH = os.path.join(RESULTS_DIR, "response_cache.jsonl")
+# Result fields kept in the cache besides the response itself
+CACHED_FIELDS = ("latency", "prompt_tokens", "completion_tokens", "finish_reason")
+
+
+def parse_grid(values: List[str]) -> List[Dict[str, Any]]:
+    """Cartesian product of KEY=V1,V2,... axes; values are JSON where they parse (numbers, true/false)"""
+    axes = []
+    for value in values:
+        key, sep, options = value.partition("=")
+        if not sep or not key or not options:
+            raise ValueError(f"expected KEY=V1,V2,..., got {value!r}")
+        parsed = []
+        for option in options.split(","):
+            try:
+                parsed.append(json.loads(option))
+            except json.JSONDecodeError:
+                parsed.append(option)
+        axes.append([(key, option) for option in parsed])
+    return [dict(point) for point in itertools.product(*axes)]
+
+
+def point_label(point: Dict[str, Any]) -> str:
+    return " ".join(f"{key}={value}" for key, value in point.items()) or "defaults"
+
+
+# ==================== Response Cache ====================
+
+class ResponseCache:
+    """Successful responses keyed by request content, shared by every grid point and persisted as JSONL
+
+    `generate_batch` answers cached prompts directly, waits for a prompt
+    another thread is already requesting, and sends only the rest.
+    """
+
+    def __init__(self, path: Optional[str] = CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.shared = 0
+        self.requests = 0
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._entries[entry.pop('key')] = entry
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(identity: str, prompt: str, params: Dict[str, Any]) -> str:
+        return fingerprint(backend=identity, prompt=prompt, parameters=params)
+
+    def generate_batch(self, backend: InferenceBackend, identity: str, prompts: List[str],
+                       params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        keys = [self.key(identity, prompt, params) for prompt in prompts]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(prompts)
+        waiting: List[Tuple[int, Future]] = []
+        owned: Dict[str, Future] = {}
+        to_send: List[Tuple[str, str]] = []
+        with self._lock:
+            for idx, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    metrics.cache_lookup("response", True)
+                    results[idx] = {"success": True, "error": None, **entry, "cached": True}
+                elif key in self._pending:
+                    if key not in owned:
+                        self.shared += 1
+                    metrics.cache_lookup("response", True)
+                    waiting.append((idx, self._pending[key]))
+                else:
+                    owned[key] = self._pending[key] = Future()
+                    metrics.cache_lookup("response", False)
+                    to_send.append((key, prompts[idx]))
+                    waiting.append((idx, owned[key]))
+            self.requests += len(to_send)
+
+        if to_send:
+            try:
+                generated = backend.generate_batch([prompt for _, prompt in to_send], params)
+                if len(generated) != len(to_send):
+                    # zip() would drop the rest, leaving their futures (and every waiter) unresolved
+                    raise RuntimeError(f"Backend returned {len(generated)} results for {len(to_send)} prompts")
+            except BaseException as e:
+                with self._lock:
+                    for key, _ in to_send:
+                        self._pending.pop(key).set_exception(e)
+                raise
+            with self._lock:
+                for (key, _), result in zip(to_send, generated):
+                    if result['success']:
+                        entry = {"response": result['response'],
+                                 **{name: result.get(name) for name in CACHED_FIELDS}}
+                        self._entries[key] = entry
+                        if self._file:
+                            self._file.write(json.dumps({"key": key, **entry}, ensure_ascii=False) + "\n")
+                    self._pending.pop(key).set_result(result)
+                if self._file:
+                    self._file.flush()
+
+        for idx, future in waiting:
+            results[idx] = dict(future.result())
+        return results
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+# ==================== Sweep ====================
+
+def run_point(point: Dict[str, Any], backend: InferenceBackend, identity: str, tasks: List[CompareTask],
+              shared: SharedItems, cache: ResponseCache) -> Dict[str, Dict[str, Any]]:
+    """Evaluate one grid point over every task; returns {task name: matrix cell}"""
+    cells = {}
+    for task in tasks:
+        params = {**task.params, **point}
+        items = shared.acquire(f"{task.suite}/{task.name}", task.build)
+        cached = 0
+
+        def generate(prompts: List[str]) -> List[Dict[str, Any]]:
+            nonlocal cached
+            results = cache.generate_batch(backend, identity, prompts, params)
+            cached += sum(1 for r in results if r.get('cached'))
+            return results
+
+        start = time.monotonic()
+        try:
+            tally = run_items(items, generate, task.judge, bfcl.RETRY_POLICY, batch_size=backend.batch_size,
+                              pace=backend.pace, category=task.name, total=len(items),
+                              echo=lambda message: None)
+        finally:
+            shared.release(f"{task.suite}/{task.name}")
+        summary = tally.summary()
+        cells[task.name] = {
+            "total": summary['total'], "correct": summary['correct'], "errors": summary['errors'],
+            "success_rate": summary['success_rate'], "mean_latency": summary['mean_latency'],
+            "prompt_tokens": summary['prompt_tokens'], "completion_tokens": summary['completion_tokens'],
+            "mean_completion_tokens": round(summary['completion_tokens'] / summary['total'], 1) if summary['total'] else None,
+            "tokens_per_second": summary['tokens_per_second'], "length_stop_rate": summary['length_stop_rate'],
+            "cached": cached, "seconds": round(time.monotonic() - start, 2),
+        }
+        print(f"  [{point_label(point)}] {task.name}: {summary['correct']}/{summary['total']} correct "
+              f"({summary['success_rate']:.1f}%), {cached} cached")
+    return cells
+
+
+def matrix_table(task: str, points: List[Dict[str, Any]], cells: List[Dict[str, Dict[str, Any]]]) -> str:
+    lines = ["| Settings | Accuracy | Failed | Mean latency | Prompt tokens | Completion tokens | Tokens/item "
+             "| Stopped on length | Cached |",
+             "|---|---|---|---|---|---|---|---|---|"]
+    for point, point_cells in zip(points, cells):
+        c = point_cells.get(task)
+        if c is None:
+            continue
+        latency = f"{c['mean_latency']:.2f}s" if c['mean_latency'] is not None else "-"
+        per_item = f"{c['mean_completion_tokens']:.1f}" if c['mean_completion_tokens'] is not None else "-"
+        stops = f"{c['length_stop_rate']:.1f}%" if c['length_stop_rate'] is not None else "-"
+        lines.append(f"| {point_label(point)} | {c['correct']}/{c['total']} ({c['success_rate']:.1f}%) | "
+                     f"{c['errors']} | {latency} | {c['prompt_tokens']:,} | {c['completion_tokens']:,} | "
+                     f"{per_item} | {stops} | {c['cached']} |")
+    return "\n".join(lines)
+
+
+# ==================== Main ====================
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Sweep generation parameters over BFCL and AgentBench")
+    parser.add_argument("--grid", action="append", required=True, metavar="KEY=V1,V2,...",
+                        help="one parameter axis; repeat for a cartesian grid, e.g. --grid temperature=0.1,0.7")
+    parser.add_argument("--backend", default="hf",
+                        help="inference backend: hf (default), hf:<url>, openai:<base_url> "
+                             "or callable:<module>:<function>")
+    parser.add_argument("--model", default=bfcl.MODEL_ID, help=f"model id (default: {bfcl.MODEL_ID})")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="concurrent requests per grid point for HTTP backends (default: 1)")
+    parser.add_argument("--pace", type=float, default=0.3,
+                        help="seconds between batches for the HuggingFace endpoint backend (default: 0.3)")
+    parser.add_argument("--suite", choices=SUITES, default="both", help="benchmarks to run (default: both)")
+    parser.add_argument("--categories", help="comma-separated BFCL categories / AgentBench tasks (default: all)")
+    parser.add_argument("--limit", type=int, help="evaluate only the first N items of each category")
+    parser.add_argument("--cache", default=CACHE_PATH, help=f"response cache file (default: {CACHE_PATH})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="do not read or write the cache file (identical requests are still sent once)")
+    metrics.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    try:
+        points = parse_grid(args.grid)
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit(1)
+    if args.backend.startswith("hf") and not bfcl.HF_TOKEN:
+        print("Error: Please set HF_TOKEN environment variable")
+        print("Usage: export HF_TOKEN='your_token_here' && python3 param_sweep.py --grid ...")
+        exit(1)
+
+    categories = args.categories.split(",") if args.categories else None
+    tasks: List[CompareTask] = []
+    if args.suite in ("bfcl", "both"):
+        tasks += bfcl_tasks(categories, args.limit)
+    if args.suite in ("agentbench", "both"):
+        tasks += agentbench_tasks(categories, args.limit)
+    if not tasks:
+        print("Error: no categories selected")
+        exit(1)
+
+    # One backend per grid point, so each point gets its own request concurrency
+    backends = [create_backend(args.backend, bfcl.ENDPOINT_URL, bfcl.HF_TOKEN, args.model,
+                               concurrency=args.concurrency, pace=args.pace) for _ in points]
+    identity = f"{args.model} @ {backends[0].describe()}"
+    cache = ResponseCache(None if args.no_cache else args.cache)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    print("\n" + "="*80)
+    print("GENERATION PARAMETER SWEEP")
+    print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Backend: {identity}")
+    print(f"Grid: {len(points)} points over {', '.join(task.name for task in tasks)}")
+    print(f"Cache: {len(cache)} responses" + ("" if args.no_cache else f" ({args.cache})"))
+    print("="*80)
+
+    exporters = metrics.start_exporters(args.metrics_port, args.metrics_file, args.metrics_interval)
+    shared = SharedItems(len(points))
+    cells: List[Dict[str, Dict[str, Any]]] = [{} for _ in points]
+
+    def worker(idx: int):
+        cells[idx] = run_point(points[idx], backends[idx], identity, tasks, shared, cache)
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(points))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.monotonic() - start
+    cache.close()
+    agentbench.SQL_JUDGE.close()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    matrix_file = os.path.join(RESULTS_DIR, f"sweep_{timestamp}.json")
+    with open(matrix_file, 'w', encoding='utf-8') as f:
+        json.dump({"model": args.model, "endpoint": backends[0].describe(), "timestamp": timestamp,
+                   "points": [{"params": point, "categories": point_cells}
+                              for point, point_cells in zip(points, cells)],
+                   "requests_sent": cache.requests, "cache_hits": cache.hits, "deduplicated": cache.shared},
+                  f, indent=2, ensure_ascii=False)
+
+    tables = "\n\n".join(f"### {task.name}\n\n{matrix_table(task.name, points, cells)}" for task in tasks)
+    summary_file = os.path.join(RESULTS_DIR, f"SWEEP_{timestamp}.md")
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        f.write(f"""# Generation Parameter Sweep
+
+**Model**: {args.model}
+**Endpoint**: {backends[0].describe()}
+**Date**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+**Grid points**: {len(points)}
+**Wall-clock**: {wall_seconds:.1f}s
+**Requests sent**: {cache.requests} ({cache.hits} answered from the cache, {cache.shared} shared with an identical in-flight request)
+
+Token counts are endpoint-reported where available, otherwise counted with: {tokenizer_source()}.
+
+## Results by Category
+
+{tables}
+
+*Generated: {datetime.now().isoformat()}*
+""")
+
+    print("\n" + "="*80)
+    print("SWEEP COMPLETE")
+    print("="*80)
+    for task in tasks:
+        print(f"\n{task.name}")
+        for point, point_cells in zip(points, cells):
+            c = point_cells.get(task.name)
+            if c:
+                print(f"  {point_label(point):<45} {c['correct']:>4}/{c['total']:<4} ({c['success_rate']:5.1f}%)  "
+                      f"{c['errors']} failed  {c['completion_tokens']:,} completion tokens")
+    print("="*80)
+    print(f"Wall-clock: {wall_seconds:.1f}s; {cache.requests} requests sent, {cache.hits} cache hits, "
+          f"{cache.shared} deduplicated")
+    print(f"\n✓ Matrix saved: {matrix_file}")
+    print(f"✓ Summary saved: {summary_file}")
+    exporters.stop()
+
+
+if __name__ == "__main__":
+    main()
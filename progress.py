@@ -0,0 +1,146 @@
+"""
+Live Progress View
+Online counters fed by the runners, rendered as a two-line status block on a
+terminal or as periodic plain log lines when output is not a TTY
+"""
+
+import sys
+import time
+from typing import Any, Dict, Optional, TextIO
+
+from result_records import ResultRecord
+
+
+class _Counters:
+    __slots__ = ("total", "done", "correct", "errors", "requests", "retries", "throttles", "started_at")
+
+    def __init__(self, total: int = 0):
+        self.total = total
+        self.done = 0
+        self.correct = 0
+        self.errors = 0
+        self.requests = 0
+        self.retries = 0
+        self.throttles = 0
+        self.started_at = time.monotonic()
+
+
+def _format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60:02d}:{rest % 60:02d}"
+
+
+class ProgressTracker:
+    """Throughput, running accuracy, in-flight count, retry/throttle events and ETA
+
+    Event methods only bump integer counters; the status text is rebuilt at
+    most once per `refresh_interval` (live) or `log_interval` (plain log).
+    """
+
+    def __init__(self, stream: TextIO = sys.stdout, live: Optional[bool] = None,
+                 refresh_interval: float = 0.5, log_interval: float = 30.0):
+        self.stream = stream
+        self.live = stream.isatty() if live is None else live
+        self.refresh_interval = refresh_interval
+        self.log_interval = log_interval
+        self.in_flight = 0
+        self.overall = _Counters()
+        self.expected: Dict[str, int] = {}
+        self.category: Optional[str] = None
+        self.current = _Counters()
+        self._next_render = 0.0
+        self._block = ""
+
+    # ---------- events ----------
+
+    def expect(self, category: str, total: int):
+        """Declare a category's item count up front so the overall ETA covers the whole run"""
+        self.expected[category] = total
+        self.overall.total = sum(self.expected.values())
+
+    def start_category(self, category: str, total: int):
+        if category not in self.expected:
+            self.expect(category, total)
+        self.category = category
+        self.current = _Counters(total)
+        self._next_render = 0.0
+
+    def request_started(self):
+        self.in_flight += 1
+        self.current.requests += 1
+        self.overall.requests += 1
+
+    def request_finished(self):
+        self.in_flight -= 1
+        self._maybe_render()
+
+    def retry_scheduled(self, result: Dict[str, Any]):
+        for counters in (self.current, self.overall):
+            counters.retries += 1
+            if result.get('throttled'):
+                counters.throttles += 1
+
+    def item_done(self, record: ResultRecord):
+        for counters in (self.current, self.overall):
+            counters.done += 1
+            if not record.success:
+                counters.errors += 1
+            elif record.judged_correct:
+                counters.correct += 1
+        self._maybe_render()
+
+    def finish_category(self):
+        """Replace the live block (if any) with a final status line pair"""
+        prefix = "\r\033[J" if self.live and self._block else ""
+        self.stream.write(prefix + self._status_lines() + "\n")
+        self.stream.flush()
+        self._block = ""
+        self.category = None
+
+    # ---------- output ----------
+
+    def echo(self, line: str):
+        """Print a log line above the live status block (or plainly when not live)"""
+        if self.live and self._block:
+            self.stream.write("\r\033[J" + line + "\n" + self._block)
+            self.stream.flush()
+        else:
+            self.stream.write(line + "\n")
+
+    def _maybe_render(self):
+        now = time.monotonic()
+        if now < self._next_render:
+            return
+        if self.live:
+            self._next_render = now + self.refresh_interval
+            self._block = self._status_lines() + "\033[1A\r"
+            self.stream.write("\r\033[J" + self._block)
+            self.stream.flush()
+        elif self._next_render:
+            self._next_render = now + self.log_interval
+            self.stream.write(self._status_lines() + "\n")
+        else:
+            self._next_render = now + self.log_interval
+
+    @staticmethod
+    def _line(label: str, counters: "_Counters", in_flight: Optional[int] = None) -> str:
+        elapsed = max(time.monotonic() - counters.started_at, 1e-9)
+        rate = counters.done / elapsed
+        judged = counters.done - counters.errors
+        accuracy = (counters.correct / judged * 100) if judged else 0.0
+        error_rate = (counters.errors / counters.done * 100) if counters.done else 0.0
+        remaining = max(counters.total - counters.done, 0)
+        eta = (remaining / rate) if rate > 0 else None
+        line = (f"{label} {counters.done}/{counters.total} | {rate:.2f} items/s "
+                f"({counters.requests / elapsed:.2f} req/s) | acc {accuracy:.1f}% | "
+                f"err {error_rate:.1f}% | retries {counters.retries} (throttled {counters.throttles})")
+        if in_flight is not None:
+            line += f" | in-flight {in_flight}"
+        return line + f" | elapsed {_format_duration(elapsed)} | ETA {_format_duration(eta)}"
+
+    def _status_lines(self) -> str:
+        return (self._line(f"[{self.category}]", self.current, self.in_flight) + "\n"
+                + self._line("[overall]", self.overall))
@@ -0,0 +1,116 @@
+"""
+Pre-flight Prompt Length Guard
+Counts every prompt's tokens locally before a category is sent, so prompts
+that cannot fit the model's context window are re-rendered more compactly
+or flagged and recorded as failures instead of being sent, rejected and
+retried
+
+Counting is CPU-bound (a pure-Python estimate without the `tokenizers`
+package), so large categories are tokenized in a process pool. When counts
+are only estimated, ESTIMATE_MARGIN of the budget is held back so that a
+prompt the estimate undercounts is still caught.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from tokenization import ESTIMATE_MARGIN, count_tokens, tokenizer_source
+
+OVER_LENGTH = "over_length"
+# Qwen2.5-3B-Instruct; lower it (or pass max_input_tokens) when the endpoint caps input length
+CONTEXT_WINDOW = int(os.environ.get("CONTEXT_WINDOW", 32768))
+# Below this many prompts a process pool costs more than it saves
+MIN_POOL_PROMPTS = 200
+
+
+def input_budget(params: Dict[str, Any], context_window: int = CONTEXT_WINDOW) -> int:
+    """Prompt tokens that fit alongside the completion the parameters ask for"""
+    return context_window - int(params.get('max_new_tokens') or params.get('max_tokens') or 0)
+
+
+def count_prompt_tokens(prompts: List[str], workers: Optional[int] = None) -> List[int]:
+    """Token count of each prompt, in a process pool of `workers` (default: CPU count) for large lists"""
+    workers = workers if workers is not None else os.cpu_count() or 1
+    if workers <= 1 or len(prompts) < MIN_POOL_PROMPTS:
+        return [count_tokens(prompt) for prompt in prompts]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(count_tokens, prompts, chunksize=max(1, len(prompts) // (workers * 4))))
+
+
+def preflight(items: List[Dict[str, Any]], budget: int,
+              rerender: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+              workers: Optional[int] = None) -> Dict[str, Any]:
+    """Check every item's prompt against `budget` tokens, in place
+
+    Each item gets its `prompt_tokens`. Over-length items are replaced by
+    `rerender(item)` (e.g. a compact schema rendering) when given; items
+    still over budget get a `preflight_error`, which the runner records as
+    a failure without sending the request. Without the model's tokenizer
+    the budget shrinks by ESTIMATE_MARGIN.
+    """
+    # Loads (or fetches) the tokenizer here, before any pool worker needs it
+    source = tokenizer_source()
+    limit = int(budget * (1 - ESTIMATE_MARGIN)) if source == "estimate" else budget
+    counts = count_prompt_tokens([item['prompt'] for item in items], workers)
+    over = [idx for idx, count in enumerate(counts) if count > limit]
+    for item, count in zip(items, counts):
+        item['prompt_tokens'] = count
+
+    compacted, blocked = [], []
+    if rerender and over:
+        replacements = [rerender(items[idx]) for idx in over]
+        recounted = count_prompt_tokens([item['prompt'] for item in replacements], workers)
+        for idx, item, count in zip(over, replacements, recounted):
+            item['prompt_tokens'] = count
+            if count <= limit:
+                items[idx] = item
+                compacted.append(item['id'])
+    for idx in over:
+        item = items[idx]
+        if item['prompt_tokens'] > limit:
+            approx = "~" if limit != budget else ""
+            item['preflight_error'] = (f"prompt is {approx}{item['prompt_tokens']} tokens, "
+                                       f"over the {limit}-token input budget; not sent")
+            blocked.append(item['id'])
+    return {
+        "checked": len(items),
+        "budget": budget,
+        # What the counts were checked against: the budget, less the margin for estimated counts
+        "limit": limit,
+        "tokenizer": source,
+        "max_prompt_tokens": max(counts, default=0),
+        "over_length": [items[idx]['id'] for idx in over],
+        "compacted": compacted,
+        "blocked": blocked,
+    }
+
+
+def unsent_result(item: Dict[str, Any]) -> Dict[str, Any]:
+    """The failed request result recorded for an item the guard kept from being sent"""
+    return {
+        "success": False,
+        "response": "",
+        "error": item['preflight_error'],
+        "error_kind": OVER_LENGTH,
+        "latency": None,
+        "prompt_tokens": item['prompt_tokens'],
+    }
+
+
+def preflight_report(report: Dict[str, Any], show: int = 5) -> str:
+    if report['tokenizer'] == "estimate":
+        line = (f"Pre-flight: {report['checked']} prompts, longest ~{report['max_prompt_tokens']:,} tokens "
+                f"(estimated, no tokenizer; budget {report['budget']:,} less a {ESTIMATE_MARGIN:.0%} margin "
+                f"= {report['limit']:,})")
+    else:
+        line = (f"Pre-flight: {report['checked']} prompts, longest {report['max_prompt_tokens']:,} tokens "
+                f"(budget {report['budget']:,})")
+    if not report['over_length']:
+        return line + ", none over budget"
+    line += (f"; {len(report['over_length'])} over budget, {len(report['compacted'])} fit after compact "
+             f"re-rendering, {len(report['blocked'])} not sent")
+    if report['blocked']:
+        shown = ", ".join(report['blocked'][:show])
+        line += f"\n  Not sent: {shown}" + (f" (+{len(report['blocked']) - show} more)" if len(report['blocked']) > show else "")
+    return line
@@ -0,0 +1,171 @@
+"""
+Result Records
+Compact per-item result records and the aggregate counters that replace
+in-memory result lists while records stream to disk
+"""
+
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass(slots=True)
+class ResultRecord:
+    """One judged item; suite-specific fields (ground truth, options, ...) live in `extra`"""
+    id: Any
+    question: str
+    model_response: str
+    judged_correct: bool
+    success: bool
+    extra: Dict[str, Any] = field(default_factory=dict)
+    attempts: int = 1
+    latency: Optional[float] = None
+    error: Optional[str] = None
+    error_kind: Optional[str] = None
+    # Produced while the endpoint looked cold (see warmup.ColdStartDetector)
+    cold_start: bool = False
+    # Endpoint-reported where available, otherwise counted locally (see tokenization)
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    # Set when a locally counted figure came from the tokenizer-free estimate
+    tokens_estimated: bool = False
+    finish_reason: Optional[str] = None
+    timing: Optional[Dict[str, float]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The JSON layout used by the result files"""
+        data = {"id": self.id, "question": self.question, **self.extra,
+                "model_response": self.model_response, "judged_correct": self.judged_correct,
+                "success": self.success, "attempts": self.attempts, "latency": self.latency}
+        if not self.success:
+            data["error"] = self.error
+            data["error_kind"] = self.error_kind
+        if self.cold_start:
+            data["cold_start"] = True
+        if self.prompt_tokens is not None:
+            data["prompt_tokens"] = self.prompt_tokens
+            data["completion_tokens"] = self.completion_tokens
+            data["finish_reason"] = self.finish_reason
+            if self.tokens_estimated:
+                data["tokens_estimated"] = True
+        if self.timing:
+            data["timing"] = self.timing
+        return data
+
+
+class CategoryTally:
+    """Running counts for one category; the only per-category state kept in memory"""
+
+    __slots__ = ("task", "total", "correct", "errors", "failed_ids", "cold_starts", "latency_sum", "timed",
+                 "prompt_tokens", "completion_tokens", "estimated_tokens", "generation_seconds", "rated_tokens",
+                 "finish_reasons", "length_stops", "skipped", "incomplete")
+
+    def __init__(self, task: str):
+        self.task = sys.intern(task)
+        self.total = 0
+        self.correct = 0
+        self.errors = 0
+        self.failed_ids: List[Any] = []
+        self.cold_starts = 0
+        # Latency of successful, warm, freshly generated items only
+        self.latency_sum = 0.0
+        self.timed = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # Items whose counts include the tokenizer-free estimate
+        self.estimated_tokens = 0
+        # Completion tokens and request seconds of the same warm items, for tokens/sec
+        self.generation_seconds = 0.0
+        self.rated_tokens = 0
+        self.finish_reasons = 0
+        self.length_stops = 0
+        # Items left out by run-budget sampling, and why the category stopped short (if it did)
+        self.skipped = 0
+        self.incomplete: Optional[str] = None
+
+    def add(self, record: ResultRecord):
+        self.total += 1
+        if not record.success:
+            self.errors += 1
+            self.failed_ids.append(record.id)
+        elif record.judged_correct:
+            self.correct += 1
+        if record.cold_start:
+            self.cold_starts += 1
+        elif record.success and record.attempts and record.latency is not None:
+            self.latency_sum += record.latency
+            self.timed += 1
+            if record.completion_tokens and record.latency > 0:
+                self.generation_seconds += record.latency
+                self.rated_tokens += record.completion_tokens
+        self.prompt_tokens += record.prompt_tokens or 0
+        self.completion_tokens += record.completion_tokens or 0
+        if record.tokens_estimated:
+            self.estimated_tokens += 1
+        if record.finish_reason:
+            self.finish_reasons += 1
+            if record.finish_reason == "length":
+                self.length_stops += 1
+
+    def summary(self) -> Dict[str, Any]:
+        """Category result dict; failed requests are counted apart from wrong answers"""
+        return {
+            "task": self.task,
+            "total": self.total,
+            "correct": self.correct,
+            "incorrect": self.total - self.correct - self.errors,
+            "errors": self.errors,
+            "success_rate": (self.correct / self.total * 100) if self.total else 0,
+            "failed_ids": self.failed_ids,
+            "cold_starts": self.cold_starts,
+            "mean_latency": round(self.latency_sum / self.timed, 3) if self.timed else None,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "tokens_estimated": self.estimated_tokens,
+            "tokens_per_second": round(self.rated_tokens / self.generation_seconds, 1) if self.generation_seconds else None,
+            # Share of responses with a known finish reason that hit max_new_tokens
+            "length_stop_rate": (self.length_stops / self.finish_reasons * 100) if self.finish_reasons else None,
+            "skipped": self.skipped,
+            "incomplete": self.incomplete,
+        }
+
+
+def approx(summaries: Any) -> str:
+    """"~" when any of the summaries (one summary dict or several) has estimated token counts"""
+    if isinstance(summaries, dict):
+        summaries = [summaries]
+    return "~" if any(s.get('tokens_estimated') for s in summaries) else ""
+
+
+def token_report(summary: Dict[str, Any]) -> str:
+    """One-line token usage of a category summary; estimated counts are marked with "~" """
+    mark = approx(summary)
+    rate = f"{mark}{summary['tokens_per_second']:.1f} tokens/s" if summary.get('tokens_per_second') else "tokens/s n/a"
+    stops = (f"{summary['length_stop_rate']:.1f}% stopped on length" if summary.get('length_stop_rate') is not None
+             else "finish reason not reported")
+    line = (f"Tokens: {mark}{summary.get('prompt_tokens', 0):,} prompt / {mark}{summary.get('completion_tokens', 0):,} "
+            f"completion, {rate}, {stops}")
+    if mark:
+        line += f" (estimated without the tokenizer for {summary['tokens_estimated']} items)"
+    return line
+
+
+def token_table(summaries: Dict[str, Dict[str, Any]]) -> str:
+    """Markdown table of token usage per category; estimated counts are marked with "~" """
+    lines = ["| Category | Prompt Tokens | Completion Tokens | Tokens/s | Stopped on Length |",
+             "|----------|---------------|-------------------|----------|-------------------|"]
+    for name, r in summaries.items():
+        mark = approx(r)
+        rate = f"{mark}{r['tokens_per_second']:.1f}" if r.get('tokens_per_second') else "n/a"
+        stops = f"{r['length_stop_rate']:.1f}%" if r.get('length_stop_rate') is not None else "n/a"
+        lines.append(f"| {name} | {mark}{r.get('prompt_tokens', 0):,} | {mark}{r.get('completion_tokens', 0):,} | "
+                     f"{rate} | {stops} |")
+    if any(r.get('tokens_estimated') for r in summaries.values()):
+        lines.append("\n~ estimated without the model's tokenizer (not exact)")
+    return "\n".join(lines)
+
+
+def intern_ground_truth(ground_truth: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Intern the function names keying BFCL ground-truth entries"""
+    return [{sys.intern(name): args for name, args in entry.items()} if isinstance(entry, dict) else entry
+            for entry in ground_truth]
@@ -0,0 +1,174 @@
+"""
+Columnar Results Store
+Writes result records as one gzip-compressed NDJSON stream per column plus a
+small JSON index, so cross-run analysis can read only the columns it needs
+"""
+
+import glob
+import gzip
+import json
+import os
+import sys
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+INDEX_FILE = "_index.json"
+STORE_SUFFIX = ".cols"
+
+# Columns most cross-run analysis needs; `category` is stored once in the index
+DEFAULT_COLUMNS = ("id", "category", "judged_correct", "success", "latency")
+
+
+def store_path_for(json_path: str) -> str:
+    """Columnar store directory written alongside a pretty-printed result file"""
+    return os.path.splitext(json_path)[0] + STORE_SUFFIX
+
+
+class ColumnarResultWriter:
+    """Append result records column by column as they are produced"""
+
+    def __init__(self, path: str, metadata: Dict[str, Any]):
+        self.path = path
+        self.metadata = dict(metadata)
+        self.rows = 0
+        self._columns: Dict[str, Any] = {}
+        os.makedirs(path, exist_ok=True)
+
+    def _open_column(self, name: str):
+        handle = gzip.open(os.path.join(self.path, f"{name}.ndjson.gz"), 'wt', encoding='utf-8')
+        # A column first seen part-way through is null for the earlier rows
+        handle.write("null\n" * self.rows)
+        self._columns[name] = handle
+        return handle
+
+    def append(self, record: Dict[str, Any]):
+        """Write one record; keys missing from it are stored as null"""
+        for name in record:
+            if name not in self._columns:
+                self._open_column(name)
+        for name, handle in self._columns.items():
+            handle.write(json.dumps(record.get(name), ensure_ascii=False))
+            handle.write("\n")
+        self.rows += 1
+
+    def close(self, **summary: Any):
+        """Flush all columns and write the index with run metadata and summary counters"""
+        for handle in self._columns.values():
+            handle.close()
+        index = {
+            **self.metadata,
+            **summary,
+            "rows": self.rows,
+            "columns": sorted(self._columns),
+        }
+        with open(os.path.join(self.path, INDEX_FILE), 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+
+
+class StreamingJSONWriter:
+    """Write a pretty-printed result file record by record instead of dumping it at the end
+
+    The file holds the header fields, then the `results` array, then the
+    summary fields passed to close(), so it stays a single JSON object.
+    """
+
+    def __init__(self, path: str, header: Dict[str, Any]):
+        self.path = path
+        self.rows = 0
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write("{\n")
+        for key, value in header.items():
+            self._file.write(f"  {json.dumps(key)}: {_dumps_indented(value, 2)},\n")
+        self._file.write('  "results": [')
+
+    def append(self, record: Dict[str, Any]):
+        self._file.write(("," if self.rows else "") + "\n    " + _dumps_indented(record, 4))
+        self.rows += 1
+
+    def close(self, **summary: Any):
+        """Close the results array and write the summary counters"""
+        self._file.write("\n  ]" if self.rows else "]")
+        for key, value in summary.items():
+            self._file.write(f",\n  {json.dumps(key)}: {_dumps_indented(value, 2)}")
+        self._file.write("\n}")
+        self._file.close()
+
+
+def _dumps_indented(value: Any, level: int) -> str:
+    return json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n" + " " * level)
+
+
+def record_sink(*writers: Callable[[Dict[str, Any]], None]) -> Callable[[Any], None]:
+    """Runner sink that converts each ResultRecord to a dict once and hands it to every writer"""
+    def sink(record):
+        data = record.to_dict()
+        for write in writers:
+            write(data)
+    return sink
+
+
+def read_index(path: str) -> Dict[str, Any]:
+    """Load the index (metadata, summary counters and column list) of a store"""
+    with open(os.path.join(path, INDEX_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_columns(path: str, columns: Iterable[str] = DEFAULT_COLUMNS) -> Dict[str, List[Any]]:
+    """Load only the requested columns of a store
+
+    `category` comes from the index rather than a column file. Columns the
+    store does not have are returned as lists of None.
+    """
+    index = read_index(path)
+    data: Dict[str, List[Any]] = {}
+    for name in columns:
+        if name == "category" and name not in index['columns']:
+            data[name] = [index.get('task')] * index['rows']
+        elif name in index['columns']:
+            with gzip.open(os.path.join(path, f"{name}.ndjson.gz"), 'rt', encoding='utf-8') as f:
+                data[name] = [json.loads(line) for line in f]
+        else:
+            data[name] = [None] * index['rows']
+    return data
+
+
+def iter_rows(path: str, columns: Iterable[str] = DEFAULT_COLUMNS) -> Iterator[Dict[str, Any]]:
+    """Yield one dict per record holding only the requested columns"""
+    columns = list(columns)
+    data = read_columns(path, columns)
+    for values in zip(*(data[name] for name in columns)):
+        yield dict(zip(columns, values))
+
+
+def find_stores(results_dir: str, pattern: str = "*") -> List[str]:
+    """Columnar stores under a results directory, oldest first"""
+    return sorted(glob.glob(os.path.join(results_dir, pattern + STORE_SUFFIX)))
+
+
+def aggregate_runs(results_dir: str, pattern: str = "*") -> List[Dict[str, Any]]:
+    """Per-store accuracy and mean latency (cold-start rows excluded), reading just the columns involved"""
+    rows = []
+    for path in find_stores(results_dir, pattern):
+        index = read_index(path)
+        data = read_columns(path, ("judged_correct", "latency", "cold_start"))
+        latencies = [v for v, cold in zip(data['latency'], data['cold_start']) if v is not None and not cold]
+        total = index['rows']
+        correct = sum(1 for v in data['judged_correct'] if v)
+        rows.append({
+            "store": os.path.basename(path),
+            "model": index.get('model'),
+            "category": index.get('task'),
+            "total": total,
+            "correct": correct,
+            "accuracy": (correct / total * 100) if total else 0,
+            "mean_latency": (sum(latencies) / len(latencies)) if latencies else None,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else "Results"
+    pattern = sys.argv[2] if len(sys.argv) > 2 else "*"
+    for row in aggregate_runs(directory, pattern):
+        latency = f"{row['mean_latency']:.2f}s" if row['mean_latency'] is not None else "n/a"
+        print(f"{row['store']:55s} {row['correct']:4d}/{row['total']:<4d} "
+              f"({row['accuracy']:5.1f}%)  mean latency {latency}")
@@ -0,0 +1,302 @@
+"""
+Results Warehouse
+Indexed SQLite database of evaluation runs, categories and per-item outcomes
+from both berkeley_evaluation.py and agentbench_evaluation.py
+
+Usage:
+    python3 results_warehouse.py ingest Results/
+    python3 results_warehouse.py runs --model Qwen/Qwen2.5-3B-Instruct
+    python3 results_warehouse.py trend parallel_multiple --last 20
+    python3 results_warehouse.py history parallel_multiple_3 --last 20
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_DB_PATH = os.path.join("Results", "results.db")
+
+# Result files are named <category>_<YYYYMMDD_HHMMSS>.json; BFCL ones carry a bfcl_ prefix
+RESULT_FILE_PATTERN = re.compile(r'^(?P<name>.+)_(?P<timestamp>\d{8}_\d{6})\.json$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    suite TEXT NOT NULL,
+    model TEXT NOT NULL,
+    endpoint TEXT,
+    timestamp TEXT NOT NULL,
+    UNIQUE (suite, model, timestamp)
+);
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    category TEXT NOT NULL,
+    total INTEGER,
+    correct INTEGER,
+    errors INTEGER,
+    success_rate REAL,
+    test_date TEXT,
+    source TEXT,
+    UNIQUE (run_id, category)
+);
+CREATE TABLE IF NOT EXISTS items (
+    category_id INTEGER NOT NULL REFERENCES categories (id),
+    test_id TEXT NOT NULL,
+    judged_correct INTEGER,
+    success INTEGER,
+    latency REAL,
+    error_kind TEXT,
+    response_length INTEGER,
+    PRIMARY KEY (category_id, test_id)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_model ON runs (model, timestamp);
+CREATE INDEX IF NOT EXISTS idx_runs_timestamp ON runs (timestamp);
+CREATE INDEX IF NOT EXISTS idx_categories_category ON categories (category, run_id);
+CREATE INDEX IF NOT EXISTS idx_items_test_id ON items (test_id);
+"""
+
+
+def connect(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    """Open (and if needed create) the warehouse database"""
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class CategoryWriter:
+    """Stream one category's items into the warehouse while it runs
+
+    The category row is created up front and its totals are filled in by
+    close(); items are inserted in batches of `flush_rows`.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, suite: str, model: str, endpoint: Optional[str],
+                 timestamp: str, category: str, test_date: Optional[str] = None,
+                 source: Optional[str] = None, flush_rows: int = 500):
+        self.conn = conn
+        self.flush_rows = flush_rows
+        self._pending: List[tuple] = []
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO runs (suite, model, endpoint, timestamp) VALUES (?, ?, ?, ?)",
+                         (suite, model, endpoint, timestamp))
+            run_id = conn.execute("SELECT id FROM runs WHERE suite = ? AND model = ? AND timestamp = ?",
+                                  (suite, model, timestamp)).fetchone()[0]
+
+            existing = conn.execute("SELECT id FROM categories WHERE run_id = ? AND category = ?",
+                                    (run_id, category)).fetchone()
+            if existing:
+                conn.execute("DELETE FROM items WHERE category_id = ?", (existing[0],))
+                conn.execute("DELETE FROM categories WHERE id = ?", (existing[0],))
+
+            self.category_id = conn.execute(
+                "INSERT INTO categories (run_id, category, test_date, source) VALUES (?, ?, ?, ?)",
+                (run_id, category, test_date, source)).lastrowid
+
+    def append(self, record: Dict[str, Any]):
+        self._pending.append((self.category_id, str(record['id']), int(bool(record.get('judged_correct'))),
+                              int(bool(record.get('success', True))), record.get('latency'),
+                              record.get('error_kind'), len(record.get('model_response') or '')))
+        if len(self._pending) >= self.flush_rows:
+            self._flush()
+
+    def _flush(self):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO items (category_id, test_id, judged_correct, success, latency, "
+                "error_kind, response_length) VALUES (?, ?, ?, ?, ?, ?, ?)", self._pending)
+        self._pending = []
+
+    def close(self, result: Dict[str, Any]):
+        """Flush the remaining items and record the category totals"""
+        self._flush()
+        with self.conn:
+            self.conn.execute(
+                "UPDATE categories SET total = ?, correct = ?, errors = ?, success_rate = ? WHERE id = ?",
+                (result['total'], result['correct'], result.get('errors'), result['success_rate'],
+                 self.category_id))
+
+
+def record_category(conn: sqlite3.Connection, suite: str, model: str, endpoint: Optional[str],
+                    timestamp: str, result: Dict[str, Any], test_date: Optional[str] = None,
+                    source: Optional[str] = None):
+    """Insert or replace one category result (and its items) of a run"""
+    records = result.get('results', [])
+    writer = CategoryWriter(conn, suite, model, endpoint, timestamp, result['task'], test_date, source)
+    for record in records:
+        writer.append(record)
+    writer.close({**result, "errors": result.get('errors', sum(1 for r in records if not r.get('success', True)))})
+
+
+def ingest_file(conn: sqlite3.Connection, path: str) -> bool:
+    """Ingest one timestamped result JSON file; returns False if it is not a result file"""
+    match = RESULT_FILE_PATTERN.match(os.path.basename(path))
+    if not match:
+        return False
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or 'task' not in data or 'results' not in data:
+        return False
+
+    suite = "bfcl" if match.group('name').startswith("bfcl_") else "agentbench"
+    record_category(conn, suite, data.get('model', 'unknown'), data.get('endpoint'),
+                    match.group('timestamp'), data, data.get('test_date'), os.path.abspath(path))
+    return True
+
+
+def ingest_tree(conn: sqlite3.Connection, root: str) -> int:
+    """Ingest every result JSON file under `root`; returns the number of files ingested"""
+    count = 0
+    for directory, subdirs, files in os.walk(root):
+        subdirs[:] = [d for d in subdirs if not d.endswith(".cols")]
+        for name in sorted(files):
+            if name.endswith(".json") and ingest_file(conn, os.path.join(directory, name)):
+                count += 1
+    return count
+
+
+# Category counts; a category whose writer was never closed (an interrupted run) has no totals
+# yet, so its counts come from the items streamed so far
+CATEGORY_COUNTS = (
+    "COALESCE(c.total, (SELECT COUNT(*) FROM items i WHERE i.category_id = c.id))",
+    "COALESCE(c.correct, (SELECT COUNT(*) FROM items i WHERE i.category_id = c.id AND i.judged_correct))",
+    "COALESCE(c.errors, (SELECT COUNT(*) FROM items i WHERE i.category_id = c.id AND NOT i.success))",
+)
+
+
+def query_runs(conn: sqlite3.Connection, model: Optional[str] = None, last: int = 20) -> List[sqlite3.Row]:
+    """Most recent runs with their summed category counts, newest first
+
+    `incomplete` counts the categories that never recorded their totals.
+    """
+    total, correct, errors = CATEGORY_COUNTS
+    sql = (f"SELECT r.suite, r.model, r.timestamp, COUNT(c.id) AS categories, SUM({correct}) AS correct, "
+           f"SUM({total}) AS total, SUM({errors}) AS errors, SUM(c.total IS NULL) AS incomplete "
+           "FROM runs r JOIN categories c ON c.run_id = r.id")
+    params: List[Any] = []
+    if model:
+        sql += " WHERE r.model = ?"
+        params.append(model)
+    sql += " GROUP BY r.id ORDER BY r.timestamp DESC LIMIT ?"
+    params.append(last)
+    return conn.execute(sql, params).fetchall()
+
+
+def query_trend(conn: sqlite3.Connection, category: str, model: Optional[str] = None,
+                last: int = 20) -> List[sqlite3.Row]:
+    """Accuracy of one category over the most recent runs, newest first
+
+    Rows with `incomplete` set are from interrupted runs: their counts cover
+    the items written before the interruption and `success_rate` is NULL.
+    """
+    total, correct, errors = CATEGORY_COUNTS
+    sql = (f"SELECT r.timestamp, r.model, {correct} AS correct, {total} AS total, {errors} AS errors, "
+           "c.success_rate, c.total IS NULL AS incomplete "
+           "FROM categories c JOIN runs r ON r.id = c.run_id WHERE c.category = ?")
+    params: List[Any] = [category]
+    if model:
+        sql += " AND r.model = ?"
+        params.append(model)
+    sql += " ORDER BY r.timestamp DESC LIMIT ?"
+    params.append(last)
+    return conn.execute(sql, params).fetchall()
+
+
+def query_history(conn: sqlite3.Connection, test_id: str, model: Optional[str] = None,
+                  last: int = 20) -> List[sqlite3.Row]:
+    """Outcome of one test id across runs, newest first"""
+    sql = ("SELECT r.timestamp, r.model, c.category, i.judged_correct, i.success, i.latency, "
+           "i.error_kind, i.response_length FROM items i "
+           "JOIN categories c ON c.id = i.category_id JOIN runs r ON r.id = c.run_id WHERE i.test_id = ?")
+    params: List[Any] = [test_id]
+    if model:
+        sql += " AND r.model = ?"
+        params.append(model)
+    sql += " ORDER BY r.timestamp DESC LIMIT ?"
+    params.append(last)
+    return conn.execute(sql, params).fetchall()
+
+
+def category_accuracy(conn: sqlite3.Connection, category: str, model: Optional[str] = None,
+                      timestamp: Optional[str] = None) -> Optional[float]:
+    """Accuracy over judged (non-failed) items of a category in one run, latest run by default
+
+    Categories from interrupted runs (no totals recorded) are not considered.
+    """
+    sql = ("SELECT c.correct, c.total, c.errors FROM categories c JOIN runs r ON r.id = c.run_id "
+           "WHERE c.category = ? AND c.total IS NOT NULL")
+    params: List[Any] = [category]
+    if model:
+        sql += " AND r.model = ?"
+        params.append(model)
+    if timestamp:
+        sql += " AND r.timestamp = ?"
+        params.append(timestamp)
+    row = conn.execute(sql + " ORDER BY r.timestamp DESC LIMIT 1", params).fetchone()
+    if row is None or row['total'] - (row['errors'] or 0) <= 0:
+        return None
+    return row['correct'] / (row['total'] - (row['errors'] or 0))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Query and maintain the evaluation results warehouse")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help=f"database path (default: {DEFAULT_DB_PATH})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="ingest result JSON files from a directory tree")
+    ingest.add_argument("root", nargs="?", default="Results")
+
+    for name, help_text in [("runs", "list recent runs"),
+                            ("trend", "accuracy of a category across runs"),
+                            ("history", "outcome of a test id across runs")]:
+        cmd = sub.add_parser(name, help=help_text)
+        if name == "trend":
+            cmd.add_argument("category")
+        elif name == "history":
+            cmd.add_argument("test_id")
+        cmd.add_argument("--model")
+        cmd.add_argument("--last", type=int, default=20)
+
+    args = parser.parse_args(argv)
+    conn = connect(args.db)
+    start = time.perf_counter()
+
+    if args.command == "ingest":
+        count = ingest_tree(conn, args.root)
+        print(f"Ingested {count} result files from {args.root} into {args.db}")
+    elif args.command == "runs":
+        for row in query_runs(conn, args.model, args.last):
+            rate = (row['correct'] / row['total'] * 100) if row['total'] else 0
+            incomplete = f", {row['incomplete']} incomplete" if row['incomplete'] else ""
+            print(f"{row['timestamp']}  {row['suite']:10s} {row['model']:30s} {row['categories']:2d} categories  "
+                  f"{row['correct']}/{row['total']} ({rate:.1f}%), {row['errors']} failed{incomplete}")
+    elif args.command == "trend":
+        for row in query_trend(conn, args.category, args.model, args.last):
+            if row['incomplete']:
+                rate = (row['correct'] / row['total'] * 100) if row['total'] else 0
+                print(f"{row['timestamp']}  {row['model']:30s} {row['correct']:4d}/{row['total']:<4d} "
+                      f"({rate:5.1f}%), {row['errors']} failed  [incomplete]")
+                continue
+            print(f"{row['timestamp']}  {row['model']:30s} {row['correct']:4d}/{row['total']:<4d} "
+                  f"({row['success_rate']:5.1f}%), {row['errors']} failed")
+    elif args.command == "history":
+        for row in query_history(conn, args.test_id, args.model, args.last):
+            outcome = "ERROR" if not row['success'] else ("✓" if row['judged_correct'] else "✗")
+            latency = f"{row['latency']:.2f}s" if row['latency'] is not None else "n/a"
+            print(f"{row['timestamp']}  {row['model']:30s} {row['category']:25s} {outcome:5s} "
+                  f"latency {latency}  {row['response_length']} chars")
+
+    print(f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Retry Policy for Inference Endpoint Calls
+Classifies request errors, computes jittered exponential backoff and
+holds items whose requests should be retried later
+"""
+
+import heapq
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+RETRYABLE = "retryable"
+FATAL = "fatal"
+
+# Timeouts, throttling and server-side failures (including 503 while an
+# endpoint scales up from zero) are worth retrying; other 4xx responses
+# such as a 400 for an over-long prompt will fail the same way every time.
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+THROTTLE_STATUS_CODES = {429, 503}
+
+
+def classify_error(error: Exception) -> str:
+    """Classify a request exception as RETRYABLE or FATAL"""
+    if isinstance(error, requests.HTTPError):
+        if error.response is None:
+            return RETRYABLE
+        return RETRYABLE if error.response.status_code in RETRYABLE_STATUS_CODES else FATAL
+    if isinstance(error, (requests.ConnectionError, requests.Timeout,
+                          requests.exceptions.ChunkedEncodingError)):
+        return RETRYABLE
+    return FATAL
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the Retry-After header (in seconds) from an HTTP error, if present"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    value = response.headers.get('Retry-After')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def status_code(error: Exception) -> Optional[int]:
+    """HTTP status code carried by a request exception, if any"""
+    response = getattr(error, 'response', None)
+    return response.status_code if response is not None else None
+
+
+def failure_result(error: Exception) -> Dict[str, Any]:
+    """Build the failed generate_response result for an exception"""
+    code = status_code(error)
+    return {
+        "success": False,
+        "response": "",
+        "error": str(error),
+        "error_kind": classify_error(error),
+        "status_code": code,
+        "throttled": code in THROTTLE_STATUS_CODES,
+        "retry_after": retry_after_seconds(error),
+    }
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+    max_attempts: int = 8
+    base_delay: float = 2.0
+    max_delay: float = 120.0
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before the retry following failed attempt number `attempt` (1-based)"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(0, ceiling)
+        if retry_after:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+class DeferredRetryQueue:
+    """Items whose requests failed with a retryable error, ordered by when they may be retried"""
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        # (ready at, sequence, entry, attempts so far, last failed result)
+        self._heap: List[Tuple[float, int, Any, int, Dict[str, Any]]] = []
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def defer(self, entry: Any, attempts: int, result: Dict[str, Any]) -> float:
+        """Schedule `entry` for another attempt; returns the backoff delay in seconds"""
+        delay = self.policy.backoff(attempts, result.get('retry_after'))
+        heapq.heappush(self._heap, (time.monotonic() + delay, self._seq, entry, attempts, result))
+        self._seq += 1
+        return delay
+
+    def drain(self, attempt: Callable[[Any], Dict[str, Any]],
+              on_retry: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterator[Tuple[Any, Dict[str, Any], int]]:
+        """Retry deferred entries until each succeeds, fails fatally or runs out of attempts
+
+        Yields (entry, final_result, attempts) for every entry. `on_retry` is
+        called with the failed result whenever an entry is deferred again.
+        """
+        while self._heap:
+            ready_at, _, entry, attempts, _ = heapq.heappop(self._heap)
+            wait = ready_at - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            result = attempt(entry)
+            attempts += 1
+            if (not result['success'] and result.get('error_kind') == RETRYABLE
+                    and attempts < self.policy.max_attempts):
+                self.defer(entry, attempts, result)
+                if on_retry:
+                    on_retry(result)
+                continue
+            yield entry, result, attempts
+
+    def abandon(self) -> Iterator[Tuple[Any, Dict[str, Any], int]]:
+        """Empty the queue without retrying; yields (entry, last_failed_result, attempts) for each entry"""
+        while self._heap:
+            _, _, entry, attempts, result = heapq.heappop(self._heap)
+            yield entry, result, attempts
@@ -0,0 +1,248 @@
+"""
+Run-to-run Diff
+Joins two or more runs of the same category by test id and reports which
+items flipped between correct, incorrect and failed, plus response-length
+and latency deltas
+
+Each run is loaded into a hash index (test id -> outcome) from its columnar
+store when one exists (only the needed columns are decoded), otherwise by
+streaming the result JSON's records. Runs of different categories are
+refused.
+
+Usage:
+    python3 run_diff.py Results/Berkeley/bfcl_parallel_20251209_213535.json \\
+        Results/Berkeley/bfcl_parallel_20251215_101500.json
+    python3 run_diff.py 20251209_213535 20251215_101500 --dir Results/Berkeley
+    python3 run_diff.py 20251209_213535 latest --dir Results/Berkeley --json diff.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import statistics
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from data_stream import iter_json_array
+from results_store import INDEX_FILE, read_columns, read_index, store_path_for
+
+TIMESTAMP_PATTERN = re.compile(r'^(?P<category>.+)_(?P<timestamp>\d{8}_\d{6})\.json$')
+DIFF_COLUMNS = ("id", "judged_correct", "success", "error_kind", "latency", "model_response")
+
+
+class Outcome(NamedTuple):
+    status: str              # "correct", "incorrect" or "error"
+    error_kind: Optional[str]
+    response_length: Optional[int]
+    latency: Optional[float]
+
+
+def _status(judged_correct: Any, success: Any) -> str:
+    if success is False:
+        return "error"
+    return "correct" if judged_correct else "incorrect"
+
+
+def load_outcomes(path: str) -> Tuple[Dict[str, Any], Dict[str, Outcome]]:
+    """(run metadata, {test id: outcome}) of one result file, read from its columnar store if present"""
+    store = store_path_for(path)
+    if os.path.exists(os.path.join(store, INDEX_FILE)):
+        index = read_index(store)
+        columns = read_columns(store, DIFF_COLUMNS)
+        outcomes = {
+            str(rid): Outcome(_status(correct, success), kind, len(response) if response is not None else None, latency)
+            for rid, correct, success, kind, latency, response in zip(*(columns[name] for name in DIFF_COLUMNS))
+        }
+        return {"model": index.get('model'), "task": index.get('task'), "source": store}, outcomes
+
+    # Result files put their metadata ahead of the `results` array
+    header: Dict[str, Any] = {}
+    outcomes = {
+        str(r['id']): Outcome(_status(r.get('judged_correct'), r.get('success', True)), r.get('error_kind'),
+                              len(r['model_response']) if r.get('model_response') is not None else None,
+                              r.get('latency'))
+        for r in iter_json_array(path, key="results", header=header)
+    }
+    return {"model": header.get('model'), "task": header.get('task'), "source": path}, outcomes
+
+
+# ==================== Diff ====================
+
+def _mean(values: List[float]) -> Optional[float]:
+    return round(statistics.fmean(values), 3) if values else None
+
+
+def diff_outcomes(before: Dict[str, Outcome], after: Dict[str, Outcome], top: int = 5) -> Dict[str, Any]:
+    """Compare two indexed runs; ids are joined through the `before` index"""
+    regressed, fixed, newly_failed, recovered, kind_changed = [], [], [], [], []
+    length_deltas: List[Tuple[int, str]] = []
+    latency_deltas: List[Tuple[float, str]] = []
+    for rid, new in after.items():
+        old = before.get(rid)
+        if old is None:
+            continue
+        if old.status == "correct" and new.status != "correct":
+            regressed.append(rid)
+        elif old.status != "correct" and new.status == "correct":
+            fixed.append(rid)
+        if old.status != "error" and new.status == "error":
+            newly_failed.append(rid)
+        elif old.status == "error" and new.status != "error":
+            recovered.append(rid)
+        elif old.status == new.status == "error" and old.error_kind != new.error_kind:
+            kind_changed.append(rid)
+        if old.response_length is not None and new.response_length is not None:
+            length_deltas.append((new.response_length - old.response_length, rid))
+        if old.latency is not None and new.latency is not None:
+            latency_deltas.append((new.latency - old.latency, rid))
+
+    length_deltas.sort()
+    latency_deltas.sort()
+    return {
+        "before": {"total": len(before), "correct": sum(1 for o in before.values() if o.status == "correct"),
+                   "errors": sum(1 for o in before.values() if o.status == "error")},
+        "after": {"total": len(after), "correct": sum(1 for o in after.values() if o.status == "correct"),
+                  "errors": sum(1 for o in after.values() if o.status == "error")},
+        "only_before": sorted(before.keys() - after.keys()),
+        "only_after": sorted(after.keys() - before.keys()),
+        "regressed": regressed,
+        "fixed": fixed,
+        "newly_failed": newly_failed,
+        "recovered": recovered,
+        "error_kind_changed": kind_changed,
+        "mean_length_delta": _mean([d for d, _ in length_deltas]),
+        "longer": [{"id": rid, "delta": d} for d, rid in reversed(length_deltas[-top:]) if d > 0],
+        "shorter": [{"id": rid, "delta": d} for d, rid in length_deltas[:top] if d < 0],
+        "mean_latency_delta": _mean([d for d, _ in latency_deltas]),
+        "median_latency_delta": round(statistics.median([d for d, _ in latency_deltas]), 3) if latency_deltas else None,
+        "slower": [{"id": rid, "delta": round(d, 3)} for d, rid in reversed(latency_deltas[-top:]) if d > 0],
+    }
+
+
+def diff_runs(paths: List[str], top: int = 5) -> Dict[str, Any]:
+    """Diff consecutive runs of one category; ids flipping in more than one step are reported as unstable"""
+    loaded = [load_outcomes(path) for path in paths]
+    tasks = {meta['task'] for meta, _ in loaded if meta.get('task')}
+    if len(tasks) > 1:
+        raise ValueError(f"Runs are of different categories ({', '.join(sorted(tasks))}); "
+                         "diff runs of the same category")
+    steps = []
+    flips: Dict[str, int] = {}
+    for (meta_a, before), (meta_b, after) in zip(loaded, loaded[1:]):
+        step = diff_outcomes(before, after, top)
+        step.update(source_before=meta_a['source'], source_after=meta_b['source'])
+        for rid in step['regressed'] + step['fixed']:
+            flips[rid] = flips.get(rid, 0) + 1
+        steps.append(step)
+    return {
+        "task": next((meta['task'] for meta, _ in loaded if meta.get('task')), None),
+        "models": [meta.get('model') for meta, _ in loaded],
+        "steps": steps,
+        "unstable": sorted(rid for rid, count in flips.items() if count > 1),
+    }
+
+
+# ==================== Run Selection ====================
+
+def run_files(directory: str, timestamp: str) -> Dict[str, str]:
+    """{category prefix: result file} of one run (a timestamp, or 'latest') in a results directory"""
+    runs: Dict[str, Dict[str, str]] = {}
+    for path in glob.glob(os.path.join(directory, "*_????????_??????.json")):
+        match = TIMESTAMP_PATTERN.match(os.path.basename(path))
+        if match:
+            runs.setdefault(match['timestamp'], {})[match['category']] = path
+    if timestamp == "latest":
+        timestamp = max(runs, default="")
+    return runs.get(timestamp, {})
+
+
+def resolve_groups(runs: List[str], directory: str) -> Dict[str, List[str]]:
+    """{category: [file per run, oldest argument first]} for file paths or run timestamps"""
+    if all(os.path.isfile(run) for run in runs):
+        matches = [TIMESTAMP_PATTERN.match(os.path.basename(run)) for run in runs]
+        categories = sorted({match['category'] for match in matches if match})
+        if len(categories) > 1:
+            raise ValueError(f"Runs are of different categories ({', '.join(categories)}); "
+                             "diff runs of the same category")
+        return {categories[0] if categories else os.path.basename(runs[0]): runs}
+
+    per_run = [run_files(directory, run) for run in runs]
+    for run, files in zip(runs, per_run):
+        if not files:
+            raise FileNotFoundError(f"No result files for run {run!r} in {directory}")
+    shared = set(per_run[0]).intersection(*per_run[1:])
+    return {category: [files[category] for files in per_run] for category in sorted(shared)}
+
+
+def _ids(ids: List[str], limit: int) -> str:
+    shown = ", ".join(ids[:limit])
+    return shown + (f" (+{len(ids) - limit} more)" if len(ids) > limit else "")
+
+
+def format_report(category: str, diff: Dict[str, Any], show: int = 10) -> str:
+    lines = []
+    for step in diff['steps']:
+        b, a = step['before'], step['after']
+        latency = f"{step['mean_latency_delta']:+.2f}s" if step['mean_latency_delta'] is not None else "n/a"
+        length = f"{step['mean_length_delta']:+.1f}" if step['mean_length_delta'] is not None else "n/a"
+        lines.append(f"{category}: {b['correct']}/{b['total']} -> {a['correct']}/{a['total']} "
+                     f"({a['correct'] - b['correct']:+d})  ▼ {len(step['regressed'])} regressed  "
+                     f"▲ {len(step['fixed'])} fixed  errors {b['errors']} -> {a['errors']}  "
+                     f"Δlen {length} chars  Δlatency {latency}")
+        for label, key in (("regressed", "regressed"), ("fixed", "fixed"), ("newly failing", "newly_failed"),
+                           ("recovered", "recovered"), ("error kind changed", "error_kind_changed"),
+                           ("only in earlier run", "only_before"), ("only in later run", "only_after")):
+            if step[key]:
+                lines.append(f"    {label}: {_ids(step[key], show)}")
+        if step['slower']:
+            lines.append("    slowest: " + ", ".join(f"{s['id']} {s['delta']:+.2f}s" for s in step['slower']))
+    if diff['unstable']:
+        lines.append(f"    unstable across runs: {_ids(diff['unstable'], show)}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Diff per-item outcomes between runs")
+    parser.add_argument("runs", nargs="+",
+                        help="two or more result files of one category, or run timestamps ('latest' allowed) "
+                             "to diff every category the runs share")
+    parser.add_argument("--dir", default="Results/Berkeley", help="results directory for timestamps")
+    parser.add_argument("--show", type=int, default=10, help="ids listed per group (default: 10)")
+    parser.add_argument("--top", type=int, default=5, help="largest length/latency changes kept (default: 5)")
+    parser.add_argument("--json", help="also write the full diff to this file")
+    parser.add_argument("--regressions-only", action="store_true", help="only print categories that regressed")
+    args = parser.parse_args(argv)
+
+    if len(args.runs) < 2:
+        parser.error("need at least two runs")
+
+    start = time.perf_counter()
+    try:
+        groups = resolve_groups(args.runs, args.dir)
+        diffs = {category: diff_runs(paths, args.top) for category, paths in groups.items()}
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        exit(1)
+    elapsed = time.perf_counter() - start
+
+    regressions = 0
+    for category, diff in diffs.items():
+        regressed = sum(len(step['regressed']) for step in diff['steps'])
+        regressions += regressed
+        if args.regressions_only and not regressed:
+            continue
+        print(format_report(category, diff, args.show))
+
+    print(f"\n{len(diffs)} categories diffed in {elapsed:.3f}s; "
+          f"{regressions} regressed items, "
+          f"{sum(len(step['fixed']) for diff in diffs.values() for step in diff['steps'])} fixed")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(diffs, f, indent=2, ensure_ascii=False)
+        print(f"✓ Diff saved: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
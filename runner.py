@@ -0,0 +1,236 @@
+"""
+Shared Evaluation Runner
+Sends each item's prompt to the endpoint, judges the response and defers
+retryable failures to the end of the category instead of sleeping inline
+"""
+
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import metrics_exporter as metrics
+from budget import BUDGET_EXHAUSTED, BudgetTracker
+from progress import ProgressTracker
+from prompt_guard import unsent_result
+from result_records import CategoryTally, ResultRecord
+from retry_policy import FATAL, RETRYABLE, DeferredRetryQueue, RetryPolicy
+from tokenization import count_tokens, counts_estimated
+from warmup import ColdStartDetector
+
+
+def _finish_item(item: Dict[str, Any], result: Dict[str, Any], attempts: int,
+                 judge: Callable[[Dict, Dict], ResultRecord], out: Callable[[str], None]) -> ResultRecord:
+    """Judge one final result and print its outcome"""
+    record = judge(item, result)
+    record.attempts = attempts
+    record.latency = result.get('latency')
+    record.cold_start = bool(result.get('cold_start'))
+    # Token counts the endpoint did not report are counted locally (or were, by the pre-flight guard)
+    record.prompt_tokens = result.get('prompt_tokens')
+    counted = record.prompt_tokens is None
+    if record.prompt_tokens is None:
+        record.prompt_tokens = item.get('prompt_tokens')
+    if record.prompt_tokens is None:
+        record.prompt_tokens = count_tokens(item['prompt'])
+    if result['success']:
+        record.completion_tokens = result.get('completion_tokens')
+        if record.completion_tokens is None:
+            counted = True
+            record.completion_tokens = count_tokens(result['response'])
+    record.tokens_estimated = counted and counts_estimated()
+    record.finish_reason = result.get('finish_reason')
+    record.timing = result.get('timing')
+
+    if not result['success']:
+        record.error = result['error']
+        record.error_kind = result.get('error_kind')
+        out(f"  ✗ ERROR ({result.get('error_kind')}): {(result['error'] or 'Unknown')[:40]}")
+    elif record.judged_correct:
+        out(f"  ✓ CORRECT")
+    elif item.get('hint'):
+        out(f"  ✗ INCORRECT ({item['hint']})")
+    else:
+        out(f"  ✗ INCORRECT")
+    return record
+
+
+def run_items(items: Iterable[Dict[str, Any]], generate_batch: Callable[[List[str]], List[Dict[str, Any]]],
+              judge: Callable[[Dict, Dict], ResultRecord], policy: RetryPolicy,
+              batch_size: int = 1, pace: float = 0.0, sink: Optional[Callable[[ResultRecord], None]] = None,
+              progress: Optional[ProgressTracker] = None, category: str = "",
+              stop: Optional[Callable[[ResultRecord], bool]] = None,
+              tally: Optional[CategoryTally] = None, total: Optional[int] = None,
+              cold_start: Optional[ColdStartDetector] = None,
+              echo: Optional[Callable[[str], None]] = None,
+              budget: Optional[BudgetTracker] = None) -> CategoryTally:
+    """Evaluate items in order and return the category's running tally
+
+    `items` may be any iterable, e.g. a generator streaming from disk; it is
+    pulled one batch at a time and `total` sizes the progress view when it
+    has no len(). Each item needs a `prompt` and a printable `label`. Prompts
+    are handed to `generate_batch` `batch_size` at a time (a backend's
+    generate_batch runs them concurrently or as one batched request) with a
+    single attempt each; items failing with a retryable error are retried
+    from a deferred queue once every other item has been tried, so one slow
+    or cold request does not stall the loop. Records are not kept: `sink`, if
+    given, receives each record as soon as it is final (deferred items
+    therefore arrive last) and only the counts end up in the returned tally
+    (pass `tally` to continue one). `progress` receives request, retry and
+    completion events for the live status view; the same events always feed
+    the Prometheus metrics in metrics_exporter. `stop` is called with each
+    final record; once it returns True no further batches are sent (deferred
+    ones are still drained). `cold_start` sees every request result and tags
+    those produced while the endpoint looked cold. Items carrying a
+    `preflight_error` (see prompt_guard.py) are recorded as failed without a
+    request. `budget` is shared by the whole run: it counts every request and
+    result, may skip items to fit (budget sampling), and once it is spent no
+    further batches or retries are sent and the tally is marked incomplete.
+    Per-item lines go to `echo` (default: the progress view, else print).
+    """
+    tally = tally if tally is not None else CategoryTally(category)
+    queue = DeferredRetryQueue(policy)
+    out = echo or (progress.echo if progress else print)
+    stopped = False
+
+    def attempt(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        sendable = [item for item in batch if 'preflight_error' not in item]
+        results: List[Dict[str, Any]] = []
+        if sendable:
+            if progress:
+                for _ in sendable:
+                    progress.request_started()
+            metrics.request_started(category, len(sendable))
+            try:
+                results = generate_batch([item['prompt'] for item in sendable])
+            except BaseException:
+                metrics.IN_FLIGHT.dec(len(sendable))
+                raise
+            if len(results) != len(sendable):
+                # Zipping a short list against the batch would silently drop items
+                error = f"Backend returned {len(results)} results for {len(sendable)} prompts"
+                results = [{"success": False, "response": "", "error": error, "error_kind": FATAL}
+                           for _ in sendable]
+            for result in results:
+                metrics.request_finished(category, result)
+            if progress:
+                for _ in sendable:
+                    progress.request_finished()
+            if cold_start:
+                for result in results:
+                    cold_start.observe(result)
+        if len(sendable) == len(batch):
+            return results
+        sent = iter(results)
+        return [unsent_result(item) if 'preflight_error' in item else next(sent) for item in batch]
+
+    def finish(item: Dict[str, Any], result: Dict[str, Any], attempts: int):
+        nonlocal stopped
+        record = _finish_item(item, result, attempts, judge, out)
+        tally.add(record)
+        if sink:
+            sink(record)
+        if progress:
+            progress.item_done(record)
+        metrics.item_done(category, record.success, record.judged_correct)
+        if budget:
+            budget.observe(record)
+        if stop and stop(record):
+            stopped = True
+
+    if total is None:
+        total = len(items) if hasattr(items, '__len__') else 0
+    shown_total = total or "?"
+    if progress:
+        progress.start_category(category, total)
+
+    iterator = iter(items)
+    batch_size = max(1, batch_size)
+
+    def next_batch(size: int) -> List[Dict[str, Any]]:
+        if budget is None:
+            return list(islice(iterator, size))
+        batch = []
+        for item in iterator:
+            if budget.admit():
+                batch.append(item)
+                if len(batch) == size:
+                    break
+            else:
+                tally.skipped += 1
+        return batch
+
+    def out_of_budget() -> bool:
+        if budget and budget.check():
+            tally.incomplete = budget.stop_reason
+            return True
+        return False
+
+    sent = 0
+    while True:
+        # Checked before drawing a batch: drawing consumes items (and budget-sampling credit)
+        if stopped:
+            if not total or sent < total:
+                out(f"  ■ Stopping early after {sent}/{shown_total} items")
+            break
+        if out_of_budget():
+            out(f"  ■ {budget.stop_reason}: stopping after {sent}/{shown_total} items")
+            break
+        # Requests are claimed before the batch is drawn, so a batch never exceeds what is left
+        allowed = budget.reserve(batch_size) if budget else batch_size
+        if not allowed:
+            out_of_budget()
+            out(f"  ■ {budget.stop_reason}: stopping after {sent}/{shown_total} items")
+            break
+        batch = next_batch(allowed)
+        if budget:
+            budget.release(allowed - sum(1 for item in batch if 'preflight_error' not in item))
+        if not batch:
+            break
+        results = attempt(batch)
+
+        for idx, item, result in zip(range(sent + 1, sent + len(batch) + 1), batch, results):
+            out(f"[{idx}/{shown_total}] {item['label']}")
+            if not result['success'] and result.get('error_kind') == RETRYABLE and policy.max_attempts > 1:
+                delay = queue.defer((idx, item), 1, result)
+                if progress:
+                    progress.retry_scheduled(result)
+                metrics.retry_scheduled(category, result, len(queue))
+                out(f"  ↻ DEFERRED: {(result['error'] or 'Unknown')[:40]} (retry in {delay:.0f}s)")
+            else:
+                finish(item, result, 1)
+        sent += len(batch)
+
+        if pace:
+            time.sleep(pace)
+
+    def retry(entry) -> Dict[str, Any]:
+        metrics.QUEUE_DEPTH.set(len(queue), category=category)
+        if budget and not budget.reserve(1):
+            return {"success": False, "response": "", "error": "request budget spent; not retried",
+                    "error_kind": BUDGET_EXHAUSTED}
+        return attempt([entry[1]])[0]
+
+    def requeued(result: Dict[str, Any]):
+        if progress:
+            progress.retry_scheduled(result)
+        metrics.retry_scheduled(category, result, len(queue))
+
+    if queue and not out_of_budget():
+        out(f"\nRetrying {len(queue)} deferred items...")
+        for (idx, item), result, attempts in queue.drain(retry, on_retry=requeued):
+            out(f"[{idx}/{shown_total}] (attempt {attempts}) {item['label']}")
+            finish(item, result, attempts)
+            if queue and out_of_budget():
+                break
+    if queue and tally.incomplete:
+        # Recorded with their last error, so an incomplete category's totals still cover every item tried
+        out(f"  ■ {len(queue)} deferred items left unretried ({tally.incomplete})")
+        for (idx, item), result, attempts in queue.abandon():
+            out(f"[{idx}/{shown_total}] (not retried) {item['label']}")
+            finish(item, {**result, "error_kind": BUDGET_EXHAUSTED,
+                          "error": f"not retried, {tally.incomplete}; last error: {result.get('error')}"}, attempts)
+    metrics.QUEUE_DEPTH.set(0, category=category)
+
+    if progress:
+        progress.finish_category()
+    return tally
@@ -0,0 +1,103 @@
+"""
+Sequential Sampling
+Stratified random item order plus a running Wilson interval that decides
+when a category has been measured precisely enough to stop early
+"""
+
+import math
+import random
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from result_records import ResultRecord
+
+Z_SCORES = {0.90: 1.645, 0.95: 1.96, 0.99: 2.576}
+
+
+def stratified_order(items: List[Dict[str, Any]], key: Callable[[Dict[str, Any]], Hashable],
+                     seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Shuffle items so that every prefix is close to proportionally stratified
+
+    Items are shuffled within each stratum, then interleaved by systematic
+    position: the j-th of n items in a stratum sits at (j + offset) / n with a
+    random per-stratum offset, so strata stay balanced however early a run stops.
+    """
+    rng = random.Random(seed)
+    strata: Dict[Hashable, List[Dict[str, Any]]] = defaultdict(list)
+    for item in items:
+        strata[key(item)].append(item)
+
+    positioned = []
+    for members in strata.values():
+        rng.shuffle(members)
+        offset = rng.random()
+        positioned.extend(((j + offset) / len(members), rng.random(), item) for j, item in enumerate(members))
+    positioned.sort(key=lambda entry: entry[:2])
+    return [item for _, _, item in positioned]
+
+
+def wilson_interval(correct: int, n: int, confidence: float = 0.95) -> Tuple[float, float]:
+    """Wilson score interval for a binomial proportion"""
+    if n == 0:
+        return 0.0, 1.0
+    z = Z_SCORES.get(confidence, 1.96)
+    p = correct / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+
+class SequentialStopper:
+    """Decide after each judged item whether a category can stop early
+
+    Stops once the interval is narrower than `target_width`, or - when a
+    baseline accuracy is known - once the interval lies entirely within
+    baseline ± `tolerance` (equivalent) or entirely outside it (separated).
+    Failed requests are not judged and do not count towards n.
+    """
+
+    def __init__(self, target_width: float = 0.10, baseline: Optional[float] = None,
+                 tolerance: float = 0.02, min_items: int = 30, confidence: float = 0.95):
+        self.target_width = target_width
+        self.baseline = baseline
+        self.tolerance = tolerance
+        self.min_items = min_items
+        self.confidence = confidence
+        self.correct = 0
+        self.n = 0
+        self.reason: Optional[str] = None
+
+    @property
+    def interval(self) -> Tuple[float, float]:
+        return wilson_interval(self.correct, self.n, self.confidence)
+
+    def update(self, record: ResultRecord) -> bool:
+        """Add one record; returns True once the category can stop"""
+        if record.success:
+            self.n += 1
+            self.correct += int(bool(record.judged_correct))
+        if self.reason or self.n < self.min_items:
+            return bool(self.reason)
+
+        low, high = self.interval
+        if high - low <= self.target_width:
+            self.reason = "width"
+        elif self.baseline is not None:
+            if low >= self.baseline - self.tolerance and high <= self.baseline + self.tolerance:
+                self.reason = "equivalent"
+            elif high < self.baseline - self.tolerance or low > self.baseline + self.tolerance:
+                self.reason = "separated"
+        return bool(self.reason)
+
+    def summary(self) -> Dict[str, Any]:
+        low, high = self.interval
+        return {
+            "sampled": True,
+            "judged": self.n,
+            "ci_low": round(low * 100, 2),
+            "ci_high": round(high * 100, 2),
+            "confidence": self.confidence,
+            "baseline_rate": round(self.baseline * 100, 2) if self.baseline is not None else None,
+            "stop_reason": self.reason or "exhausted",
+        }
@@ -0,0 +1,180 @@
+"""
+Execution-based SQL Judge
+Runs generated queries against in-memory SQLite copies of each dbbench
+item's tables and compares the result set with the expected answer
+
+Databases are built once per distinct schema (keyed by a hash of the table
+definitions) in each worker process; queries run in a process pool with a
+per-query timeout so a runaway query cannot stall the evaluation.
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fingerprint import fingerprint
+
+# Built databases kept per worker process, least recently used evicted first
+CACHE_SIZE = 128
+# dbbench query types whose label is a hash of the table after the statement ran
+MUTATION_TYPES = {"INSERT", "UPDATE", "DELETE"}
+
+SQL_BLOCK_PATTERN = re.compile(r'```(?:sql|sqlite|mysql)?\s*(.*?)```', re.DOTALL | re.IGNORECASE)
+SQL_STATEMENT_PATTERN = re.compile(r'\b(SELECT|INSERT|UPDATE|DELETE|WITH)\b.*?(?:;|\n\s*\n|$)',
+                                    re.DOTALL | re.IGNORECASE)
+
+_databases: "OrderedDict[str, sqlite3.Connection]" = OrderedDict()
+
+
+def item_tables(table: Any) -> List[Dict[str, Any]]:
+    """dbbench items carry one table dict or a list of them"""
+    return table if isinstance(table, list) else [table]
+
+
+def schema_hash(tables: List[Dict[str, Any]]) -> str:
+    return fingerprint(tables=tables)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def build_database(tables: List[Dict[str, Any]]) -> sqlite3.Connection:
+    """Create an in-memory database holding the given dbbench tables"""
+    conn = sqlite3.connect(":memory:", isolation_level=None, check_same_thread=False)
+    for table in tables:
+        info = table['table_info']
+        columns = ", ".join(f"{_quote(c['name'])} {c.get('type') or 'TEXT'}" for c in info['columns'])
+        conn.execute(f"CREATE TABLE {_quote(table['table_name'])} ({columns})")
+        placeholders = ", ".join("?" * len(info['columns']))
+        conn.executemany(f"INSERT INTO {_quote(table['table_name'])} VALUES ({placeholders})", info['rows'])
+    return conn
+
+
+def cached_database(tables: List[Dict[str, Any]]) -> sqlite3.Connection:
+    """This process's database for the schema, building it on first use"""
+    key = schema_hash(tables)
+    conn = _databases.get(key)
+    if conn is None:
+        conn = _databases[key] = build_database(tables)
+        if len(_databases) > CACHE_SIZE:
+            _databases.popitem(last=False)[1].close()
+    else:
+        _databases.move_to_end(key)
+    return conn
+
+
+def extract_sql(response: str) -> Optional[str]:
+    """The first SQL statement in a model response (fenced block preferred)"""
+    block = SQL_BLOCK_PATTERN.search(response)
+    text = block.group(1) if block else response
+    match = SQL_STATEMENT_PATTERN.search(text)
+    return match.group(0).strip().rstrip(';').strip() if match else None
+
+
+def normalize_value(value: Any) -> str:
+    """Canonical text for comparing result cells with labels (numbers compare numerically)"""
+    if value is None:
+        return ""
+    text = str(value).strip()
+    try:
+        number = float(text)
+    except ValueError:
+        return text
+    return str(int(number)) if number.is_integer() else f"{round(number, 4):g}"
+
+
+def table_hash(conn: sqlite3.Connection, table_name: str) -> str:
+    """Mirror of dbbench's MySQL state hash: md5 of the sorted 5-char row hashes"""
+    row_hashes = sorted(
+        hashlib.md5(",".join(str(v) for v in row if v is not None).encode('utf-8')).hexdigest()[:5]
+        for row in conn.execute(f"SELECT * FROM {_quote(table_name)}"))
+    return hashlib.md5(",".join(row_hashes).encode('utf-8')).hexdigest()
+
+
+def _execute(conn: sqlite3.Connection, query: str, timeout: float,
+             hash_table: Optional[str]) -> Tuple[Optional[List[str]], Optional[str]]:
+    deadline = time.monotonic() + timeout
+    conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 1000)
+    conn.execute("BEGIN")
+    try:
+        cursor = conn.execute(query)
+        rows = cursor.fetchall()
+        if hash_table:
+            return [table_hash(conn, hash_table)], None
+        return [normalize_value(v) for row in rows for v in row], None
+    except sqlite3.Error as e:
+        return None, "timeout" if "interrupted" in str(e) else str(e)
+    finally:
+        # Every query runs in a transaction that is rolled back, so the cached database never changes
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.set_progress_handler(None, 0)
+
+
+def judge_query(response: str, table: Any, expected: Sequence[Any], query_type: str = "SELECT",
+                timeout: float = 2.0) -> Dict[str, Any]:
+    """Execute the response's SQL and compare with the expected answer
+
+    Returns {"correct", "sql", "error"}. Result cells and labels are compared
+    as sets of normalized values, ignoring row order; for INSERT/UPDATE/DELETE
+    items the label is the hash of the modified table.
+    """
+    query = extract_sql(response)
+    if not query:
+        return {"correct": False, "sql": None, "error": "no SQL statement found"}
+
+    tables = item_tables(table)
+    hash_table = tables[0]['table_name'] if query_type.upper() in MUTATION_TYPES else None
+    values, error = _execute(cached_database(tables), query, timeout, hash_table)
+    if values is None:
+        return {"correct": False, "sql": query, "error": error}
+    if hash_table:
+        return {"correct": bool(expected) and values[0] == str(expected[0]), "sql": query, "error": None}
+    return {"correct": set(values) == {normalize_value(v) for v in expected}, "sql": query, "error": None}
+
+
+def _judge_packed(args: Tuple) -> Dict[str, Any]:
+    return judge_query(*args)
+
+
+class SQLJudge:
+    """Process pool front end for judge_query()"""
+
+    def __init__(self, workers: Optional[int] = None, timeout: float = 2.0):
+        self.workers = workers
+        self.timeout = timeout
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Several evaluation threads (e.g. compare_models) may share one judge and its pool
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def judge(self, response: str, table: Any, expected: Sequence[Any], query_type: str = "SELECT") -> Dict[str, Any]:
+        future = self._executor().submit(judge_query, response, table, expected, query_type, self.timeout)
+        try:
+            # The in-worker progress handler enforces the timeout; this only guards against a wedged worker
+            return future.result(timeout=self.timeout + 10)
+        except FutureTimeout:
+            self.close()
+            return {"correct": False, "sql": extract_sql(response), "error": "timeout"}
+
+    def judge_many(self, jobs: List[Tuple[str, Any, Sequence[Any], str]]) -> List[Dict[str, Any]]:
+        """Judge (response, table, expected, query_type) tuples across the pool, in order"""
+        args = [(*job, self.timeout) for job in jobs]
+        return list(self._executor().map(_judge_packed, args, chunksize=max(1, len(args) // 64)))
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
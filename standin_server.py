@@ -0,0 +1,157 @@
+"""
+Stand-in Inference Server
+A local, dependency-free imitation of a TGI endpoint (POST /, GET /health)
+and an OpenAI-compatible one (POST /v1/completions, GET /v1/models) with a
+simple latency model, for measuring the evaluation harness itself and for
+load-test dry runs without a real endpoint
+
+Each request occupies one of `slots` generation slots (requests beyond that
+queue, like a saturated server) for prefill_ms per prompt token plus
+decode_ms per generated token; zero both to measure harness overhead only.
+
+Usage:
+    python3 standin_server.py --port 8080 --slots 4 --decode-ms 20
+    python3 berkeley_evaluation.py --backend hf:http://127.0.0.1:8080
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+from tokenization import estimate_tokens
+
+
+class StandinModel:
+    """Latency model and canned completions shared by all request threads"""
+
+    def __init__(self, slots: int = 4, prefill_ms: float = 0.2, decode_ms: float = 20.0, tokens: int = 24):
+        self.slots = threading.BoundedSemaphore(slots)
+        self.prefill_ms = prefill_ms
+        self.decode_ms = decode_ms
+        self.tokens = tokens
+        self.served = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, max_new_tokens: Optional[int]) -> Tuple[str, Dict[str, Any]]:
+        """(text, details) for one prompt, after the modelled queueing and generation time"""
+        prompt_tokens = estimate_tokens(prompt)
+        generated = min(self.tokens, max_new_tokens or self.tokens)
+        queued = time.perf_counter()
+        with self.slots:
+            started = time.perf_counter()
+            seconds = (self.prefill_ms * prompt_tokens + self.decode_ms * generated) / 1000
+            if seconds:
+                time.sleep(seconds)
+        with self._lock:
+            self.served += 1
+        details = {
+            "prompt_tokens": prompt_tokens,
+            "generated_tokens": generated,
+            "finish_reason": "length" if generated == max_new_tokens else "eos_token",
+            "queue_ms": round((started - queued) * 1000, 3),
+            "inference_ms": round(seconds * 1000, 3),
+        }
+        # One short word per token, so estimated and reported counts agree
+        return " ".join(["ok"] * generated), details
+
+
+def make_handler(model: StandinModel):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _json(self) -> Dict[str, Any]:
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path.rstrip('/') == "/health":
+                self._send(200, {"status": "ok"})
+            elif self.path.rstrip('/') == "/v1/models":
+                self._send(200, {"object": "list", "data": [{"id": "standin", "object": "model"}]})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            try:
+                request = self._json()
+            except json.JSONDecodeError:
+                self._send(400, {"error": "invalid JSON"})
+                return
+
+            if self.path.rstrip('/') == "/v1/completions":
+                prompts = request.get('prompt', "")
+                prompts = prompts if isinstance(prompts, list) else [prompts]
+                choices, usage = [], {"prompt_tokens": 0, "completion_tokens": 0}
+                for index, prompt in enumerate(prompts):
+                    text, details = model.generate(prompt, request.get('max_tokens'))
+                    usage["prompt_tokens"] += details['prompt_tokens']
+                    usage["completion_tokens"] += details['generated_tokens']
+                    choices.append({"index": index, "text": text,
+                                    "finish_reason": "length" if details['finish_reason'] == "length" else "stop"})
+                self._send(200, {"object": "text_completion", "choices": choices, "usage": usage})
+                return
+
+            parameters = request.get('parameters') or {}
+            text, details = model.generate(request.get('inputs', ""), parameters.get('max_new_tokens'))
+            body = {"generated_text": text}
+            if parameters.get('details'):
+                body["details"] = {"finish_reason": details['finish_reason'],
+                                   "generated_tokens": details['generated_tokens']}
+            generated = max(details['generated_tokens'], 1)
+            self._send(200, [body], {
+                "x-prompt-tokens": str(details['prompt_tokens']),
+                "x-generated-tokens": str(details['generated_tokens']),
+                "x-queue-time": str(details['queue_ms']),
+                "x-inference-time": str(details['inference_ms']),
+                "x-time-per-token": str(round(details['inference_ms'] / generated, 3)),
+            })
+
+    return Handler
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, **model_options: Any) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve in a background thread; returns (server, base URL). Port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), make_handler(StandinModel(**model_options)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="standin-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for a TGI / OpenAI-compatible endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--slots", type=int, default=4, help="concurrent generations before requests queue")
+    parser.add_argument("--prefill-ms", type=float, default=0.2, help="milliseconds per prompt token")
+    parser.add_argument("--decode-ms", type=float, default=20.0, help="milliseconds per generated token")
+    parser.add_argument("--tokens", type=int, default=24, help="tokens generated per request (capped by max tokens)")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(
+        StandinModel(args.slots, args.prefill_ms, args.decode_ms, args.tokens)))
+    print(f"Stand-in server on http://{args.host}:{args.port} "
+          f"({args.slots} slots, {args.prefill_ms}ms/prompt token, {args.decode_ms}ms/generated token)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Token Counting
+Prompt and completion token counts for results whose endpoint reports none:
+the model's own tokenizer.json (via the optional `tokenizers` package),
+downloaded from the HuggingFace hub and cached on first use, otherwise
+(offline, or without the package) a BPE-like estimate
+"""
+
+import functools
+import os
+import re
+from typing import Optional
+
+import requests
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+# Qwen2.5-3B-Instruct's tokenizer.json; for another model set TOKENIZER_REPO (and TOKENIZER_PATH to keep both)
+TOKENIZER_REPO = os.environ.get("TOKENIZER_REPO", "Qwen/Qwen2.5-3B-Instruct")
+TOKENIZER_PATH = os.environ.get(
+    "TOKENIZER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tokenizer", "tokenizer.json"))
+HUB_URL = "https://huggingface.co/{repo}/resolve/main/tokenizer.json"
+
+# Pre-tokenizer pieces roughly as GPT/Qwen split them: a word or punctuation run with its leading space
+PIECE_PATTERN = re.compile(r' ?\w+| ?[^\w\s]+|\s+')
+# Characters per token inside one piece (long identifiers split into several tokens)
+CHARS_PER_TOKEN = 4
+
+
+# Share of a token budget held back when counts are only estimated (the estimate is within ~15%)
+ESTIMATE_MARGIN = 0.15
+
+
+def fetch_tokenizer(path: str = TOKENIZER_PATH, repo: str = TOKENIZER_REPO, timeout: float = 30) -> bool:
+    """Download `repo`'s tokenizer.json from the HuggingFace hub to `path` (HF_TOKEN for gated models)"""
+    token = os.environ.get('HF_TOKEN')
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    try:
+        response = requests.get(HUB_URL.format(repo=repo), headers=headers, timeout=timeout)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Tokenizer: could not fetch {repo} tokenizer.json ({e}); estimating token counts")
+        return False
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(response.content)
+    os.replace(tmp, path)
+    return True
+
+
+@functools.lru_cache(maxsize=None)
+def load_tokenizer(path: str = TOKENIZER_PATH):
+    """The tokenizer at `path`, fetched on first use; None without the `tokenizers` package or offline"""
+    if Tokenizer is None:
+        return None
+    if not os.path.exists(path) and not fetch_tokenizer(path):
+        return None
+    return Tokenizer.from_file(path)
+
+
+def estimate_tokens(text: str) -> int:
+    """Tokenizer-free estimate, typically within ~15% of a BPE tokenizer on English text and code"""
+    return sum((len(piece) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN for piece in PIECE_PATTERN.findall(text))
+
+
+def count_tokens(text: Optional[str], path: str = TOKENIZER_PATH) -> int:
+    if not text:
+        return 0
+    tokenizer = load_tokenizer(path)
+    if tokenizer is None:
+        return estimate_tokens(text)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def tokenizer_source(path: str = TOKENIZER_PATH) -> str:
+    """What count_tokens() uses, for reports"""
+    return path if load_tokenizer(path) is not None else "estimate"
+
+
+def counts_estimated(path: str = TOKENIZER_PATH) -> bool:
+    """Whether count_tokens() falls back to estimate_tokens()"""
+    return load_tokenizer(path) is None
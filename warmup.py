@@ -0,0 +1,103 @@
+"""
+Endpoint Warm-up and Cold-start Detection
+Waits for a scale-to-zero endpoint to become ready before the timed run and
+tags results produced while it was still cold, so they can be kept out of
+latency statistics
+"""
+
+import statistics
+import time
+from typing import Any, Dict, Optional
+
+from backends import InferenceBackend
+from retry_policy import RETRYABLE
+
+WARMUP_PROMPT = "Reply with the single word: ready"
+
+
+def warm_up(backend: InferenceBackend, params: Dict[str, Any], latency_target: float = 2.0,
+            timeout: float = 600.0, interval: float = 5.0, generations: int = 2) -> Dict[str, Any]:
+    """Poll backend.probe() until it answers within `latency_target`, then send warm-up generations
+
+    Returns {"ready", "waited", "probes", "cold", "generation_latencies",
+    "baseline_latency"}; `cold` is True when the endpoint was not ready at the
+    first probe, `baseline_latency` is the median latency of the warm-up
+    generations (None without any). Generations are only sent once the probe
+    reports ready: timed against a still-cold endpoint they would make a
+    cold-start latency the warm baseline.
+    """
+    start = time.monotonic()
+    probes = 0
+    ready = False
+    cold = False
+    last_reason = None
+    while True:
+        probes += 1
+        status = backend.probe()
+        latency = status.get('latency') or 0.0
+        if status['ok'] and latency <= latency_target:
+            ready = True
+            break
+        cold = True
+        reason = status.get('error') or f"probe took {latency:.1f}s"
+        waited = time.monotonic() - start
+        if waited + interval > timeout:
+            print(f"  ✗ Endpoint not ready after {waited:.0f}s ({reason}); starting anyway")
+            break
+        if reason != last_reason:
+            print(f"  … Endpoint not ready ({reason}); polling every {interval:.0f}s")
+            last_reason = reason
+        time.sleep(interval)
+
+    latencies = []
+    warmup_params = {**params, "max_new_tokens": min(params.get("max_new_tokens", 16), 16)}
+    for _ in range(generations if ready else 0):
+        result = backend.generate(WARMUP_PROMPT, warmup_params)
+        if result['success'] and result.get('latency') is not None:
+            latencies.append(result['latency'])
+
+    waited = round(time.monotonic() - start, 1)
+    if ready:
+        print(f"  ✓ Endpoint ready after {waited}s ({probes} probe{'s' if probes != 1 else ''}"
+              f"{', cold start' if cold else ''}); warm-up latencies: "
+              f"{', '.join(f'{l:.2f}s' for l in latencies) or 'n/a'}")
+    return {
+        "ready": ready,
+        "waited": waited,
+        "probes": probes,
+        "cold": cold,
+        "generation_latencies": latencies,
+        "baseline_latency": statistics.median(latencies) if latencies else None,
+    }
+
+
+class ColdStartDetector:
+    """Tag results produced while the endpoint looks cold
+
+    A 503/throttled, timed-out or unreachable request opens a cold window, as
+    does a successful one slower than `slow_after` seconds (`factor` times the
+    warm baseline latency, at least `floor`). The window closes at the first
+    fast successful result. Results observed while the window is open get
+    `cold_start: True`.
+    """
+
+    def __init__(self, baseline_latency: Optional[float] = None, factor: float = 5.0, floor: float = 10.0,
+                 cold: bool = False):
+        self.slow_after = max(floor, factor * baseline_latency) if baseline_latency else None
+        self.cold = cold
+        self.tagged = 0
+
+    def observe(self, result: Dict[str, Any]) -> bool:
+        """Update the window from one request result; returns True (and tags the result) if cold"""
+        if not result['success']:
+            if result.get('error_kind') == RETRYABLE and (result.get('throttled') or result.get('status_code') is None):
+                self.cold = True
+        elif self.slow_after is not None and (result.get('latency') or 0.0) > self.slow_after:
+            self.cold = True
+        else:
+            self.cold = False
+            return False
+        if self.cold:
+            result['cold_start'] = True
+            self.tagged += 1
+        return self.cold